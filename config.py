@@ -22,12 +22,20 @@ BASE_DIR = Path(__file__).parent
 STORAGE_DIR = BASE_DIR / 'storage'
 RESULTS_DIR = STORAGE_DIR / 'results'
 EXPORTS_DIR = STORAGE_DIR / 'exports'
+CACHE_DIR = STORAGE_DIR / 'cache'
+BATCH_JOBS_DIR = STORAGE_DIR / 'batch_jobs'
+COLUMNAR_DIR = STORAGE_DIR / 'columnar'
+ARCHIVE_DIR = STORAGE_DIR / 'archive'
 TEMPLATES_DIR = BASE_DIR / 'views' / 'templates'
 
 # Crea cartelle se non esistono
 STORAGE_DIR.mkdir(exist_ok=True)
 RESULTS_DIR.mkdir(exist_ok=True)
 EXPORTS_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
+BATCH_JOBS_DIR.mkdir(exist_ok=True)
+COLUMNAR_DIR.mkdir(exist_ok=True)
+ARCHIVE_DIR.mkdir(exist_ok=True)
 
 # ============================================================================
 # APIFY ACTORS
@@ -58,11 +66,126 @@ OPENAI_MODEL = 'gpt-4o-mini'  # Modello economico e veloce
 OPENAI_MAX_TOKENS = 2000
 OPENAI_TEMPERATURE = 0.3  # Più deterministico
 
+# Prezzi OpenAI in USD per 1M token (stima costi per analisi)
+OPENAI_PRICING = {
+    'gpt-4o-mini': {'input': 0.15, 'output': 0.60},
+    'gpt-4o': {'input': 2.50, 'output': 10.00},
+    'gpt-4.1-mini': {'input': 0.40, 'output': 1.60},
+    'gpt-4.1': {'input': 2.00, 'output': 8.00}
+}
+
+# Modalità AI:
+#   'sync'     = chiamate OpenAI durante l'analisi
+#   'deferred' = risultati locali subito, richieste OpenAI salvate e inviate
+#                in blocco alla Batch API (run notturne: costo -50%, no 429)
+AI_MODE = 'sync'
+BATCH_API_CONFIG = {
+    'endpoint': '/v1/chat/completions',
+    'completion_window': '24h',
+    'cost_factor': 0.5    # Sconto Batch API sul prezzo standard
+}
+
+# Budget AI per analisi (None = illimitato). Superato il budget:
+# sentiment solo locale, insight dai topic locali, fusione senza LLM
+AI_BUDGET = {
+    'max_tokens': None,   # Token totali (prompt + risposta)
+    'max_seconds': None   # Durata massima della fase AI
+}
+
+# Campionamento commenti verso OpenAI: stratificato per post e fascia di
+# like, dimensione da intervallo di confidenza (Cochran) invece che fissa
+SAMPLING_CONFIG = {
+    'confidence': 0.95,            # Livello di confidenza della stima sentiment
+    'margin': 0.05,                # Margine di errore (±5 punti percentuali)
+    'min_size': 30,
+    'max_size': 1000,              # Tetto di costo (None = solo Cochran)
+    'like_bands': (1, 10, 100),    # Fasce: 0, 1-9, 10-99, 100+ like
+    'insights_sample_size': 50,    # Commenti nel prompt insight 'sample'
+    'seed': 42
+}
+
+# Budget token per richiesta sentiment: i batch sono riempiti fino al
+# budget di input/output invece di un numero fisso di commenti
+SENTIMENT_TOKEN_BUDGET = {
+    'max_input_tokens': 3000,
+    'max_output_tokens': 1500,
+    'output_tokens_per_comment': 12,  # {"id": "c1", "sentiment": "positive"}
+    'max_comment_tokens': 120,        # Troncamento singolo commento
+    'prompt_overhead_tokens': 150     # Istruzioni fisse del prompt
+}
+
+# Engine sentiment:
+#   'hybrid' = engine locale su tutti i commenti + OpenAI su un campione dei dubbi
+#   'local'  = solo engine locale (offline, nessun costo)
+#   'llm'    = solo OpenAI su un campione stratificato (conteggi stimati)
+SENTIMENT_ENGINE = 'hybrid'
+LOCAL_SENTIMENT_CONFIDENCE_THRESHOLD = 0.6
+
+# Insight:
+#   'topics'     = topic locali (TF-IDF + k-means) come contesto compatto,
+#                  una sola chiamata che copre tutti i commenti
+#   'map_reduce' = tutti i commenti in chunk paralleli + una fusione finale
+#   'sample'     = una sola chiamata su un campione pesato per like
+INSIGHTS_MODE = 'topics'
+INSIGHTS_TOKEN_BUDGET = {
+    'chunk_input_tokens': 3000,   # Prompt massimo per chunk (map)
+    'map_output_tokens': 600,     # Risposta massima per chunk
+    'max_comment_tokens': 120,    # Troncamento singolo commento
+    'prompt_overhead_tokens': 150,
+    'max_chunks': 30              # Oltre: chunk campionati a passo costante
+}
+
+# Topic locali: TF-IDF sparso + k-means sferico mini-batch
+TOPIC_CONFIG = {
+    'num_topics': 8,         # Topic massimi per social
+    'max_features': 2000,    # Vocabolario massimo (termini per frequenza)
+    'min_df': 2,             # Termine presente in almeno N commenti
+    'max_df': 0.5,           # Termini in oltre il 50% dei commenti esclusi
+    'batch_size': 1000,      # Commenti per mini-batch
+    'iterations': 30,        # Mini-batch di aggiornamento
+    'min_topic_size': 3,     # Topic con meno commenti scartati
+    'top_keywords': 8,       # Parole chiave per topic
+    'examples': 3            # Commenti rappresentativi per topic
+}
+
+# Dedup pre-AI: near-duplicate (MinHash + LSH) e flag spam/bot.
+# 64 permutazioni in 16 bande da 4: soglia LSH ~ (1/16)^(1/4) = 0.5
+DEDUP_CONFIG = {
+    'enabled': True,
+    'num_perm': 64,
+    'bands': 16,
+    'shingle_size': 4,             # Shingle di caratteri
+    'similarity_threshold': 0.7,   # Jaccard stimata minima per unire
+    'bot_repeat_threshold': 3      # Stesso testo dallo stesso autore
+}
+
+# Cache sentiment per commento (SQLite). Incrementare la versione del
+# prompt quando cambia il prompt sentiment: invalida le label in cache.
+SENTIMENT_CACHE_ENABLED = True
+SENTIMENT_CACHE_PATH = CACHE_DIR / 'sentiment_cache.sqlite'
+SENTIMENT_PROMPT_VERSION = 'v3'
+
+# Concorrenza adattiva (AIMD) per le chiamate OpenAI
+AI_CONCURRENCY_CONFIG = {
+    'initial': 4,            # Richieste in volo all'avvio
+    'min': 1,
+    'max': 16,
+    'decrease_factor': 0.5,  # Dimezza su 429 / quota esaurita
+    'rate_limit_retries': 3  # Retry per singola richiesta su 429
+}
+
 # Lingue supportate per analisi
 SUPPORTED_LANGUAGES = ['it', 'en']
 
-# Stopwords italiane custom
-ITALIAN_STOPWORDS = [
+# Riconoscimento lingua per commento (profilo parole + trigrammi)
+LANGUAGE_CONFIG = {
+    'min_margin': 1,         # Voti di scarto minimi sul profilo parole
+    'trigram_margin': 0.25,  # Scarto log-prob medio per trigramma (fallback)
+    'trigram_min_score': 2.0 # Scarto log-prob totale minimo, sotto: 'und'
+}
+
+# Stopwords (frozenset: lookup O(1) nel tokenizer)
+ITALIAN_STOPWORDS = frozenset([
     'di', 'a', 'da', 'in', 'con', 'su', 'per', 'tra', 'fra',
     'il', 'lo', 'la', 'i', 'gli', 'le', 'un', 'uno', 'una',
     'del', 'dello', 'della', 'dei', 'degli', 'delle',
@@ -73,8 +196,42 @@ ITALIAN_STOPWORDS = [
     'e', 'è', 'che', 'non', 'mi', 'ti', 'si', 'ci', 'vi',
     'anche', 'come', 'ma', 'o', 'se', 'sono', 'hanno', 'ha',
     'questo', 'questa', 'questi', 'queste', 'quello', 'quella',
-    'molto', 'più', 'mai', 'poi', 'però', 'quindi', 'dove'
-]
+    'molto', 'più', 'mai', 'poi', 'però', 'quindi', 'dove',
+    'sei', 'siamo', 'siete', 'era', 'ero', 'stato', 'stata', 'essere',
+    'avere', 'fare', 'fatto', 'cosa', 'così', 'tutto', 'tutti', 'tutte',
+    'ancora', 'già', 'sempre', 'solo', 'ogni', 'quando', 'perché', 'perche',
+    'qualcosa', 'voi', 'loro', 'nostro', 'vostro', 'nostra', 'vostra'
+])
+
+ENGLISH_STOPWORDS = frozenset([
+    'the', 'a', 'an', 'and', 'or', 'but', 'if', 'of', 'at', 'by', 'for', 'with',
+    'about', 'to', 'from', 'in', 'on', 'is', 'are', 'was', 'were', 'be', 'been',
+    'have', 'has', 'had', 'do', 'does', 'did', 'this', 'that', 'these', 'those',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
+    'my', 'your', 'his', 'its', 'our', 'their', 'what', 'which', 'who', 'when',
+    'where', 'why', 'how', 'all', 'any', 'both', 'each', 'more', 'most', 'some',
+    'such', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can',
+    'will', 'just', 'should', 'now', 'there', 'here', 'then', 'also', 'would',
+    'could', 'into', 'over', 'yours', 'really', 'like', 'love', 'want',
+    'need', 'get', 'got', 'one', 'much', 'many', 'even', 'still', 'well'
+])
+
+# Stopwords per lingua rilevata (lingua indeterminata: unione)
+STOPWORDS_BY_LANGUAGE = {
+    'it': ITALIAN_STOPWORDS,
+    'en': ENGLISH_STOPWORDS
+}
+
+# Tokenizer wordcloud: n-grammi, parallelismo per grandi volumi
+TOKENIZER_CONFIG = {
+    'ngram_range': (1, 2),        # Parole singole + bigrammi
+    'min_word_length': 4,         # Parole più corte ignorate
+    'min_phrase_count': 2,        # Frasi (n>1) con meno occorrenze scartate
+    'parallel_threshold': 50000,  # Oltre: conteggio in process pool
+    'chunk_size': 10000,          # Commenti per chunk di conteggio
+    'max_workers': None,          # None = numero CPU
+    'max_pending_chunks': 2       # Chunk in volo per worker (memoria costante)
+}
 
 # ============================================================================
 # WORDCLOUD
@@ -108,6 +265,79 @@ PDF_CONFIG = {
 CSV_ENCODING = 'utf-8-sig'  # Per compatibilità Excel
 XLSX_ENGINE = 'openpyxl'
 
+# ============================================================================
+# STORAGE SETTINGS
+# ============================================================================
+# Catalogo analisi:
+#   'sqlite' = catalogo SQLite indicizzato (WAL, scritture transazionali);
+#              alla prima apertura importa index.json e i file esistenti
+#   'json'   = index.json legacy (riscritto per intero a ogni modifica)
+STORAGE_BACKEND = 'sqlite'
+CATALOG_DB_NAME = 'catalog.sqlite'
+
+# Codec file analisi: orjson + compressione ('zstd', 'gzip' o None).
+# I file esistenti (JSON semplice) restano leggibili: formato dai magic bytes
+STORAGE_CODEC = {
+    'compression': 'zstd',   # Senza 'zstandard' installato: gzip
+    'level': 3
+}
+EXPORT_JSON_COMPRESSION = None  # Export JSON leggibile (indentato)
+
+# Cache LRU in-process delle sezioni caricate (viste parziali della
+# dashboard), chiave ID + sezione + mtime. 0 = disattivata
+ANALYSIS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Dataset colonnare di post e commenti di tutte le analisi (Parquet,
+# richiede 'pyarrow'), partizionato brand/social/mese e aggiornato a ogni
+# salvataggio: query storiche senza aprire i file delle analisi
+COLUMNAR_STORE_ENABLED = True
+
+# Deduplica post e commenti tra analisi: oggetti salvati una volta in
+# OBJECT_STORE_DB_NAME (in results/), le analisi tengono riferimenti più
+# le metriche del momento (campi sotto, diversi a ogni snapshot)
+OBJECT_STORE_ENABLED = True
+OBJECT_STORE_DB_NAME = 'objects.sqlite'
+MUTABLE_FIELDS = {
+    'post': ['likes', 'comments_count', 'shares', 'views', 'subscribers', 'preview_comments'],
+    'comment': ['likes', 'replies_count', 'has_creator_heart']
+}
+
+# Salvataggio write-behind: l'analisi finita restituisce subito l'ID,
+# sezioni, catalogo e dataset colonnare sono scritti da un thread in
+# background (attesi all'uscita del processo). Journal write-ahead in
+# results/WRITE_BEHIND_JOURNAL_DIR (un piccolo record per salvataggio):
+# dopo un crash i salvataggi interrotti sono completati o ripuliti
+WRITE_BEHIND_ENABLED = True
+WRITE_BEHIND_JOURNAL_DIR = '.journal'
+
+# Scrittura in background fallita: nuovi tentativi con attesa crescente
+# (delay, 2×delay, 4×delay...); dopo l'ultimo l'analisi resta in memoria
+# e viene ritentata da flush() (anche all'uscita del processo)
+WRITE_BEHIND_RETRY = {
+    'attempts': 4,
+    'delay': 1.0  # secondi
+}
+
+# Confronto snapshot dello stesso brand (python main.py --mode diff):
+# diff salvati in results/SNAPSHOT_DIFF_CACHE_DIR, post con la crescita
+# di likes maggiore riportati per ogni confronto
+SNAPSHOT_DIFF_CACHE_DIR = '.diffs'
+SNAPSHOT_DIFF_TOP_POSTS = 10
+
+# Retention (python main.py --mode maintenance): per età dell'analisi
+#   < raw_days                 completa (post e commenti grezzi)
+#   raw_days .. archive_days   compattata: riepilogo, metriche con sketch, AI
+#   >= archive_days            archiviata in ARCHIVE_DIR/<brand>/<YYYY-MM>.tar
+# None disattiva il passaggio. Override per brand (nome minuscolo) in
+# RETENTION_BRAND_POLICIES, es. {'nike': {'raw_days': 90}}
+RETENTION_POLICY = {
+    'raw_days': 30,
+    'archive_days': 365
+}
+RETENTION_BRAND_POLICIES = {}
+EXPORTS_RETENTION_DAYS = 30     # File in storage/exports più vecchi: eliminati
+MAINTENANCE_LOCK_TTL = 3600     # Secondi dopo cui un lock abbandonato è ignorato
+
 # ============================================================================
 # DASHBOARD SETTINGS
 # ============================================================================
@@ -118,6 +348,10 @@ STREAMLIT_CONFIG = {
     'initial_sidebar_state': 'expanded'
 }
 
+# Sezioni lette per aprire un report salvato ('summary', 'social', 'ai',
+# 'posts', 'comments'): i commenti grezzi servono solo agli export
+DASHBOARD_REPORT_SECTIONS = ['summary', 'social', 'ai', 'posts']
+
 # Favicon URL
 MOCA_FAVICON_URL = 'https://mocainteractive.com/wp-content/uploads/2025/04/cropped-moca-instagram-icona-1-192x192.png'
 
@@ -165,3 +399,15 @@ PERFORMANCE_THRESHOLDS = {
     'high': 5.0,     # 3-5% engagement
     'excellent': 5.0 # > 5% engagement
 }
+
+# ============================================================================
+# STREAMING STATISTICS (SKETCHES)
+# ============================================================================
+# Compressione T-Digest: ~100 centroidi, errore < 1% sui quantili estremi
+TDIGEST_COMPRESSION = 100
+
+# Percentili riportati per le distribuzioni KPI
+DISTRIBUTION_PERCENTILES = [50, 90, 99]
+
+# Precisione HyperLogLog: 2^12 registri (4KB), errore standard ~1.6%
+HLL_PRECISION = 12
@@ -1,7 +1,6 @@
 """
 Manager per export risultati in vari formati (PDF, CSV, XLSX)
 """
-import json
 import csv
 import pandas as pd
 from datetime import datetime
@@ -12,7 +11,8 @@ from reportlab.lib import colors as rl_colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from config import EXPORTS_DIR, CSV_ENCODING, XLSX_ENGINE, PDF_CONFIG, BRAND_COLORS
+from config import EXPORTS_DIR, CSV_ENCODING, XLSX_ENGINE, PDF_CONFIG, BRAND_COLORS, EXPORT_JSON_COMPRESSION
+from models.storage import file_codec
 from utils.logger import Logger
 
 
@@ -49,8 +49,19 @@ class ExportManager:
 
         filepath = self.exports_dir / filename
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+        # Estensione coerente con la compressione configurata
+        if EXPORT_JSON_COMPRESSION:
+            filepath = file_codec.file_path(
+                self.exports_dir / (file_codec.strip_extension(filename) or filename),
+                EXPORT_JSON_COMPRESSION
+            )
+
+        # orjson (indentato se non compresso), scrittura atomica
+        file_codec.write_file(
+            filepath, results,
+            compression=EXPORT_JSON_COMPRESSION,
+            indent=not EXPORT_JSON_COMPRESSION
+        )
 
         self.logger.info(f"✓ JSON esportato: {filepath}")
         return str(filepath)
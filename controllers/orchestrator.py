@@ -1,11 +1,14 @@
 """
 Orchestratore principale - coordina scraping, analisi e storage
 """
+from concurrent.futures import ThreadPoolExecutor
+from config import AI_MODE
 from models.scrapers.instagram_scraper import InstagramScraper
 from models.scrapers.tiktok_scraper import TikTokScraper
 from models.scrapers.youtube_scraper import YouTubeScraper
 from models.analyzers.metrics_calculator import MetricsCalculator
 from models.analyzers.ai_analyzer import AIAnalyzer
+from models.analyzers.snapshot_diff import SnapshotDiffEngine
 from models.storage.storage_manager import StorageManager
 from controllers.url_finder import URLFinder
 from utils.logger import Logger
@@ -31,6 +34,7 @@ class SocialOrchestrator:
         # Inizializza componenti
         self.url_finder = URLFinder(apify_token, logger=self.logger)
         self.storage = StorageManager(logger=self.logger)
+        self.snapshot_diff = SnapshotDiffEngine(self.storage, logger=self.logger)
 
         # Scrapers
         self.scrapers = {
@@ -47,7 +51,7 @@ class SocialOrchestrator:
 
     def run_complete_analysis(self, brand_name, social_types, max_posts=10,
                              max_comments_per_post=50, auto_find_urls=True,
-                             manual_urls=None, enable_ai=True):
+                             manual_urls=None, enable_ai=True, ai_mode=AI_MODE):
         """
         Esegue analisi completa end-to-end
 
@@ -59,6 +63,8 @@ class SocialOrchestrator:
             auto_find_urls: Se True, cerca URL automaticamente
             manual_urls: Dict URL manuali {social: url}
             enable_ai: Abilita analisi AI
+            ai_mode: 'sync' (OpenAI subito) o 'deferred' (risultati locali,
+                     richieste OpenAI per la Batch API)
 
         Returns:
             Dict con risultati completi + analysis_id
@@ -151,22 +157,17 @@ class SocialOrchestrator:
         if enable_ai and self.ai_analyzer:
             progress.start_phase('Analisi AI')
 
-            for social_type, data in results_by_social.items():
-                # Raccogli tutti i commenti
-                all_comments = []
-                for post in data['posts']:
-                    for comment in post.get('comments', []):
-                        all_comments.append({
-                            'text': comment.get('text', ''),
-                            'author': comment.get('author', 'N/A'),
-                            'post_url': post.get('url', 'N/A')
-                        })
+            # Uso e budget OpenAI contati per questa analisi
+            self.ai_analyzer.usage.reset()
 
-                if all_comments:
-                    ai_analysis = self.ai_analyzer.analyze_comments(all_comments, social_type)
-                    ai_results[social_type] = ai_analysis
+            deferred = ai_mode == 'deferred'
+            ai_results = self._run_ai_analysis(results_by_social, deferred=deferred)
 
-            progress.update(f"Analisi AI completata per {len(ai_results)} social")
+            # Reduce cross-social: insight e sentiment a livello brand
+            # (deferred: fusione locale, ricalcolata al merge del batch)
+            ai_results['aggregated'] = self.ai_analyzer.aggregate_analyses(ai_results, local=deferred)
+
+            progress.update(f"Analisi AI completata per {len(ai_results) - 1} social")
 
         # FASE 5: Salvataggio
         progress.start_phase('Salvataggio')
@@ -175,15 +176,17 @@ class SocialOrchestrator:
             'brand_name': brand_name,
             'social_results': results_by_social,
             'aggregated_stats': aggregated_metrics,
-            'ai_analysis': ai_results if enable_ai else None
+            'ai_analysis': ai_results if enable_ai else None,
+            'ai_usage': self.ai_analyzer.usage.summary() if enable_ai and self.ai_analyzer else None
         }
 
-        # Salva in storage
+        # Salva in storage (in background: i risultati sono già in memoria)
         analysis_id = self.storage.save_analysis(
             brand_name=brand_name,
             social_urls=social_urls,
             results=final_results,
-            enable_ai=enable_ai
+            enable_ai=enable_ai,
+            background=True
         )
 
         progress.update(f"Analisi salvata con ID: {analysis_id}")
@@ -196,6 +199,49 @@ class SocialOrchestrator:
             'results': final_results
         }
 
+    def _run_ai_analysis(self, results_by_social, deferred=False):
+        """
+        Analisi AI dei social in parallelo
+
+        Un thread per social: le chiamate OpenAI di tutti i social condividono
+        il controller di concorrenza dell'AIAnalyzer, che resta il solo limite
+        alle richieste in volo.
+
+        Args:
+            results_by_social: Dict {social: dati con 'posts'}
+            deferred: Se True richieste OpenAI differite alla Batch API
+
+        Returns:
+            Dict {social: analisi AI} (solo social con commenti)
+        """
+        comments_by_social = {}
+        for social_type, data in results_by_social.items():
+            # Raccogli tutti i commenti
+            all_comments = []
+            for post in data['posts']:
+                for comment in post.get('comments', []):
+                    all_comments.append({
+                        'text': comment.get('text', ''),
+                        'author': comment.get('author', 'N/A'),
+                        'lang': comment.get('lang'),
+                        'likes': comment.get('likes', 0),
+                        'post_url': post.get('url', 'N/A')
+                    })
+
+            if all_comments:
+                comments_by_social[social_type] = all_comments
+
+        if not comments_by_social:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=len(comments_by_social)) as executor:
+            futures = {
+                social_type: executor.submit(self.ai_analyzer.analyze_comments, comments, social_type, deferred)
+                for social_type, comments in comments_by_social.items()
+            }
+
+        return {social_type: future.result() for social_type, future in futures.items()}
+
     def scrape_single_social(self, social_type, profile_url, max_posts=10,
                             max_comments_per_post=50):
         """
@@ -240,17 +286,34 @@ class SocialOrchestrator:
             'comment_metrics': comment_metrics
         }
 
-    def load_analysis(self, analysis_id):
+    def load_analysis(self, analysis_id, sections=None):
         """
         Carica analisi esistente
 
         Args:
             analysis_id: ID analisi
+            sections: Sezioni da caricare (es. ['summary', 'social']);
+                      None = analisi completa
+
+        Returns:
+            Dict con dati analisi (vista lazy se sections è indicato)
+        """
+        return self.storage.load_analysis(analysis_id, sections=sections)
+
+    def wait_for_save(self, analysis_id=None, timeout=None):
+        """
+        Attende la scrittura delle analisi salvate in background
+
+        Args:
+            analysis_id: ID analisi (None = tutte quelle in coda)
+            timeout: Secondi massimi di attesa
 
         Returns:
-            Dict con dati analisi
+            bool: True se scritte
         """
-        return self.storage.load_analysis(analysis_id)
+        if analysis_id is None:
+            return self.storage.flush(timeout)
+        return self.storage.wait(analysis_id, timeout)
 
     def list_analyses(self, brand_name=None, limit=10):
         """
@@ -275,4 +338,76 @@ class SocialOrchestrator:
         Returns:
             bool: True se eliminata
         """
-        return self.storage.delete_analysis(analysis_id)
+        if not self.storage.delete_analysis(analysis_id):
+            return False
+        self.snapshot_diff.remove(analysis_id)
+        return True
+
+    def get_brand_trend(self, brand_name, limit=None):
+        """
+        Andamento metriche di un brand tra le analisi salvate
+
+        Args:
+            brand_name: Nome brand
+            limit: Ultime N analisi
+
+        Returns:
+            Lista punti in ordine cronologico
+        """
+        return self.storage.get_brand_trend(brand_name, limit=limit)
+
+    def diff_analyses(self, new_id, old_id=None):
+        """
+        Confronto tra due analisi dello stesso brand (metriche, post, sentiment)
+
+        Args:
+            new_id: ID analisi più recente
+            old_id: ID analisi di riferimento (default la precedente del brand)
+
+        Returns:
+            Dict diff o None se non esiste un'analisi precedente
+        """
+        return self.snapshot_diff.diff(new_id, old_id)
+
+    def get_latest_diff(self, brand_name):
+        """
+        Confronto tra le ultime due analisi di un brand
+
+        Args:
+            brand_name: Nome brand
+
+        Returns:
+            Dict diff o None se il brand ha meno di due analisi
+        """
+        return self.snapshot_diff.latest(brand_name)
+
+    def query_dataset(self, dataset='posts', **filters):
+        """
+        Query storica su post o commenti di tutte le analisi
+
+        Args:
+            dataset: 'posts' o 'comments'
+            **filters: brand, social, since, until, text, columns, filters, output
+
+        Returns:
+            DataFrame (o pyarrow.Table con output='arrow')
+        """
+        return self.storage.query_dataset(dataset, **filters)
+
+    def get_dedup_stats(self):
+        """
+        Statistiche deduplica post e commenti tra analisi salvate
+
+        Returns:
+            Dict (oggetti, riferimenti, byte, dedup_ratio) o None
+        """
+        return self.storage.dedup_stats()
+
+    def get_cache_stats(self):
+        """
+        Statistiche cache delle analisi caricate (hit/miss, memoria)
+
+        Returns:
+            Dict statistiche o None
+        """
+        return self.storage.cache_stats()
@@ -106,6 +106,12 @@ def run_cli_analysis():
         print(f"{Colors.RED}✗ Devi selezionare almeno un social{Colors.RESET}")
         return
 
+    # Modalità AI
+    ai_mode = 'sync'
+    if enable_ai:
+        deferred = input("Analisi AI differita via Batch API (costo -50%, risultati entro 24h)? (s/n): ")
+        ai_mode = 'deferred' if deferred.lower() == 's' else 'sync'
+
     # Modalità URL
     print(f"\n{Colors.GRAY}🔗 Modalità URL{Colors.RESET}\n")
     print("1. Auto-discovery (ricerca automatica)")
@@ -159,7 +165,8 @@ def run_cli_analysis():
             max_comments_per_post=max_comments,
             auto_find_urls=auto_find,
             manual_urls=manual_urls,
-            enable_ai=enable_ai
+            enable_ai=enable_ai,
+            ai_mode=ai_mode
         )
 
         if result:
@@ -179,6 +186,10 @@ def run_cli_analysis():
             print(f"Commenti totali: {Colors.RED}{agg['total_comments']}{Colors.RESET}")
             print(f"Likes totali: {Colors.RED}{agg['total_likes']:,}{Colors.RESET}")
 
+            if ai_mode == 'deferred':
+                print(f"\n{Colors.GRAY}Risultati AI provvisori: invia il batch con "
+                      f"--mode batch-submit --analysis-ids {analysis_id}{Colors.RESET}")
+
             # Export
             print(f"\n{Colors.GRAY}Vuoi esportare i risultati?{Colors.RESET}")
             export_choice = input("Scegli formato (pdf/csv/xlsx/json/skip): ").lower()
@@ -209,6 +220,159 @@ def run_cli_analysis():
         print(f"\n{Colors.RED}✗ Errore: {e}{Colors.RESET}\n")
 
 
+def run_batch(mode, analysis_ids=None, job_id=None, local=False):
+    """
+    Invio o raccolta dei job Batch API delle analisi in modalità deferred
+
+    Args:
+        mode: 'batch-submit' o 'batch-poll'
+        analysis_ids: ID analisi da inviare (batch-submit)
+        job_id: Job da controllare (batch-poll, default tutti)
+        local: Usa lo stand-in locale al posto di OpenAI
+    """
+    import os
+    from models.analyzers.ai_analyzer import AIAnalyzer
+    from models.analyzers.batch_jobs import BatchJobManager, OpenAIBatchClient, LocalBatchClient
+    from models.storage.storage_manager import StorageManager
+
+    openai_token = os.environ.get('OPENAI_API_KEY', '')
+    if not openai_token and not local:
+        openai_token = input(f"🤖 OpenAI API Key: ").strip()
+
+    client = LocalBatchClient() if local else OpenAIBatchClient(openai_token)
+    manager = BatchJobManager(client, AIAnalyzer(openai_token or 'local'), StorageManager())
+
+    try:
+        if mode == 'batch-submit':
+            if not analysis_ids:
+                print(f"{Colors.RED}✗ Specifica --analysis-ids{Colors.RESET}")
+                return
+
+            job = manager.submit(analysis_ids)
+            if job:
+                print(f"\n{Colors.RED}✓ Job {job['job_id']}: {job['requests']} richieste "
+                      f"({job['batch_id']}){Colors.RESET}\n")
+            else:
+                print(f"\n{Colors.GRAY}Nessuna richiesta deferred da inviare{Colors.RESET}\n")
+        else:
+            jobs = manager.poll(job_id)
+            for job in jobs:
+                print(f"{job['job_id']}: {Colors.RED}{job['status']}{Colors.RESET} "
+                      f"({len(job['analysis_ids'])} analisi, {job['requests']} richieste)")
+            if not jobs:
+                print(f"\n{Colors.GRAY}Nessun job in attesa{Colors.RESET}\n")
+
+    except Exception as e:
+        print(f"\n{Colors.RED}✗ Errore batch: {e}{Colors.RESET}\n")
+
+
+def run_maintenance(dry_run=False, restore_ids=None):
+    """
+    Retention storage: compatta e archivia le analisi vecchie, pulisce gli export
+
+    Args:
+        dry_run: Mostra solo le azioni previste
+        restore_ids: ID analisi archiviate da ripristinare (al posto della manutenzione)
+    """
+    from models.storage.storage_manager import StorageManager
+    from models.storage.retention import RetentionEngine
+
+    storage = StorageManager()
+
+    try:
+        if restore_ids:
+            for analysis_id in restore_ids:
+                ok = storage.restore_analysis(analysis_id)
+                status = f"{Colors.RED}✓ ripristinata" if ok else f"{Colors.GRAY}✗ non archiviata"
+                print(f"{analysis_id}: {status}{Colors.RESET}")
+            return
+
+        plan = RetentionEngine(storage).run(dry_run=dry_run)
+
+        title = "Manutenzione (dry run)" if dry_run else "Manutenzione completata"
+        print(f"\n{Colors.RED}{title}{Colors.RESET}")
+        for action, label in (('compact', 'Da compattare' if dry_run else 'Compattate'),
+                              ('archive', 'Da archiviare' if dry_run else 'Archiviate')):
+            print(f"  {label}: {len(plan[action])}")
+            for item in plan[action]:
+                print(f"{Colors.GRAY}    {item['analysis_id']} · {item['brand_name']} · "
+                      f"{item['age_days']} giorni{Colors.RESET}")
+        for item in plan['skipped']:
+            print(f"{Colors.GRAY}  Saltata {item['analysis_id']}: {item['reason']}{Colors.RESET}")
+        print(f"  Export {'da eliminare' if dry_run else 'eliminati'}: {len(plan['exports'])}")
+        if not dry_run:
+            for item in plan['errors']:
+                print(f"{Colors.RED}  ✗ {item['action']} {item['analysis_id']}: {item['error']}{Colors.RESET}")
+            print(f"  Spazio liberato: {plan['freed_bytes'] / 1024 / 1024:.1f} MB")
+        print()
+
+    except Exception as e:
+        print(f"\n{Colors.RED}✗ Errore manutenzione: {e}{Colors.RESET}\n")
+
+
+def run_diff(brand_name=None, analysis_ids=None):
+    """
+    Confronto tra snapshot dello stesso brand (ultime due analisi o ID indicati)
+
+    Args:
+        brand_name: Brand di cui confrontare le ultime due analisi
+        analysis_ids: [nuova] o [nuova, riferimento]
+    """
+    from models.storage.storage_manager import StorageManager
+    from models.analyzers.snapshot_diff import SnapshotDiffEngine
+
+    engine = SnapshotDiffEngine(StorageManager())
+
+    try:
+        if analysis_ids:
+            diff = engine.diff(analysis_ids[0], analysis_ids[1] if len(analysis_ids) > 1 else None)
+        elif brand_name:
+            diff = engine.latest(brand_name)
+        else:
+            print(f"{Colors.RED}✗ Specifica --brand o --analysis-ids{Colors.RESET}")
+            return
+
+        if not diff:
+            print(f"\n{Colors.GRAY}Serve almeno una seconda analisi del brand per il confronto{Colors.RESET}\n")
+            return
+
+        def _format(change, unit=''):
+            if change['delta'] is None:
+                return f"{Colors.GRAY}n/d{Colors.RESET}"
+            pct = f" ({change['pct']:+.1f}%)" if change['pct'] is not None else ''
+            return f"{change['old']:,} → {change['new']:,}  {Colors.RED}{change['delta']:+,}{unit}{pct}{Colors.RESET}"
+
+        print(f"\n{Colors.RED}Confronto {diff['brand_name']}: {diff['old']['timestamp'][:16]} → "
+              f"{diff['new']['timestamp'][:16]} ({diff['days']} giorni){Colors.RESET}")
+        for metric, label in (('total_posts', 'Post'), ('total_comments', 'Commenti'),
+                              ('total_likes', 'Likes'), ('total_views', 'Views'),
+                              ('avg_engagement_rate', 'Engagement Rate')):
+            print(f"  {label}: {_format(diff['metrics'][metric])}")
+
+        sentiment = diff['sentiment']
+        print(f"  Sentiment positivo: {_format(sentiment['positive_pct'], ' pt')}")
+        print(f"  Sentiment negativo: {_format(sentiment['negative_pct'], ' pt')}")
+
+        for social, data in diff['socials'].items():
+            if data['status'] != 'common':
+                print(f"{Colors.GRAY}  {social}: {'aggiunto' if data['status'] == 'added' else 'rimosso'}{Colors.RESET}")
+
+        posts = diff['posts']
+        if not posts['available']:
+            print(f"\n{Colors.GRAY}Post non confrontabili (analisi compattata o archiviata){Colors.RESET}\n")
+            return
+
+        print(f"\n  Post nuovi: {len(posts['new'])} · non più presenti: {len(posts['removed'])} · "
+              f"comuni: {posts['common']} (likes {posts['likes_growth']:+,}, views {posts['views_growth']:+,})")
+        for post in posts['top_growth']:
+            print(f"{Colors.GRAY}    [{post['social']}] {post['url'] or post['id']}: likes {post['likes_delta']:+,}, "
+                  f"views {post['views_delta']:+,}{Colors.RESET}")
+        print()
+
+    except Exception as e:
+        print(f"\n{Colors.RED}✗ Errore confronto: {e}{Colors.RESET}\n")
+
+
 def main():
     """Entry point principale"""
     parser = argparse.ArgumentParser(
@@ -217,11 +381,47 @@ def main():
 
     parser.add_argument(
         '--mode',
-        choices=['dashboard', 'cli'],
+        choices=['dashboard', 'cli', 'batch-submit', 'batch-poll', 'maintenance', 'diff'],
         default='dashboard',
         help='Modalità di esecuzione (default: dashboard)'
     )
 
+    parser.add_argument(
+        '--analysis-ids',
+        nargs='+',
+        help='ID analisi deferred da inviare alla Batch API (batch-submit) '
+             'o da confrontare: nuova [riferimento] (diff)'
+    )
+
+    parser.add_argument(
+        '--brand',
+        help='Brand di cui confrontare le ultime due analisi (diff)'
+    )
+
+    parser.add_argument(
+        '--job-id',
+        help='Job Batch API da controllare (batch-poll, default tutti)'
+    )
+
+    parser.add_argument(
+        '--local-batch',
+        action='store_true',
+        help='Usa lo stand-in locale della Batch API (test/offline)'
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Mostra le azioni di retention senza eseguirle (maintenance)'
+    )
+
+    parser.add_argument(
+        '--restore',
+        nargs='+',
+        metavar='ANALYSIS_ID',
+        help='Ripristina analisi archiviate in storage/results (maintenance)'
+    )
+
     parser.add_argument(
         '--version',
         action='version',
@@ -238,6 +438,12 @@ def main():
         run_dashboard()
     elif args.mode == 'cli':
         run_cli_analysis()
+    elif args.mode == 'maintenance':
+        run_maintenance(args.dry_run, args.restore)
+    elif args.mode == 'diff':
+        run_diff(args.brand, args.analysis_ids)
+    else:
+        run_batch(args.mode, args.analysis_ids, args.job_id, args.local_batch)
 
 
 if __name__ == "__main__":
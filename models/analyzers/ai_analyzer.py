@@ -1,15 +1,33 @@
 """
 Analisi AI con OpenAI: sentiment, wordcloud, insight
 """
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
 from collections import Counter
+import json
 import re
+import time
 from config import (
     OPENAI_MODEL, OPENAI_MAX_TOKENS, OPENAI_TEMPERATURE,
-    ITALIAN_STOPWORDS, WORDCLOUD_CONFIG
+    WORDCLOUD_CONFIG, TOKENIZER_CONFIG,
+    SAMPLING_CONFIG, SENTIMENT_TOKEN_BUDGET, AI_CONCURRENCY_CONFIG,
+    SENTIMENT_CACHE_ENABLED, SENTIMENT_ENGINE, LOCAL_SENTIMENT_CONFIDENCE_THRESHOLD,
+    INSIGHTS_MODE, INSIGHTS_TOKEN_BUDGET, DEDUP_CONFIG, STOPWORDS_BY_LANGUAGE
 )
+from models.analyzers.ai_usage import UsageMeter, current_social
+from models.analyzers.comment_dedup import CommentDeduplicator
+from models.analyzers.language_detector import LanguageDetector, LANGUAGE_NAMES, language_breakdown
+from models.analyzers.local_sentiment import LocalSentimentEngine
+from models.analyzers.sampling import sample_size, stratified_sample, comment_stratum, like_weight
+from models.analyzers.text_tokenizer import count_terms_parallel, DEFAULT_STOPWORDS
+from models.analyzers.topic_engine import TopicEngine
+from models.analyzers.token_budget import count_tokens, truncate_to_tokens, pack_batches
+from models.storage.sentiment_cache import SentimentCache
+from utils.concurrency import AdaptiveConcurrencyController, run_concurrent
 from utils.logger import Logger
 
+# Durate negli header rate limit OpenAI (es. "1s", "6m0s", "250ms")
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+
 
 class AIAnalyzer:
     """Analizzatore AI per sentiment e insight"""
@@ -25,71 +43,316 @@ class AIAnalyzer:
         self.client = OpenAI(api_key=openai_api_key)
         self.logger = logger or Logger.get_logger(self.__class__.__name__)
 
-    def analyze_comments(self, comments, social_type='general'):
+        # Controller condiviso da tutte le chiamate di questo analyzer
+        self.concurrency = AdaptiveConcurrencyController(
+            initial=AI_CONCURRENCY_CONFIG['initial'],
+            min_limit=AI_CONCURRENCY_CONFIG['min'],
+            max_limit=AI_CONCURRENCY_CONFIG['max'],
+            decrease_factor=AI_CONCURRENCY_CONFIG['decrease_factor']
+        )
+
+        # Cache sentiment persistente tra analisi
+        self.sentiment_cache = SentimentCache(logger=self.logger) if SENTIMENT_CACHE_ENABLED else None
+        self._seconds_per_text = None
+
+        # Engine locale: etichetta tutti i commenti, OpenAI solo per i dubbi
+        self.local_sentiment = LocalSentimentEngine()
+        self.language_detector = LanguageDetector()
+        self.topic_engine = TopicEngine()
+
+        # Dedup near-duplicate/spam prima di sentiment e insight
+        self.deduplicator = CommentDeduplicator()
+
+        # Token, costo e latenza delle chiamate + budget per analisi
+        self.usage = UsageMeter()
+
+    def analyze_comments(self, comments, social_type='general', deferred=False):
         """
         Analisi completa commenti con AI
 
         Args:
             comments: Lista commenti con 'text'
             social_type: Tipo social per contesto
+            deferred: Se True nessuna chiamata OpenAI: risultati locali e
+                      richieste salvate in 'deferred' per la Batch API
 
         Returns:
             Dict con sentiment, wordcloud, insight
         """
+        # Le chiamate OpenAI di questa analisi sono attribuite al social
+        token = current_social.set(social_type)
+        try:
+            return self._analyze_comments(comments, social_type, deferred)
+        finally:
+            current_social.reset(token)
+
+    def _analyze_comments(self, comments, social_type, deferred=False):
+        """Corpo di analyze_comments (social già impostato nel contesto)"""
         if not comments:
             return self._empty_analysis()
 
         self.logger.info(f"Analisi AI di {len(comments)} commenti ({social_type})")
 
-        # Estrai solo testo
-        texts = [c.get('text', '') for c in comments if c.get('text', '').strip()]
+        # Solo commenti con testo
+        comments = [c for c in comments if c.get('text', '').strip()]
+        texts = [c['text'] for c in comments]
 
         if not texts:
             return self._empty_analysis()
 
-        # 1. Sentiment Analysis
-        sentiment = self._analyze_sentiment(texts)
+        # Lingua: già rilevata dallo scraper, altrimenti qui
+        self.language_detector.tag(comments)
+        languages = [c['lang'] for c in comments]
 
-        # 2. Wordcloud (parole più frequenti)
-        wordcloud = self._generate_wordcloud_data(texts)
+        # 0. Collasso near-duplicate + spam: all'AI vanno i rappresentanti
+        rep_indices, weights, clean_indices, dedup_stats = self._deduplicate(comments)
+        representatives = [texts[i] for i in rep_indices]
 
-        # 3. AI Insights
-        insights = self._extract_insights(texts, social_type)
+        # Strati di campionamento (post, fascia di like) e peso like dei rappresentanti
+        strata = [comment_stratum(comments[i]) for i in rep_indices]
+        like_weights = [
+            weight * like_weight(comments[i].get('likes'))
+            for i, weight in zip(rep_indices, weights)
+        ]
 
-        return {
+        # 1. Sentiment Analysis (pesato per dimensione cluster, per lingua)
+        sentiment, sentiment_stats = self._analyze_sentiment(
+            representatives, weights, [languages[i] for i in rep_indices],
+            strata=strata, deferred=deferred
+        )
+
+        # 2. Wordcloud (parole più frequenti, spam escluso, stopword per lingua)
+        wordcloud, top_emojis = self._generate_wordcloud_data(
+            [texts[i] for i in clean_indices], [languages[i] for i in clean_indices]
+        )
+
+        # 3. Topic locali su tutti i rappresentanti (nessuna chiamata API)
+        topics = self._extract_topics(representatives, weights, [languages[i] for i in rep_indices])
+
+        # 4. AI Insights
+        insight_requests = []
+        if deferred:
+            insights, insight_requests = self._defer_insights(
+                representatives, social_type, topics, strata, like_weights
+            )
+        elif representatives:
+            insights = self._extract_insights(representatives, social_type, topics, strata, like_weights)
+        else:
+            insights = self._empty_insights()
+
+        analysis = {
             'sentiment': sentiment,
             'wordcloud': wordcloud,
+            'top_emojis': top_emojis,
             'insights': insights,
+            'topics': topics,
+            'dedup': dedup_stats,
+            'sentiment_cache': sentiment_stats['cache'],
+            'sentiment_engine': sentiment_stats['engine'],
+            'languages': self._language_breakdown(languages, sentiment_stats['by_language']),
             'total_analyzed': len(texts)
         }
 
-    def _analyze_sentiment(self, texts):
+        # Richieste in attesa della Batch API (modalità deferred)
+        requests = sentiment_stats['deferred']['requests'] + insight_requests
+        if requests:
+            analysis['deferred'] = {
+                'requests': requests,
+                'pending_sentiment': sentiment_stats['deferred']['pending'],
+                'job_id': None
+            }
+
+        return analysis
+
+    def aggregate_analyses(self, per_social, local=False):
         """
-        Analizza sentiment con OpenAI
+        Analisi AI a livello brand dalle analisi dei singoli social
+
+        Somma sentiment e lingue e fonde gli insight per social con un solo
+        passo di reduce: nessun testo di commento viene reinviato.
 
         Args:
-            texts: Lista testi commenti
+            per_social: Dict {social: analisi di analyze_comments}
+            local: Se True fusione insight senza LLM (modalità deferred)
 
         Returns:
-            Dict con conteggi sentiment
+            Dict con sentiment, insights, languages, socials, total_analyzed
         """
-        self.logger.info("Analizzando sentiment...")
+        analyses = {
+            social: a for social, a in per_social.items()
+            if social != 'aggregated' and a and a.get('total_analyzed')
+        }
+        if not analyses:
+            return self._empty_aggregated()
+
+        self.logger.info(f"Aggregazione AI cross-social ({', '.join(analyses)})")
+
+        # Sentiment e lingue: somme dei conteggi per social
+        sentiment = {'positive': 0, 'neutral': 0, 'negative': 0}
+        languages = {}
+        for analysis in analyses.values():
+            for label in sentiment:
+                sentiment[label] += analysis.get('sentiment', {}).get(label, 0)
+            for lang, data in analysis.get('languages', {}).items():
+                languages[lang] = languages.get(lang, 0) + data['count']
+
+        total = sum(sentiment.values())
+        for label in ('positive', 'neutral', 'negative'):
+            sentiment[f"{label}_pct"] = round(sentiment[label] / total * 100, 1) if total else 0
+
+        # Insight: i parziali per social (con il loro sentiment) vanno al reduce
+        partials = [
+            ({
+                'social': social,
+                'sentiment_pct': {
+                    label: analysis['sentiment'].get(f"{label}_pct", 0)
+                    for label in ('positive', 'neutral', 'negative')
+                },
+                **analysis.get('insights', self._empty_insights())
+            }, analysis['total_analyzed'])
+            for social, analysis in analyses.items()
+        ]
 
-        # Campiona se troppi commenti (per risparmiare token)
-        sample_size = min(200, len(texts))
-        sample_texts = texts[:sample_size]
+        if len(partials) == 1:
+            insights = self._normalize_insights(partials[0][0])
+        elif local:
+            insights = self._merge_insights_locally([p for p, _ in partials])
+        else:
+            insights = self._reduce_insights(partials, f"del brand ({', '.join(analyses)})", phase='aggregate')
 
-        # Batch sentiment analysis
-        sentiments = {'positive': 0, 'neutral': 0, 'negative': 0}
+        language_total = sum(languages.values())
+        return {
+            'sentiment': sentiment,
+            'insights': insights,
+            'languages': {
+                lang: {'count': count, 'pct': round(count / language_total * 100, 1)}
+                for lang, count in sorted(languages.items(), key=lambda item: item[1], reverse=True)
+            },
+            'socials': list(analyses),
+            'total_analyzed': sum(a['total_analyzed'] for a in analyses.values())
+        }
+
+    def _deduplicate(self, comments):
+        """
+        Collassa near-duplicate e scarta spam prima dell'AI
+
+        Args:
+            comments: Lista commenti con 'text'
+
+        Returns:
+            Tuple (indici rappresentanti, pesi cluster, indici non-spam, statistiche)
+        """
+        if not DEDUP_CONFIG['enabled']:
+            indices = list(range(len(comments)))
+            return indices, [1] * len(indices), indices, {}
+
+        result = self.deduplicator.deduplicate(comments)
+        clusters = [c for c in result['clusters'] if not c['spam']]
+
+        rep_indices = [c['representative'] for c in clusters]
+        weights = [c['size'] for c in clusters]
+        clean_indices = [i for c in clusters for i in c['members']]
+
+        stats = result['stats']
+        self.logger.info(f"✓ Dedup: {stats['total_comments']} commenti -> "
+                         f"{stats['representatives']} rappresentanti "
+                         f"({stats['spam_comments']} spam)")
+
+        return rep_indices, weights, clean_indices, stats
+
+    def _analyze_sentiment(self, texts, weights=None, languages=None, strata=None, deferred=False):
+        """
+        Analizza sentiment: engine locale + escalation OpenAI
+
+        In modalità 'hybrid' tutti i commenti sono classificati localmente e
+        solo quelli a bassa confidenza vengono inviati a OpenAI. I testi
+        duplicati (dopo normalizzazione) vengono inviati una sola volta e le
+        label già note sono lette dalla cache persistente.
+
+        Ciò che va a OpenAI è un campione stratificato per post e fascia di
+        like, dimensionato sull'intervallo di confidenza (SAMPLING_CONFIG):
+        i commenti del primo post non sono privilegiati.
+
+        Args:
+            texts: Lista testi commenti
+            weights: Peso di ogni testo nel conteggio (es. dimensione del
+                     cluster di near-duplicate), default 1
+            languages: Lingua di ogni testo (instrada i batch OpenAI e il
+                       conteggio per lingua), default indeterminata
+            strata: Strato di ogni testo (post, fascia like), default unico
+            deferred: Se True le escalation diventano richieste Batch API e
+                      il conteggio usa le label locali fino al merge
+
+        Returns:
+            Tuple (dict con conteggi sentiment, dict statistiche run)
+        """
+        self.logger.info(f"Analizzando sentiment (engine: {SENTIMENT_ENGINE})...")
+
+        if weights is None:
+            weights = [1] * len(texts)
+        if languages is None:
+            languages = [None] * len(texts)
+        if strata is None:
+            strata = [None] * len(texts)
+
+        # Modalità solo-LLM: campione stratificato dei commenti (un cluster di
+        # near-duplicate conta per la sua dimensione); ogni commento estratto
+        # pesa per il fattore di espansione del suo strato
+        population = sum(weights)
+        if SENTIMENT_ENGINE == 'llm':
+            units = [i for i, weight in enumerate(weights) for _ in range(weight)]
+            sample = stratified_sample([strata[i] for i in units], sample_size(len(units)))
+            # Almeno un commento per strato: il campione può superare la dimensione Cochran
+            size = len(sample)
+            sampled = Counter()
+            for unit, expansion in sample:
+                sampled[units[unit]] += expansion
+
+            texts = [texts[i] for i in sampled]
+            weights = list(sampled.values())
+            languages = [languages[i] for i in sampled]
+            strata = [strata[i] for i in sampled]
+
+        # Dedup in-run: un'unica classificazione per testo normalizzato
+        keys = [self._sentiment_key(text) for text in texts]
+        unique_texts = {}
+        unique_languages = {}
+        unique_strata = {}
+        for key, text, lang, stratum in zip(keys, texts, languages, strata):
+            unique_texts.setdefault(key, text)
+            unique_languages.setdefault(key, lang)
+            unique_strata.setdefault(key, stratum)
+
+        # Classificazione locale (anche fallback se l'API fallisce)
+        local_results = dict(zip(
+            unique_texts.keys(),
+            self.local_sentiment.score_many(unique_texts.values())
+        ))
+
+        if SENTIMENT_ENGINE == 'local':
+            escalate = []
+        elif SENTIMENT_ENGINE == 'llm':
+            escalate = list(unique_texts.keys())
+        else:
+            escalate = self._sample_escalation([
+                key for key, (_, confidence) in local_results.items()
+                if confidence < LOCAL_SENTIMENT_CONFIDENCE_THRESHOLD
+            ], unique_strata)
 
-        # Analizza a batch di 20
-        batch_size = 20
-        for i in range(0, len(sample_texts), batch_size):
-            batch = sample_texts[i:i + batch_size]
-            batch_sentiments = self._batch_sentiment_analysis(batch)
+        escalate = self._budget_escalation(escalate, unique_texts, local_results)
 
-            for s in batch_sentiments:
-                sentiments[s] = sentiments.get(s, 0) + 1
+        llm_labels, cache_stats, requests = self._llm_sentiment(
+            escalate, unique_texts, keys, unique_languages, deferred=deferred
+        )
+
+        # Conteggio su tutti i commenti (duplicati inclusi, con peso)
+        sentiments = {'positive': 0, 'neutral': 0, 'negative': 0}
+        by_language = {}
+        for key, weight, lang in zip(keys, weights, languages):
+            s = llm_labels.get(key) or local_results[key][0]
+            sentiments[s] = sentiments.get(s, 0) + weight
+            lang_counts = by_language.setdefault(lang, {'positive': 0, 'neutral': 0, 'negative': 0})
+            lang_counts[s] += weight
 
         # Calcola percentuali
         total = sum(sentiments.values())
@@ -103,115 +366,709 @@ class AIAnalyzer:
             sentiments['negative_pct'] = 0
 
         self.logger.info(f"✓ Sentiment: {sentiments['positive']} pos, "
-                        f"{sentiments['neutral']} neu, {sentiments['negative']} neg")
+                        f"{sentiments['neutral']} neu, {sentiments['negative']} neg "
+                        f"({len(escalate)} testi inviati a OpenAI/cache)")
+
+        engine_stats = {
+            'mode': SENTIMENT_ENGINE,
+            'labeled': sum(weights),
+            'unique_texts': len(unique_texts),
+            'escalated': len(escalate),
+            'llm_labeled': len(llm_labels),
+            'local_fallback': len(escalate) - len(llm_labels)
+        }
+        if SENTIMENT_ENGINE == 'llm':
+            engine_stats['sample'] = {
+                'size': size,
+                'population': population,
+                'confidence': SAMPLING_CONFIG['confidence'],
+                'margin': SAMPLING_CONFIG['margin']
+            }
+
+        # Label in attesa: peso totale, lingua e label locale per il ricalcolo
+        pending = {}
+        if requests:
+            requested = {key for request in requests for key in request['keys']}
+            for key, weight, lang in zip(keys, weights, languages):
+                if key in requested:
+                    entry = pending.setdefault(key, {'weight': 0, 'lang': lang, 'local': local_results[key][0]})
+                    entry['weight'] += weight
+
+        return sentiments, {
+            'cache': cache_stats,
+            'engine': engine_stats,
+            'by_language': by_language,
+            'deferred': {'requests': requests, 'pending': pending}
+        }
 
-        return sentiments
+    def _sample_escalation(self, escalate, unique_strata):
+        """
+        Campione stratificato dei commenti dubbi da inviare a OpenAI
 
-    def _batch_sentiment_analysis(self, texts):
-        """Analizza sentiment di un batch di testi"""
-        try:
-            # Crea prompt per batch
-            comments_text = "\n".join([f"{i+1}. {text[:200]}" for i, text in enumerate(texts)])
+        Args:
+            escalate: Chiavi a bassa confidenza locale
+            unique_strata: Dict {chiave: strato}
 
-            prompt = f"""Analizza il sentiment di questi commenti e rispondi SOLO con una lista di valori separati da virgola.
-Per ogni commento, indica: positive, neutral, o negative.
+        Returns:
+            Lista chiavi campionate
+        """
+        size = sample_size(len(escalate))
+        if size >= len(escalate):
+            return escalate
 
-Commenti:
-{comments_text}
+        sample = stratified_sample([unique_strata[key] for key in escalate], size)
+        self.logger.info(f"Escalation campionata: {len(sample)}/{len(escalate)} commenti dubbi")
+        return [escalate[i] for i, _ in sample]
+
+    def _budget_escalation(self, escalate, unique_texts, local_results):
+        """
+        Riduce l'escalation OpenAI al budget residuo dell'analisi
+
+        Budget esaurito: nessuna escalation (label locali). Budget di token
+        limitato: si tengono i commenti a confidenza locale più bassa finché
+        la stima dei token rientra nel residuo.
+
+        Args:
+            escalate: Chiavi da escalare
+            unique_texts: Dict {chiave: testo}
+            local_results: Dict {chiave: (label, confidenza)}
+
+        Returns:
+            Lista chiavi da escalare
+        """
+        if not escalate:
+            return escalate
+
+        if self.usage.exhausted():
+            self.usage.degrade('sentiment', 'local_sentiment')
+            return []
+
+        remaining = self.usage.remaining_tokens()
+        if remaining is None:
+            return escalate
+
+        budget = SENTIMENT_TOKEN_BUDGET
+        per_request = budget['prompt_overhead_tokens'] + 20
+        texts_per_request = max(1, budget['max_output_tokens'] // budget['output_tokens_per_comment'])
+
+        selected = []
+        spent = 0
+        for key in sorted(escalate, key=lambda k: local_results[k][1]):
+            cost = (min(count_tokens(unique_texts[key]), budget['max_comment_tokens']) + 8
+                    + budget['output_tokens_per_comment'] + per_request / texts_per_request)
+            if spent + cost > remaining:
+                break
+            selected.append(key)
+            spent += cost
+
+        if len(selected) < len(escalate):
+            self.usage.degrade('sentiment', 'sampled_escalation')
+            self.logger.warning(f"Budget AI: escalation ridotta a {len(selected)}/{len(escalate)} commenti")
+
+        return selected
+
+    def _llm_sentiment(self, escalate, unique_texts, keys, unique_languages=None, deferred=False):
+        """
+        Label OpenAI per i testi da escalare (cache + batch concorrenti)
+
+        I batch sono omogenei per lingua: il prompt indica la lingua dei
+        commenti invece di assumere l'italiano.
+
+        Args:
+            escalate: Chiavi dei testi da classificare con OpenAI
+            unique_texts: Dict {chiave: testo}
+            keys: Chiavi di tutti i commenti (per le statistiche)
+            unique_languages: Dict {chiave: lingua} (opzionale)
+            deferred: Se True i batch non sono inviati ma restituiti come
+                      richieste Batch API (la cache è comunque consultata)
+
+        Returns:
+            Tuple (dict {chiave: label}, dict statistiche cache,
+                   lista richieste deferred)
+        """
+        if not escalate:
+            return {}, self._sentiment_cache_stats(0, 0, 0, 0, 0.0), []
+
+        labels = self.sentiment_cache.get_many(escalate) if self.sentiment_cache else {}
+        cache_hits = len(labels)
+        to_send = [(key, unique_texts[key]) for key in escalate if key not in labels]
+
+        # Batch per lingua impacchettati per budget di token, eseguiti in parallelo
+        by_language = {}
+        for key, text in to_send:
+            lang = (unique_languages or {}).get(key)
+            by_language.setdefault(lang, []).append((key, text))
+
+        jobs = [
+            (lang, batch)
+            for lang, items in by_language.items()
+            for batch in self._pack_sentiment_batches(items)
+        ]
+
+        if deferred:
+            requests = []
+            for lang, batch in jobs:
+                messages, max_tokens = self._build_sentiment_request([text for _, text in batch], lang)
+                requests.append({
+                    'kind': 'sentiment',
+                    'keys': [key for key, _ in batch],
+                    'body': self._request_body(messages, max_tokens, response_format={"type": "json_object"})
+                })
+            self.logger.info(f"Sentiment deferred: {len(to_send)} testi in {len(requests)} richieste batch")
+            return labels, self._sentiment_cache_stats(len(escalate), cache_hits, 0, 0, 0.0), requests
+
+        api_start = time.perf_counter()
+        batch_results = run_concurrent(
+            lambda job: self._batch_sentiment_analysis([text for _, text in job[1]], job[0]),
+            jobs,
+            self.concurrency
+        )
+        api_seconds = time.perf_counter() - api_start
+
+        new_labels = {}
+        for (_, batch), batch_sentiments in zip(jobs, batch_results):
+            for (key, _), label in zip(batch, batch_sentiments):
+                if label:
+                    new_labels[key] = label
+
+        if self.sentiment_cache:
+            self.sentiment_cache.set_many(new_labels)
+        labels.update(new_labels)
+
+        # Occorrenze che senza dedup/cache sarebbero state inviate
+        escalated_set = set(escalate)
+        occurrences = sum(1 for key in keys if key in escalated_set)
+        avg_tokens = sum(
+            count_tokens(unique_texts[key]) + SENTIMENT_TOKEN_BUDGET['output_tokens_per_comment']
+            for key in escalate
+        ) / len(escalate)
+
+        cache_stats = self._sentiment_cache_stats(
+            len(escalate), cache_hits, len(to_send),
+            (occurrences - len(to_send)) * avg_tokens, api_seconds,
+            saved_count=occurrences - len(to_send)
+        )
+
+        return labels, cache_stats, []
+
+    def _sentiment_key(self, text):
+        """Chiave di dedup/cache per un commento"""
+        if self.sentiment_cache:
+            return self.sentiment_cache.make_key(text)
+        return SentimentCache.normalize_text(text)
+
+    def _pack_sentiment_batches(self, items):
+        """
+        Impacchetta (chiave, testo) in batch entro il budget di token
 
-Rispondi SOLO con: sentiment1,sentiment2,sentiment3,...
-Esempio: positive,neutral,negative,positive"""
-
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Sei un analista di sentiment. Rispondi solo con la lista richiesta."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=OPENAI_TEMPERATURE
+        I testi sono troncati a max_comment_tokens; ogni batch resta entro
+        max_input_tokens di prompt e max_output_tokens di risposta.
+
+        Args:
+            items: Lista tuple (chiave, testo)
+
+        Returns:
+            Lista di batch di tuple (chiave, testo troncato)
+        """
+        budget = SENTIMENT_TOKEN_BUDGET
+
+        truncated = [
+            (key, truncate_to_tokens(text, budget['max_comment_tokens']))
+            for key, text in items
+        ]
+        # ~8 token di struttura JSON per item ({"id": "cN", "text": ...})
+        token_counts = [count_tokens(text) + 8 for _, text in truncated]
+
+        return pack_batches(
+            truncated,
+            token_counts,
+            max_input_tokens=budget['max_input_tokens'],
+            max_output_tokens=budget['max_output_tokens'],
+            output_tokens_per_item=budget['output_tokens_per_comment'],
+            overhead_tokens=budget['prompt_overhead_tokens']
+        )
+
+    def _sentiment_cache_stats(self, unique_count, cache_hits, sent_count,
+                               saved_tokens, api_seconds, saved_count=0):
+        """
+        Statistiche di risparmio di dedup + cache per una run sentiment
+
+        Token e secondi risparmiati sono stimati: ~4 caratteri per token e
+        latenza API media per commento inviato.
+        """
+        if sent_count:
+            per_text = api_seconds / sent_count
+            self._seconds_per_text = (
+                per_text if self._seconds_per_text is None
+                else (self._seconds_per_text + per_text) / 2
             )
 
-            result = response.choices[0].message.content.strip()
+        return {
+            'unique_texts': unique_count,
+            'cache_hits': cache_hits,
+            'sent_to_api': sent_count,
+            'hit_rate': round(cache_hits / unique_count * 100, 1) if unique_count else 0,
+            'est_tokens_saved': int(saved_tokens),
+            'est_seconds_saved': round(saved_count * (self._seconds_per_text or 0), 2)
+        }
 
-            # Parse risultati
-            sentiments = [s.strip().lower() for s in result.split(',')]
+    def _batch_sentiment_analysis(self, texts, language=None):
+        """
+        Analizza sentiment di un batch di testi
 
-            # Valida
-            valid_sentiments = []
-            for s in sentiments:
-                if s in ['positive', 'neutral', 'negative']:
-                    valid_sentiments.append(s)
-                else:
-                    valid_sentiments.append('neutral')  # Default
+        Args:
+            texts: Testi del batch
+            language: Lingua comune dei testi (opzionale)
 
-            return valid_sentiments
+        Returns:
+            Lista label allineata ai testi (None se non disponibile)
+        """
+        if self.usage.exhausted():
+            # Budget esaurito durante la run: label locali per questo batch
+            self.usage.degrade('sentiment', 'local_sentiment')
+            return [None] * len(texts)
+
+        try:
+            messages, max_tokens = self._build_sentiment_request(texts, language)
+
+            response = self._chat_completion(
+                messages=messages,
+                max_tokens=max_tokens,
+                phase='sentiment',
+                response_format={"type": "json_object"}
+            )
+
+            return self._parse_sentiment_response(response.choices[0].message.content, len(texts))
 
         except Exception as e:
             self.logger.warning(f"Errore batch sentiment: {e}")
-            return ['neutral'] * len(texts)
+            return [None] * len(texts)
 
-    def _generate_wordcloud_data(self, texts):
+    def _build_sentiment_request(self, texts, language=None):
         """
-        Genera dati per wordcloud
+        Costruisce messaggi e max_tokens per un batch sentiment
+
+        Ogni commento ha un ID ("c1", "c2", ...) e la risposta è un JSON
+        indicizzato per ID: le label non possono slittare di posizione.
 
         Args:
-            texts: Lista testi
+            texts: Testi del batch (già troncati al budget per commento)
+            language: Lingua dei commenti ('it', 'en', ...); se nota è
+                      indicata nel prompt
 
         Returns:
-            Lista dict con {word, frequency}
+            Tuple (messages, max_tokens)
         """
-        self.logger.info("Generando wordcloud data...")
+        items = [{'id': f"c{i + 1}", 'text': text} for i, text in enumerate(texts)]
+
+        language_hint = ''
+        if language in LANGUAGE_NAMES:
+            language_hint = (f"\nI commenti sono in {LANGUAGE_NAMES[language]}: "
+                             f"valuta il sentiment nella loro lingua originale.")
 
-        # Combina tutti i testi
-        all_text = ' '.join(texts).lower()
+        prompt = f"""Analizza il sentiment di ciascun commento (positive, neutral o negative).{language_hint}
 
-        # Pulisci testo
-        all_text = re.sub(r'[^\w\s]', ' ', all_text)  # Rimuovi punteggiatura
-        all_text = re.sub(r'\d+', '', all_text)  # Rimuovi numeri
+Commenti (JSON):
+{json.dumps(items, ensure_ascii=False)}
 
-        # Tokenizza
-        words = all_text.split()
+Rispondi SOLO con un oggetto JSON nel formato:
+{{"results": [{{"id": "c1", "sentiment": "positive"}}, {{"id": "c2", "sentiment": "neutral"}}]}}"""
 
-        # Filtra stopwords e parole corte
-        filtered_words = [
-            word for word in words
-            if word not in ITALIAN_STOPWORDS
-            and len(word) > 3  # Almeno 4 caratteri
-            and not word.startswith(('http', 'www'))
+        messages = [
+            {"role": "system", "content": "Sei un analista di sentiment. Rispondi solo con il JSON richiesto."},
+            {"role": "user", "content": prompt}
         ]
 
-        # Conta frequenze
-        word_counts = Counter(filtered_words).most_common(WORDCLOUD_CONFIG['max_words'])
+        max_tokens = min(
+            SENTIMENT_TOKEN_BUDGET['max_output_tokens'],
+            20 + SENTIMENT_TOKEN_BUDGET['output_tokens_per_comment'] * len(texts)
+        )
+
+        return messages, max_tokens
+
+    def _parse_sentiment_response(self, content, count):
+        """
+        Parse risposta sentiment JSON indicizzata per ID
+
+        Args:
+            content: Testo risposta
+            count: Numero commenti del batch
+
+        Returns:
+            Lista label allineata (None per ID mancanti o non validi)
+        """
+        data = json.loads(content)
+        results = data.get('results', data) if isinstance(data, dict) else data
+
+        # Accetta sia lista [{id, sentiment}] che dict {id: sentiment}
+        if isinstance(results, dict):
+            by_id = {str(k): v for k, v in results.items()}
+        else:
+            by_id = {
+                str(r.get('id')): r.get('sentiment')
+                for r in results if isinstance(r, dict)
+            }
+
+        labels = []
+        for i in range(count):
+            label = str(by_id.get(f"c{i + 1}", '')).strip().lower()
+            labels.append(label if label in ('positive', 'neutral', 'negative') else None)
+
+        return labels
+
+    def _generate_wordcloud_data(self, texts, languages=None):
+        """
+        Genera dati per wordcloud (parole, frasi, hashtag) ed emoji top
+
+        Tokenizer streaming con stopword della lingua di ogni commento
+        (IT+EN se indeterminata); sopra parallel_threshold testi il conteggio
+        è distribuito su un process pool.
+
+        Args:
+            texts: Lista testi
+            languages: Lingua di ogni testo (opzionale)
+
+        Returns:
+            Tuple (lista dict {word, frequency}, lista dict {emoji, frequency})
+        """
+        self.logger.info("Generando wordcloud data...")
+
+        if languages is None:
+            languages = [None] * len(texts)
+
+        texts_by_language = {}
+        for text, lang in zip(texts, languages):
+            texts_by_language.setdefault(lang, []).append(text)
+
+        terms = Counter()
+        emojis = Counter()
+        for lang, lang_texts in texts_by_language.items():
+            stopwords = STOPWORDS_BY_LANGUAGE.get(lang, DEFAULT_STOPWORDS)
+            lang_terms, lang_emojis = count_terms_parallel(lang_texts, stopwords, logger=self.logger)
+            terms.update(lang_terms)
+            emojis.update(lang_emojis)
+
+        # Frasi sotto soglia sono rumore: restano solo le ricorrenti
+        min_phrase_count = TOKENIZER_CONFIG['min_phrase_count']
+        word_counts = Counter({
+            term: count for term, count in terms.items()
+            if ' ' not in term or count >= min_phrase_count
+        }).most_common(WORDCLOUD_CONFIG['max_words'])
 
         wordcloud_data = [
             {'word': word, 'frequency': count}
             for word, count in word_counts
         ]
+        top_emojis = [
+            {'emoji': emoji, 'frequency': count}
+            for emoji, count in emojis.most_common(10)
+        ]
+
+        self.logger.info(f"✓ Wordcloud: {len(wordcloud_data)} termini, {len(top_emojis)} emoji")
+
+        return wordcloud_data, top_emojis
+
+    def _extract_topics(self, texts, weights, languages):
+        """
+        Topic locali (TF-IDF + k-means) sui commenti
 
-        self.logger.info(f"✓ Wordcloud: {len(wordcloud_data)} parole uniche")
+        Args:
+            texts: Lista testi (rappresentanti dedup)
+            weights: Peso di ogni testo
+            languages: Lingua di ogni testo
+
+        Returns:
+            Lista dict topic (vuota se i commenti sono troppo pochi)
+        """
+        start = time.perf_counter()
+        try:
+            topics = self.topic_engine.fit(texts, weights, languages)
+        except Exception as e:
+            self.logger.warning(f"Errore topic locali: {e}")
+            return []
 
-        return wordcloud_data
+        self.logger.info(f"✓ Topic: {len(topics)} temi da {len(texts)} commenti "
+                         f"in {time.perf_counter() - start:.2f}s")
+        return topics
 
-    def _extract_insights(self, texts, social_type):
+    def _extract_insights(self, texts, social_type, topics=None, strata=None, sample_weights=None):
         """
         Estrae insight con OpenAI
 
+        In modalità 'topics' il prompt contiene i topic locali (parole chiave,
+        quote, esempi) invece dei commenti: una chiamata compatta che copre
+        tutti i commenti. In modalità 'map_reduce' copre tutti i commenti con
+        chunk analizzati in parallelo (map) e fusi in una chiamata (reduce).
+        Se non ci sono topic o i commenti stanno in un solo chunk basta una
+        chiamata diretta. I topic completano sempre i temi ricorrenti.
+
         Args:
             texts: Lista testi commenti
             social_type: Tipo social
+            topics: Topic locali (opzionale)
+            strata: Strato di ogni testo per il campione 'sample'
+            sample_weights: Peso di ogni testo (cluster × like) per il campione
 
         Returns:
             Dict con punti forza, debolezza, suggerimenti
         """
         self.logger.info("Estraendo insight con AI...")
 
-        # Campiona commenti rappresentativi
-        sample_size = min(100, len(texts))
-        sample = texts[:sample_size]
+        if self.usage.exhausted():
+            # Budget esaurito: solo temi dai topic locali
+            self.usage.degrade('insights', 'topic_insights')
+            insights = self._empty_insights()
+        elif INSIGHTS_MODE == 'topics' and topics:
+            insights = self._extract_insights_topics(topics, social_type)
+        elif INSIGHTS_MODE in ('map_reduce', 'topics'):
+            chunks = self._budget_chunks(self._pack_insight_chunks(texts))
+            if len(chunks) > 1:
+                insights = self._extract_insights_map_reduce(chunks, social_type)
+            else:
+                # Tutti i commenti stanno in un chunk: una chiamata diretta
+                insights = self._extract_insights_sample(chunks[0] if chunks else [], social_type)
+        else:
+            insights = self._extract_insights_sample(
+                self._insight_sample(texts, strata, sample_weights), social_type
+            )
+
+        if not insights['temi_ricorrenti'] and topics:
+            insights['temi_ricorrenti'] = self._topic_themes(topics)
+
+        return insights
+
+    def _budget_chunks(self, chunks):
+        """
+        Limita i chunk map-reduce al budget di token residuo
+
+        Ogni chunk costa al massimo chunk_input_tokens + map_output_tokens;
+        una risposta di reduce resta riservata. I chunk tenuti sono
+        campionati a passo costante.
+        """
+        remaining = self.usage.remaining_tokens()
+        if remaining is None or len(chunks) <= 1:
+            return chunks
+
+        budget = INSIGHTS_TOKEN_BUDGET
+        per_chunk = budget['chunk_input_tokens'] + budget['map_output_tokens']
+        affordable = max(1, int((remaining - OPENAI_MAX_TOKENS) // per_chunk))
+
+        if affordable >= len(chunks):
+            return chunks
+
+        self.usage.degrade('insights', 'sampled_chunks')
+        self.logger.warning(f"Budget AI: insight su {affordable}/{len(chunks)} chunk")
+        step = len(chunks) / affordable
+        return [chunks[int(i * step)] for i in range(affordable)]
 
+    def _insight_sample(self, texts, strata=None, weights=None,
+                        size=SAMPLING_CONFIG['insights_sample_size']):
+        """
+        Campione per il prompt insight: stratificato per post, pesato per like
+
+        Args:
+            texts: Testi rappresentanti
+            strata: Strato di ogni testo (post, fascia like)
+            weights: Peso di ogni testo (default 1)
+            size: Commenti nel campione
+
+        Returns:
+            Lista testi campionati (ordine originale)
+        """
+        if len(texts) <= size:
+            return texts
+
+        posts = [stratum[0] if stratum else None for stratum in strata or [None] * len(texts)]
+        sample = stratified_sample(posts, size, weights or [1] * len(texts))
+        return [texts[i] for i, _ in sample]
+
+    def _defer_insights(self, texts, social_type, topics, strata=None, sample_weights=None):
+        """
+        Insight in modalità deferred: temi locali subito, richiesta batch per il resto
+
+        Args:
+            texts: Testi rappresentanti
+            social_type: Tipo social
+            topics: Topic locali
+            strata: Strato di ogni testo (campione senza topic)
+            sample_weights: Peso di ogni testo per il campione
+
+        Returns:
+            Tuple (insight provvisori, lista richieste deferred)
+        """
+        insights = self._empty_insights()
+        insights['temi_ricorrenti'] = self._topic_themes(topics)
+
+        if topics:
+            messages = self._build_topics_insights_messages(topics, social_type)
+            max_tokens = OPENAI_MAX_TOKENS
+        elif texts:
+            chunks = self._pack_insight_chunks(self._insight_sample(texts, strata, sample_weights))
+            messages = self._build_chunk_insights_messages(chunks[0], social_type)
+            max_tokens = INSIGHTS_TOKEN_BUDGET['map_output_tokens']
+        else:
+            return insights, []
+
+        request = {
+            'kind': 'insights',
+            'body': self._request_body(messages, max_tokens, response_format={"type": "json_object"})
+        }
+        return insights, [request]
+
+    def merge_deferred(self, analysis, contents):
+        """
+        Applica a un'analisi le risposte Batch API delle sue richieste deferred
+
+        Le label sentiment ricevute sostituiscono quelle locali (conteggi,
+        percentuali e breakdown per lingua ricalcolati) e vanno in cache;
+        gli insight sostituiscono quelli provvisori. Richieste senza
+        risposta mantengono i risultati locali.
+
+        Args:
+            analysis: Analisi di un social con chiave 'deferred'
+            contents: Dict {indice richiesta: contenuto risposta o None}
+
+        Returns:
+            Analisi aggiornata (senza 'deferred')
+        """
+        deferred = analysis.pop('deferred', None)
+        if not deferred:
+            return analysis
+
+        new_labels = {}
+        merged = 0
+        for idx, request in enumerate(deferred['requests']):
+            content = contents.get(idx)
+            if content is None:
+                continue
+
+            try:
+                if request['kind'] == 'sentiment':
+                    labels = self._parse_sentiment_response(content, len(request['keys']))
+                    new_labels.update((k, l) for k, l in zip(request['keys'], labels) if l)
+                else:
+                    insights = self._normalize_insights(json.loads(content))
+                    if not insights['temi_ricorrenti']:
+                        insights['temi_ricorrenti'] = analysis['insights'].get('temi_ricorrenti', [])
+                    analysis['insights'] = insights
+                merged += 1
+            except (ValueError, AttributeError) as e:
+                self.logger.warning(f"Risposta batch non valida ({request['kind']}): {e}")
+
+        # Ricalcolo sentiment: sposta il peso dalla label locale a quella OpenAI
+        sentiment = analysis['sentiment']
+        languages = analysis.get('languages', {})
+        for key, label in new_labels.items():
+            entry = deferred['pending_sentiment'].get(key)
+            if not entry or label == entry['local']:
+                continue
+            for counts in (sentiment, languages.get(entry['lang'], {}).get('sentiment')):
+                if counts is not None:
+                    counts[entry['local']] -= entry['weight']
+                    counts[label] += entry['weight']
+
+        total = sentiment['positive'] + sentiment['neutral'] + sentiment['negative']
+        for label in ('positive', 'neutral', 'negative'):
+            sentiment[f"{label}_pct"] = round(sentiment[label] / total * 100, 1) if total else 0
+
+        engine = analysis.get('sentiment_engine', {})
+        engine['llm_labeled'] = engine.get('llm_labeled', 0) + len(new_labels)
+        engine['local_fallback'] = max(0, engine.get('escalated', 0) - engine['llm_labeled'])
+
+        if self.sentiment_cache:
+            self.sentiment_cache.set_many(new_labels)
+
+        analysis['batch'] = {
+            'requests': len(deferred['requests']),
+            'merged': merged,
+            'labels': len(new_labels),
+            'job_id': deferred.get('job_id')
+        }
+
+        return analysis
+
+    def _extract_insights_topics(self, topics, social_type):
+        """
+        Insight da topic locali in una singola chiamata
+
+        Args:
+            topics: Lista dict topic
+            social_type: Tipo social
+
+        Returns:
+            Dict con punti forza, debolezza, suggerimenti, temi
+        """
+        total = sum(topic['size'] for topic in topics)
+        self.logger.info(f"Insight da {len(topics)} topic ({total} commenti)")
+
+        try:
+            with self.concurrency.slot():
+                response = self._chat_completion(
+                    messages=self._build_topics_insights_messages(topics, social_type),
+                    max_tokens=OPENAI_MAX_TOKENS,
+                    phase='insights',
+                    response_format={"type": "json_object"}
+                )
+            insights = self._normalize_insights(json.loads(response.choices[0].message.content))
+
+            self.logger.info("✓ Insight estratti")
+
+            return insights
+
+        except Exception as e:
+            self.logger.error(f"Errore estrazione insight: {e}")
+            return self._empty_insights()
+
+    def _build_topics_insights_messages(self, topics, social_type):
+        """Messaggi per insight JSON da topic locali"""
+        max_tokens = INSIGHTS_TOKEN_BUDGET['max_comment_tokens']
+        topics_text = json.dumps([
+            {
+                'tema': topic['id'] + 1,
+                'commenti': topic['size'],
+                'quota_pct': topic['share_pct'],
+                'parole_chiave': topic['keywords'],
+                'esempi': [truncate_to_tokens(text, max_tokens) for text in topic['examples']]
+            }
+            for topic in topics
+        ], ensure_ascii=False)
+
+        total = sum(topic['size'] for topic in topics)
+
+        prompt = f"""Questi sono i temi emersi da {total} commenti {social_type}, raggruppati automaticamente.
+Per ogni tema: numero di commenti, quota, parole chiave e commenti di esempio.
+
+Temi:
+{topics_text}
+
+Dai più peso ai temi più grandi. Rispondi SOLO con un oggetto JSON con queste chiavi (3-5 elementi ciascuna):
+{{"punti_forza": [], "punti_debolezza": [], "suggerimenti": [], "temi_ricorrenti": []}}"""
+
+        return [
+            {"role": "system", "content": "Sei un esperto di social media marketing e analisi del sentiment."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _topic_themes(self, topics, limit=5):
+        """Temi ricorrenti dai topic locali (fallback senza LLM)"""
+        return [
+            f"{', '.join(topic['keywords'][:3])} ({topic['share_pct']}%)"
+            for topic in topics[:limit] if topic['keywords']
+        ]
+
+    def _extract_insights_sample(self, texts, social_type):
+        """
+        Insight da un campione dei commenti in una singola chiamata
+
+        Args:
+            texts: Testi commenti già campionati (vedi _insight_sample)
+            social_type: Tipo social
+
+        Returns:
+            Dict con punti forza, debolezza, suggerimenti
+        """
         # Crea prompt
-        comments_text = "\n".join([f"- {text}" for text in sample[:50]])  # Max 50 per token limit
+        comments_text = "\n".join([f"- {text}" for text in texts])
 
         prompt = f"""Analizza questi commenti da {social_type} e fornisci un'analisi strutturata.
 
@@ -241,15 +1098,15 @@ TEMI RICORRENTI:
 - tema 3"""
 
         try:
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Sei un esperto di social media marketing e analisi del sentiment."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=OPENAI_MAX_TOKENS,
-                temperature=OPENAI_TEMPERATURE
-            )
+            with self.concurrency.slot():
+                response = self._chat_completion(
+                    messages=[
+                        {"role": "system", "content": "Sei un esperto di social media marketing e analisi del sentiment."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=OPENAI_MAX_TOKENS,
+                    phase='insights'
+                )
 
             result = response.choices[0].message.content
 
@@ -264,6 +1121,297 @@ TEMI RICORRENTI:
             self.logger.error(f"Errore estrazione insight: {e}")
             return self._empty_insights()
 
+    def _extract_insights_map_reduce(self, chunks, social_type):
+        """
+        Insight map-reduce: insight parziali per chunk + fusione finale
+
+        Args:
+            chunks: Lista di chunk (liste di testi)
+            social_type: Tipo social
+
+        Returns:
+            Dict con punti forza, debolezza, suggerimenti, temi
+        """
+        self.logger.info(f"Insight map-reduce su {len(chunks)} chunk "
+                         f"({sum(len(c) for c in chunks)} commenti)")
+
+        # MAP: insight parziali in parallelo
+        partials = run_concurrent(
+            lambda chunk: self._map_insights_chunk(chunk, social_type),
+            chunks,
+            self.concurrency
+        )
+        partials = [(p, len(c)) for p, c in zip(partials, chunks) if p]
+
+        if not partials:
+            self.logger.error("Errore estrazione insight: nessun chunk analizzato")
+            return self._empty_insights()
+
+        # REDUCE: una sola chiamata sui parziali
+        insights = self._reduce_insights(partials, social_type)
+
+        self.logger.info("✓ Insight estratti")
+
+        return insights
+
+    def _map_insights_chunk(self, chunk, social_type):
+        """Insight parziali (JSON) per un chunk di commenti, None se errore"""
+        if self.usage.exhausted():
+            self.usage.degrade('insights', 'skipped_chunks')
+            return None
+
+        try:
+            response = self._chat_completion(
+                messages=self._build_chunk_insights_messages(chunk, social_type),
+                max_tokens=INSIGHTS_TOKEN_BUDGET['map_output_tokens'],
+                phase='insights_map',
+                response_format={"type": "json_object"}
+            )
+            return self._normalize_insights(json.loads(response.choices[0].message.content))
+
+        except Exception as e:
+            self.logger.warning(f"Errore insight chunk: {e}")
+            return None
+
+    def _build_chunk_insights_messages(self, chunk, social_type):
+        """Messaggi per insight JSON da un chunk di commenti"""
+        comments_text = "\n".join(f"- {text}" for text in chunk)
+
+        prompt = f"""Analizza questi {len(chunk)} commenti da {social_type}.
+
+Commenti:
+{comments_text}
+
+Rispondi SOLO con un oggetto JSON con queste chiavi (liste di stringhe brevi, max 5 elementi ciascuna):
+{{"punti_forza": [], "punti_debolezza": [], "suggerimenti": [], "temi_ricorrenti": []}}"""
+
+        return [
+            {"role": "system", "content": "Sei un esperto di social media marketing e analisi del sentiment."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _reduce_insights(self, partials, social_type, phase='insights_reduce'):
+        """
+        Fonde insight parziali in un'unica analisi
+
+        Args:
+            partials: Lista tuple (insight parziali, numero commenti del chunk)
+            social_type: Tipo social (o 'brand' per la fusione cross-social)
+            phase: Fase per la contabilizzazione dell'uso
+
+        Returns:
+            Dict insight finali (fusione semplice se la chiamata fallisce
+            o il budget è esaurito)
+        """
+        if self.usage.exhausted():
+            self.usage.degrade(phase, 'local_merge')
+            return self._merge_insights_locally([p for p, _ in partials])
+
+        partials_text = json.dumps(
+            [{'commenti': count, **partial} for partial, count in partials],
+            ensure_ascii=False
+        )
+
+        prompt = f"""Questi sono insight parziali estratti da gruppi di commenti {social_type}.
+Il campo "commenti" indica quanti commenti rappresenta ogni gruppo: dai più peso ai gruppi più grandi.
+
+Insight parziali:
+{partials_text}
+
+Unisci i punti simili, elimina i duplicati e tieni i più rilevanti (3-5 per sezione).
+Rispondi SOLO con un oggetto JSON:
+{{"punti_forza": [], "punti_debolezza": [], "suggerimenti": [], "temi_ricorrenti": []}}"""
+
+        try:
+            with self.concurrency.slot():
+                response = self._chat_completion(
+                    messages=[
+                        {"role": "system", "content": "Sei un esperto di social media marketing e analisi del sentiment."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=OPENAI_MAX_TOKENS,
+                    phase=phase,
+                    response_format={"type": "json_object"}
+                )
+            return self._normalize_insights(json.loads(response.choices[0].message.content))
+
+        except Exception as e:
+            self.logger.warning(f"Errore reduce insight, uso fusione semplice: {e}")
+            return self._merge_insights_locally([p for p, _ in partials])
+
+    def _pack_insight_chunks(self, texts):
+        """
+        Divide i commenti in chunk entro il budget di token per richiesta
+
+        Oltre max_chunks i chunk vengono campionati a passo costante,
+        così da coprire l'intero periodo invece dei soli primi commenti.
+
+        Args:
+            texts: Lista testi
+
+        Returns:
+            Lista di chunk (liste di testi troncati)
+        """
+        budget = INSIGHTS_TOKEN_BUDGET
+        truncated = [truncate_to_tokens(text, budget['max_comment_tokens']) for text in texts]
+        token_counts = [count_tokens(text) + 2 for text in truncated]
+
+        chunks = pack_batches(
+            truncated,
+            token_counts,
+            max_input_tokens=budget['chunk_input_tokens'],
+            max_output_tokens=budget['map_output_tokens'],
+            output_tokens_per_item=0,
+            overhead_tokens=budget['prompt_overhead_tokens']
+        )
+
+        if len(chunks) > budget['max_chunks']:
+            step = len(chunks) / budget['max_chunks']
+            chunks = [chunks[int(i * step)] for i in range(budget['max_chunks'])]
+
+        return chunks
+
+    def _normalize_insights(self, data):
+        """Normalizza dict insight: quattro chiavi, liste di stringhe"""
+        insights = self._empty_insights()
+        if not isinstance(data, dict):
+            return insights
+
+        for key in insights:
+            values = data.get(key) or []
+            if isinstance(values, str):
+                values = [values]
+            insights[key] = [str(v).strip() for v in values if str(v).strip()]
+
+        return insights
+
+    def _merge_insights_locally(self, partials, limit=5):
+        """Fusione senza LLM: unione ordinata senza duplicati"""
+        merged = self._empty_insights()
+
+        for key in merged:
+            seen = set()
+            for partial in partials:
+                for point in partial.get(key, []):
+                    if point.lower() not in seen and len(merged[key]) < limit:
+                        seen.add(point.lower())
+                        merged[key].append(point)
+
+        return merged
+
+    def _chat_completion(self, messages, max_tokens, phase='other', **kwargs):
+        """
+        Chiamata chat completion con gestione rate limit adattiva
+
+        Legge gli header x-ratelimit-* per anticipare i 429 e, su 429,
+        riduce la concorrenza e riprova dopo il retry-after indicato.
+        Token, latenza (retry inclusi) e costo sono registrati nel meter.
+
+        Args:
+            messages: Messaggi chat
+            max_tokens: Token massimi risposta
+            phase: Fase per la contabilizzazione ('sentiment', 'insights', ...)
+            **kwargs: Parametri aggiuntivi (es. response_format)
+
+        Returns:
+            Risposta OpenAI (ChatCompletion)
+        """
+        retries = AI_CONCURRENCY_CONFIG['rate_limit_retries']
+        start = time.perf_counter()
+
+        for attempt in range(retries + 1):
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(
+                    **self._request_body(messages, max_tokens, **kwargs)
+                )
+                self.concurrency.on_success(**self._parse_rate_limit_headers(raw.headers))
+                response = raw.parse()
+                self._record_usage(phase, messages, response, time.perf_counter() - start)
+                return response
+
+            except RateLimitError as e:
+                # Quota esaurita: inutile riprovare
+                if getattr(e, 'code', None) == 'insufficient_quota' or attempt == retries:
+                    raise
+
+                headers = getattr(getattr(e, 'response', None), 'headers', {}) or {}
+                retry_after = self._parse_retry_after(headers) or 2 ** attempt
+                self.concurrency.on_throttle(retry_after)
+
+                self.logger.warning(f"Rate limit OpenAI, retry tra {retry_after:.1f}s "
+                                    f"(concorrenza {self.concurrency.limit})")
+                time.sleep(retry_after)
+
+    @staticmethod
+    def _request_body(messages, max_tokens, **kwargs):
+        """Parametri chat completion (chiamata diretta o riga Batch API)"""
+        return {
+            'model': OPENAI_MODEL,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': OPENAI_TEMPERATURE,
+            **kwargs
+        }
+
+    def _record_usage(self, phase, messages, response, latency):
+        """Registra l'uso di una risposta (stima locale se manca 'usage')"""
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            prompt_tokens = usage.prompt_tokens
+            completion_tokens = usage.completion_tokens
+        else:
+            prompt_tokens = sum(count_tokens(m['content']) for m in messages)
+            completion_tokens = count_tokens(response.choices[0].message.content)
+
+        self.usage.record(phase, OPENAI_MODEL, prompt_tokens, completion_tokens, latency)
+
+    def _parse_rate_limit_headers(self, headers):
+        """Estrae quota residua e reset dagli header x-ratelimit-*"""
+        def _int_header(name):
+            value = headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except ValueError:
+                return None
+
+        return {
+            'remaining_requests': _int_header('x-ratelimit-remaining-requests'),
+            'remaining_tokens': _int_header('x-ratelimit-remaining-tokens'),
+            'reset_seconds': self._parse_duration(headers.get('x-ratelimit-reset-requests'))
+        }
+
+    def _parse_retry_after(self, headers):
+        """Secondi di attesa da retry-after-ms / retry-after / x-ratelimit-reset-*"""
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+        except ValueError:
+            pass
+
+        return (self._parse_duration(headers.get('x-ratelimit-reset-requests'))
+                or self._parse_duration(headers.get('x-ratelimit-reset-tokens')))
+
+    @staticmethod
+    def _parse_duration(value):
+        """Converte durate tipo '6m0s' o '250ms' in secondi"""
+        if not value:
+            return None
+
+        units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        seconds = sum(float(n) * units[u] for n, u in DURATION_PATTERN.findall(value))
+        return seconds or None
+
+    def get_cache_stats(self):
+        """
+        Statistiche cumulative della cache sentiment
+
+        Returns:
+            Dict statistiche (vuoto se cache disabilitata)
+        """
+        return self.sentiment_cache.stats() if self.sentiment_cache else {}
+
     def _parse_insights_response(self, response_text):
         """Parse risposta OpenAI per estrarre insight strutturati"""
         insights = {
@@ -299,6 +1447,24 @@ TEMI RICORRENTI:
 
         return insights
 
+    def _language_breakdown(self, languages, sentiment_by_language):
+        """
+        Distribuzione commenti per lingua con sentiment per lingua
+
+        Args:
+            languages: Lingua di ogni commento analizzato
+            sentiment_by_language: Dict {lingua: conteggi sentiment}
+
+        Returns:
+            Dict {lingua: {count, pct, sentiment}}
+        """
+        breakdown = language_breakdown(languages)
+        for lang, data in breakdown.items():
+            data['sentiment'] = sentiment_by_language.get(
+                lang, {'positive': 0, 'neutral': 0, 'negative': 0}
+            )
+        return breakdown
+
     def _empty_analysis(self):
         """Analisi vuota"""
         return {
@@ -311,7 +1477,23 @@ TEMI RICORRENTI:
                 'negative_pct': 0
             },
             'wordcloud': [],
+            'top_emojis': [],
+            'insights': self._empty_insights(),
+            'topics': [],
+            'dedup': {},
+            'sentiment_cache': {},
+            'sentiment_engine': {},
+            'languages': {},
+            'total_analyzed': 0
+        }
+
+    def _empty_aggregated(self):
+        """Aggregato AI vuoto"""
+        return {
+            'sentiment': self._empty_analysis()['sentiment'],
             'insights': self._empty_insights(),
+            'languages': {},
+            'socials': [],
             'total_analyzed': 0
         }
 
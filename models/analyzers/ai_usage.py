@@ -0,0 +1,169 @@
+"""
+Contabilizzazione uso OpenAI: token, costo, latenza e budget per analisi
+"""
+import contextvars
+import threading
+import time
+from config import OPENAI_PRICING, AI_BUDGET
+
+# Social dell'analisi in corso: propagato ai thread da run_concurrent
+current_social = contextvars.ContextVar('current_social', default=None)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Costo stimato di una chiamata
+
+    Args:
+        model: Modello OpenAI
+        prompt_tokens: Token di input
+        completion_tokens: Token di output
+
+    Returns:
+        Costo in USD (None se il modello non ha prezzi in config)
+    """
+    pricing = OPENAI_PRICING.get(model)
+    if not pricing:
+        return None
+    return (prompt_tokens * pricing['input'] + completion_tokens * pricing['output']) / 1_000_000
+
+
+class UsageMeter:
+    """
+    Contatore thread-safe delle chiamate OpenAI di un'analisi
+
+    Aggrega token, latenza e costo per fase, per social e per modello e
+    verifica il budget (token massimi / secondi massimi) dell'analisi.
+    """
+
+    def __init__(self, max_tokens=AI_BUDGET['max_tokens'], max_seconds=AI_BUDGET['max_seconds']):
+        """
+        Inizializza meter
+
+        Args:
+            max_tokens: Token massimi per analisi (None = illimitati)
+            max_seconds: Secondi massimi di fase AI per analisi (None = illimitati)
+        """
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Azzera i contatori: inizio di una nuova analisi"""
+        with self._lock:
+            self._started = time.monotonic()
+            self._totals = self._empty_totals()
+            self._by_phase = {}
+            self._by_social = {}
+            self._by_model = {}
+            self._degraded = []
+
+    def record(self, phase, model, prompt_tokens, completion_tokens, latency, social=None):
+        """
+        Registra una chiamata
+
+        Args:
+            phase: Fase ('sentiment', 'insights', 'aggregate', ...)
+            model: Modello usato
+            prompt_tokens: Token di input
+            completion_tokens: Token di output
+            latency: Secondi della chiamata (retry inclusi)
+            social: Social (default: quello del contesto corrente)
+        """
+        social = social or current_social.get() or 'brand'
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+        with self._lock:
+            for bucket in (
+                self._totals,
+                self._by_phase.setdefault(phase, self._empty_totals()),
+                self._by_social.setdefault(social, self._empty_totals()),
+                self._by_model.setdefault(model, self._empty_totals())
+            ):
+                bucket['calls'] += 1
+                bucket['prompt_tokens'] += prompt_tokens
+                bucket['completion_tokens'] += completion_tokens
+                bucket['total_tokens'] += prompt_tokens + completion_tokens
+                bucket['latency_seconds'] += latency
+                if cost is not None:
+                    bucket['cost_usd'] += cost
+
+    def used_tokens(self):
+        """Token consumati finora"""
+        with self._lock:
+            return self._totals['total_tokens']
+
+    def remaining_tokens(self):
+        """Token residui nel budget (None se illimitato)"""
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.used_tokens())
+
+    def elapsed(self):
+        """Secondi dall'inizio dell'analisi"""
+        return time.monotonic() - self._started
+
+    def exhausted(self):
+        """True se il budget di token o di tempo è esaurito"""
+        if self.max_tokens is not None and self.used_tokens() >= self.max_tokens:
+            return True
+        return self.max_seconds is not None and self.elapsed() >= self.max_seconds
+
+    def degrade(self, phase, reason, social=None):
+        """
+        Registra un degrado dovuto al budget (una volta per fase/social/motivo)
+
+        Args:
+            phase: Fase degradata
+            reason: Descrizione (es. 'local_sentiment', 'topic_insights')
+            social: Social (default: quello del contesto corrente)
+        """
+        entry = {'phase': phase, 'social': social or current_social.get() or 'brand', 'reason': reason}
+        with self._lock:
+            if entry not in self._degraded:
+                self._degraded.append(entry)
+
+    def summary(self):
+        """
+        Riepilogo uso dell'analisi
+
+        Returns:
+            Dict con totali, by_phase, by_social, by_model e budget
+        """
+        with self._lock:
+            summary = {
+                **self._rounded(self._totals),
+                'by_phase': {k: self._rounded(v) for k, v in self._by_phase.items()},
+                'by_social': {k: self._rounded(v) for k, v in self._by_social.items()},
+                'by_model': {k: self._rounded(v) for k, v in self._by_model.items()},
+                'budget': {
+                    'max_tokens': self.max_tokens,
+                    'max_seconds': self.max_seconds,
+                    'elapsed_seconds': round(self.elapsed(), 2),
+                    'degraded': list(self._degraded)
+                }
+            }
+
+        summary['budget']['exhausted'] = self.exhausted()
+        return summary
+
+    @staticmethod
+    def _empty_totals():
+        """Contatori vuoti"""
+        return {
+            'calls': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'total_tokens': 0,
+            'latency_seconds': 0.0,
+            'cost_usd': 0.0
+        }
+
+    @staticmethod
+    def _rounded(totals):
+        """Copia con latenza e costo arrotondati"""
+        rounded = dict(totals)
+        rounded['latency_seconds'] = round(totals['latency_seconds'], 2)
+        rounded['cost_usd'] = round(totals['cost_usd'], 6)
+        return rounded
@@ -0,0 +1,443 @@
+"""
+Sentiment e insight differiti via OpenAI Batch API (run programmate)
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+import json
+import re
+import uuid
+from config import BATCH_JOBS_DIR, BATCH_API_CONFIG, OPENAI_MODEL
+from models.analyzers.ai_usage import estimate_cost
+from models.analyzers.local_sentiment import LocalSentimentEngine
+from models.analyzers.token_budget import count_tokens
+from utils.logger import Logger
+
+# Stati finali di un batch senza output utilizzabile
+FAILED_STATUSES = ('failed', 'expired', 'cancelled')
+
+# Commenti nel prompt sentiment (vedi AIAnalyzer._build_sentiment_request)
+SENTIMENT_ITEMS_PATTERN = re.compile(r'Commenti \(JSON\):\n(\[.*\])')
+
+
+class BatchClient(ABC):
+    """
+    Client Batch API: invio file JSONL, stato e risultati
+
+    Implementazioni intercambiabili: OpenAI reale o stand-in locale.
+    """
+
+    @abstractmethod
+    def submit(self, input_path):
+        """Invia un file JSONL di richieste, ritorna l'ID batch"""
+        pass
+
+    @abstractmethod
+    def status(self, batch_id):
+        """Stato del batch ('validating', 'in_progress', 'completed', 'failed', ...)"""
+        pass
+
+    @abstractmethod
+    def results(self, batch_id):
+        """Righe di output (dict formato Batch API con custom_id e response)"""
+        pass
+
+
+class OpenAIBatchClient(BatchClient):
+    """Client OpenAI Batch API (costo ridotto, completamento entro 24h)"""
+
+    def __init__(self, openai_api_key, endpoint=BATCH_API_CONFIG['endpoint'],
+                 completion_window=BATCH_API_CONFIG['completion_window']):
+        """
+        Inizializza client
+
+        Args:
+            openai_api_key: API key OpenAI
+            endpoint: Endpoint delle richieste batch
+            completion_window: Finestra di completamento
+        """
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=openai_api_key)
+        self.endpoint = endpoint
+        self.completion_window = completion_window
+
+    def submit(self, input_path):
+        with open(input_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.endpoint,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            return []
+
+        content = self.client.files.content(batch.output_file_id).text
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+class LocalBatchClient(BatchClient):
+    """
+    Stand-in locale della Batch API (test e run offline)
+
+    Completa subito ogni batch: le risposte vengono da un responder
+    (body richiesta -> contenuto risposta). Il responder di default
+    etichetta i commenti sentiment con il lessico locale e restituisce
+    insight vuoti.
+    """
+
+    def __init__(self, responder=None, jobs_dir=None):
+        """
+        Inizializza client
+
+        Args:
+            responder: Funzione body -> contenuto (default lessico locale)
+            jobs_dir: Cartella file di output (default da config)
+        """
+        self.responder = responder or self._default_responder
+        self.jobs_dir = Path(jobs_dir) if jobs_dir else BATCH_JOBS_DIR
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._engine = LocalSentimentEngine()
+
+    def submit(self, input_path):
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+
+        with open(input_path, 'r', encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+
+        with open(self._output_path(batch_id), 'w', encoding='utf-8') as f:
+            for request in requests:
+                f.write(json.dumps(self._respond(request), ensure_ascii=False) + '\n')
+
+        return batch_id
+
+    def status(self, batch_id):
+        return 'completed' if self._output_path(batch_id).exists() else 'failed'
+
+    def results(self, batch_id):
+        path = self._output_path(batch_id)
+        if not path.exists():
+            return []
+
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _output_path(self, batch_id):
+        """File di output di un batch"""
+        return self.jobs_dir / f"{batch_id}_output.jsonl"
+
+    def _respond(self, request):
+        """Riga di output formato Batch API per una richiesta"""
+        body = request['body']
+        content = self.responder(body)
+        prompt_tokens = sum(count_tokens(m['content']) for m in body['messages'])
+
+        return {
+            'custom_id': request['custom_id'],
+            'response': {
+                'status_code': 200,
+                'body': {
+                    'model': body.get('model', OPENAI_MODEL),
+                    'choices': [{'message': {'role': 'assistant', 'content': content}}],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': count_tokens(content)
+                    }
+                }
+            },
+            'error': None
+        }
+
+    def _default_responder(self, body):
+        """Sentiment con lessico locale, insight vuoti"""
+        match = SENTIMENT_ITEMS_PATTERN.search(body['messages'][-1]['content'])
+        if not match:
+            return json.dumps({})
+
+        items = json.loads(match.group(1))
+        return json.dumps({'results': [
+            {'id': item['id'], 'sentiment': self._engine.score(item['text'])[0]}
+            for item in items
+        ]})
+
+
+class BatchJobManager:
+    """
+    Invio e raccolta dei job Batch API per le analisi salvate in deferred
+
+    1. submit: raccoglie le richieste 'deferred' di una o più analisi in un
+       unico file JSONL e lo invia al client
+    2. poll: a batch completato fonde le risposte nelle analisi (sentiment,
+       insight, aggregato brand, uso) e le risalva
+    """
+
+    def __init__(self, client, analyzer, storage, jobs_dir=None, logger=None):
+        """
+        Inizializza manager
+
+        Args:
+            client: BatchClient (OpenAI o locale)
+            analyzer: AIAnalyzer (merge risposte e aggregato brand)
+            storage: StorageManager delle analisi
+            jobs_dir: Cartella job e file JSONL (default da config)
+            logger: Logger opzionale
+        """
+        self.client = client
+        self.analyzer = analyzer
+        self.storage = storage
+        self.jobs_dir = Path(jobs_dir) if jobs_dir else BATCH_JOBS_DIR
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+    def submit(self, analysis_ids):
+        """
+        Invia le richieste deferred non ancora inviate delle analisi
+
+        Args:
+            analysis_ids: Lista ID analisi
+
+        Returns:
+            Dict job o None se nessuna richiesta in attesa
+        """
+        job_id = self._generate_job_id()
+        input_path = self.jobs_dir / f"{job_id}_input.jsonl"
+
+        lines = []
+        pending = {}
+        for analysis_id in analysis_ids:
+            data = self.storage.load_analysis(analysis_id)
+            if not data:
+                continue
+
+            for social, analysis in self._deferred_analyses(data):
+                if analysis['deferred'].get('job_id'):
+                    continue
+                for idx, request in enumerate(analysis['deferred']['requests']):
+                    lines.append({
+                        'custom_id': f"{analysis_id}:{social}:{idx}",
+                        'method': 'POST',
+                        'url': BATCH_API_CONFIG['endpoint'],
+                        'body': request['body']
+                    })
+                pending.setdefault(analysis_id, data)
+                analysis['deferred']['job_id'] = job_id
+
+        if not lines:
+            self.logger.info("Nessuna richiesta deferred da inviare")
+            return None
+
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+        batch_id = self.client.submit(input_path)
+
+        job = {
+            'job_id': job_id,
+            'batch_id': batch_id,
+            'status': 'submitted',
+            'analysis_ids': list(pending),
+            'requests': len(lines),
+            'created_at': datetime.now().isoformat(),
+            'completed_at': None
+        }
+        self._save_job(job)
+
+        # Le analisi ricordano il job: niente doppio invio
+        for analysis_id, data in pending.items():
+            self.storage.update_analysis(analysis_id, data['results'])
+
+        self.logger.info(f"✓ Batch inviato: {job_id} ({len(lines)} richieste, "
+                         f"{len(pending)} analisi)")
+        return job
+
+    def poll(self, job_id=None):
+        """
+        Controlla i job e fonde i risultati dei batch completati
+
+        Args:
+            job_id: Job da controllare (default: tutti i job in attesa)
+
+        Returns:
+            Lista dict job aggiornati
+        """
+        if job_id:
+            job = self._load_job(job_id)
+            jobs = [job] if job else []
+        else:
+            jobs = [j for j in self.list_jobs() if j['status'] == 'submitted']
+
+        for job in jobs:
+            if job['status'] != 'submitted':
+                continue
+
+            status = self.client.status(job['batch_id'])
+
+            if status == 'completed':
+                self._merge_job(job)
+            elif status in FAILED_STATUSES:
+                # Risultati locali invariati: le richieste tornano inviabili
+                self._release_job(job)
+                job['status'] = status
+                job['completed_at'] = datetime.now().isoformat()
+                self._save_job(job)
+                self.logger.warning(f"Batch {job['job_id']} terminato senza risultati: {status}")
+            else:
+                self.logger.info(f"Batch {job['job_id']} in corso: {status}")
+
+        return jobs
+
+    def list_jobs(self):
+        """
+        Lista job salvati
+
+        Returns:
+            Lista dict job (più recenti prima)
+        """
+        jobs = []
+        for path in self.jobs_dir.glob('job_*.json'):
+            with open(path, 'r', encoding='utf-8') as f:
+                jobs.append(json.load(f))
+
+        jobs.sort(key=lambda j: j.get('created_at', ''), reverse=True)
+        return jobs
+
+    def _merge_job(self, job):
+        """Fonde l'output di un batch completato nelle analisi del job"""
+        contents = {}
+        usage = {}
+        for line in self.client.results(job['batch_id']):
+            analysis_id, social, idx = line['custom_id'].rsplit(':', 2)
+
+            response = line.get('response') or {}
+            content = None
+            if response.get('status_code') == 200 and not line.get('error'):
+                body = response.get('body', {})
+                content = body['choices'][0]['message']['content']
+                self._add_usage(usage.setdefault(analysis_id, self._empty_usage()), body)
+
+            contents.setdefault(analysis_id, {}).setdefault(social, {})[int(idx)] = content
+
+        merged_requests = 0
+        for analysis_id in job['analysis_ids']:
+            data = self.storage.load_analysis(analysis_id)
+            if not data:
+                continue
+
+            results = data['results']
+            ai_results = results['ai_analysis']
+            analyses = [
+                (social, analysis) for social, analysis in self._deferred_analyses(data)
+                if analysis['deferred'].get('job_id') == job['job_id']
+            ]
+            if not analyses:
+                # Già fusa (es. poll ripetuto dopo un'interruzione): uso non ricontato
+                continue
+
+            for social, analysis in analyses:
+                social_contents = contents.get(analysis_id, {}).get(social, {})
+                self.analyzer.merge_deferred(analysis, social_contents)
+                merged_requests += sum(1 for c in social_contents.values() if c is not None)
+
+            # Aggregato brand ricalcolato sui social aggiornati (senza LLM)
+            ai_results['aggregated'] = self.analyzer.aggregate_analyses(ai_results, local=True)
+
+            if analysis_id in usage:
+                self._record_usage(results, usage[analysis_id], job['job_id'])
+
+            self.storage.update_analysis(analysis_id, results)
+
+        job['status'] = 'completed'
+        job['merged'] = merged_requests
+        job['completed_at'] = datetime.now().isoformat()
+        self._save_job(job)
+
+        self.logger.info(f"✓ Batch {job['job_id']} completato: {merged_requests}/{job['requests']} "
+                         f"risposte fuse in {len(job['analysis_ids'])} analisi")
+
+    def _release_job(self, job):
+        """Sgancia le richieste di un job fallito dalle analisi"""
+        for analysis_id in job['analysis_ids']:
+            data = self.storage.load_analysis(analysis_id)
+            if not data:
+                continue
+
+            for _, analysis in self._deferred_analyses(data):
+                if analysis['deferred'].get('job_id') == job['job_id']:
+                    analysis['deferred']['job_id'] = None
+
+            self.storage.update_analysis(analysis_id, data['results'])
+
+    @staticmethod
+    def _deferred_analyses(data):
+        """Coppie (social, analisi) con richieste deferred"""
+        ai_results = (data.get('results') or {}).get('ai_analysis') or {}
+        return [
+            (social, analysis) for social, analysis in ai_results.items()
+            if social != 'aggregated' and analysis and analysis.get('deferred')
+        ]
+
+    @staticmethod
+    def _empty_usage():
+        """Contatori uso di un batch"""
+        return {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'total_tokens': 0, 'cost_usd': 0.0}
+
+    @staticmethod
+    def _add_usage(totals, body):
+        """Somma l'uso di una risposta batch (prezzo scontato)"""
+        usage = body.get('usage') or {}
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        cost = estimate_cost(body.get('model', OPENAI_MODEL), prompt_tokens, completion_tokens)
+
+        totals['calls'] += 1
+        totals['prompt_tokens'] += prompt_tokens
+        totals['completion_tokens'] += completion_tokens
+        totals['total_tokens'] += prompt_tokens + completion_tokens
+        if cost is not None:
+            totals['cost_usd'] += cost * BATCH_API_CONFIG['cost_factor']
+
+    @staticmethod
+    def _record_usage(results, batch_usage, job_id):
+        """Aggiunge l'uso del batch a 'ai_usage' dell'analisi (fase 'batch')"""
+        ai_usage = results.get('ai_usage')
+        if not ai_usage:
+            return
+
+        batch_usage = {**batch_usage, 'cost_usd': round(batch_usage['cost_usd'], 6), 'job_id': job_id}
+        ai_usage.setdefault('by_phase', {})['batch'] = batch_usage
+
+        for key in ('calls', 'prompt_tokens', 'completion_tokens', 'total_tokens'):
+            ai_usage[key] = ai_usage.get(key, 0) + batch_usage[key]
+        ai_usage['cost_usd'] = round(ai_usage.get('cost_usd', 0) + batch_usage['cost_usd'], 6)
+
+    def _generate_job_id(self):
+        """Genera ID univoco per job"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"job_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+    def _save_job(self, job):
+        """Salva stato job"""
+        with open(self.jobs_dir / f"{job['job_id']}.json", 'w', encoding='utf-8') as f:
+            json.dump(job, f, indent=2, ensure_ascii=False)
+
+    def _load_job(self, job_id):
+        """Carica stato job"""
+        path = self.jobs_dir / f"{job_id}.json"
+        if not path.exists():
+            self.logger.error(f"Job {job_id} non trovato")
+            return None
+
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
@@ -0,0 +1,237 @@
+"""
+Collasso near-duplicate e flag spam/bot sui commenti (MinHash + LSH)
+"""
+import random
+import re
+from collections import Counter, defaultdict
+import numpy as np
+from config import DEDUP_CONFIG
+
+MENTION_PATTERN = re.compile(r'@[\w.]+')
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+REPEAT_PATTERN = re.compile(r'(.)\1{2,}')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+WORD_PATTERN = re.compile(r'\w+')
+
+SPAM_KEYWORDS = re.compile(
+    r'link in bio|check my|follow me|seguimi|dm me|scrivimi in dm|guadagna|'
+    r'guadagnare|earn money|crypto|bitcoin|forex|promo code|codice sconto',
+    re.IGNORECASE
+)
+
+# Primo di Mersenne 2^61 - 1 per l'hashing universale (a*x + b) mod p.
+# Con x, a, b < 2^32 il prodotto a*x + b resta in uint64 (niente overflow)
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = (1 << 32) - 1
+
+# Shingle per blocco nel calcolo vettoriale delle firme (memoria ~ num_perm × blocco)
+_SHINGLE_BLOCK = 1 << 15
+
+
+class CommentDeduplicator:
+    """
+    Raggruppa commenti quasi identici e segnala spam/bot
+
+    1. Dedup esatto su testo normalizzato (menzioni, URL, lettere ripetute)
+    2. MinHash su shingle di caratteri + LSH a bande per i near-duplicate
+    3. Euristiche spam: promo/link, solo tag di menzioni, bot ripetitivi
+    """
+
+    def __init__(self, num_perm=DEDUP_CONFIG['num_perm'], bands=DEDUP_CONFIG['bands'],
+                 shingle_size=DEDUP_CONFIG['shingle_size'],
+                 threshold=DEDUP_CONFIG['similarity_threshold'], seed=42):
+        """
+        Inizializza deduplicator
+
+        Args:
+            num_perm: Numero di permutazioni MinHash
+            bands: Bande LSH (num_perm deve essere divisibile per bands)
+            shingle_size: Lunghezza shingle di caratteri
+            threshold: Similarità Jaccard stimata minima per unire
+            seed: Seed per le permutazioni (risultati deterministici)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm deve essere multiplo di bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        rng = random.Random(seed)
+        perms = [(rng.randrange(1, _MAX_HASH), rng.randrange(0, _MAX_HASH)) for _ in range(num_perm)]
+        self._a = np.array([a for a, _ in perms], dtype=np.uint64)[:, None]
+        self._b = np.array([b for _, b in perms], dtype=np.uint64)[:, None]
+
+    def deduplicate(self, comments):
+        """
+        Raggruppa i commenti in cluster
+
+        Args:
+            comments: Lista dict commento con 'text' (e opzionale 'author')
+
+        Returns:
+            Dict con 'clusters' (lista dict: representative, members, size,
+            spam, reason) e 'stats'
+        """
+        normalized = [self.normalize(c.get('text', '')) for c in comments]
+
+        # 1. Dedup esatto
+        exact_groups = defaultdict(list)
+        for idx, norm in enumerate(normalized):
+            exact_groups[norm].append(idx)
+        unique_norms = list(exact_groups.keys())
+
+        # 2. Near-duplicate via MinHash + LSH sui soli testi distinti
+        parent = list(range(len(unique_norms)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        signatures = self._signatures(unique_norms)
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            for band in range(self.bands):
+                start = band * self.rows
+                buckets[(band, signature[start:start + self.rows].tobytes())].append(i)
+
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            first = members[0]
+            for other in members[1:]:
+                root_a, root_b = find(first), find(other)
+                if root_a != root_b and self._similarity(signatures[first], signatures[other]) >= self.threshold:
+                    parent[root_b] = root_a
+
+        grouped = defaultdict(list)
+        for i, norm in enumerate(unique_norms):
+            grouped[find(i)].extend(exact_groups[norm])
+
+        # 3. Cluster + flag spam. Gli autori che ripetono il testo (bot)
+        # finiscono in un cluster spam a parte: il resto del cluster resta
+        clusters = []
+        for members in grouped.values():
+            members.sort()
+            bots = self._bot_members(comments, members)
+            if bots:
+                clusters.append(self._cluster(bots, 'bot_repetition'))
+            bot_set = set(bots)
+            others = [i for i in members if i not in bot_set]
+            if others:
+                clusters.append(self._cluster(others, self._spam_reason(comments, others)))
+
+        clusters.sort(key=lambda c: c['representative'])
+
+        return {'clusters': clusters, 'stats': self._stats(comments, clusters)}
+
+    def normalize(self, text):
+        """Normalizza testo: minuscolo, menzioni/URL generici, ripetizioni compresse"""
+        text = (text or '').lower()
+        text = MENTION_PATTERN.sub('@', text)
+        text = URL_PATTERN.sub('url', text)
+        text = REPEAT_PATTERN.sub(r'\1\1', text)
+        return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+    def _signatures(self, texts):
+        """
+        Firme MinHash sugli shingle di caratteri (una riga per testo)
+
+        Gli hash degli shingle di tutti i testi stanno in un solo array: per
+        ogni blocco (a*h + b) mod p è calcolato per tutte le permutazioni in
+        broadcast e il minimo per testo preso con np.minimum.reduceat.
+
+        Args:
+            texts: Lista testi normalizzati
+
+        Returns:
+            np.ndarray (len(texts), num_perm) di uint64
+        """
+        k = self.shingle_size
+        hashes = []
+        owners = []
+        for idx, text in enumerate(texts):
+            shingles = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+            # hash() è stabile nel processo: basta per il clustering di una run
+            hashes.extend(hash(s) & _MAX_HASH for s in shingles)
+            owners.extend([idx] * len(shingles))
+
+        signatures = np.full((len(texts), self.num_perm), _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(hashes, dtype=np.uint64)
+        owners = np.array(owners, dtype=np.int64)
+
+        for start in range(0, len(hashes), _SHINGLE_BLOCK):
+            block = hashes[start:start + _SHINGLE_BLOCK]
+            block_owners = owners[start:start + _SHINGLE_BLOCK]
+            values = ((self._a * block + self._b) % _MERSENNE_PRIME) & np.uint64(_MAX_HASH)
+
+            # Inizio di ogni testo nel blocco (un testo può stare su due blocchi)
+            starts = np.flatnonzero(np.r_[True, block_owners[1:] != block_owners[:-1]])
+            minima = np.minimum.reduceat(values, starts, axis=1).T
+            rows = block_owners[starts]
+            signatures[rows] = np.minimum(signatures[rows], minima)
+
+        return signatures
+
+    def _similarity(self, sig_a, sig_b):
+        """Jaccard stimata: frazione di minhash coincidenti"""
+        return np.count_nonzero(sig_a == sig_b) / self.num_perm
+
+    @staticmethod
+    def _cluster(members, spam_reason):
+        """Dict cluster (il primo membro è il rappresentante)"""
+        return {
+            'representative': members[0],
+            'members': members,
+            'size': len(members),
+            'spam': spam_reason is not None,
+            'reason': spam_reason
+        }
+
+    @staticmethod
+    def _bot_members(comments, members):
+        """Membri degli autori che ripetono lo stesso testo (bot), in ordine"""
+        authors = Counter(comments[i].get('author') for i in members if comments[i].get('author'))
+        bots = {author for author, count in authors.items()
+                if count >= DEDUP_CONFIG['bot_repeat_threshold']}
+        return [i for i in members if comments[i].get('author') in bots]
+
+    def _spam_reason(self, comments, members):
+        """Motivo spam per un cluster (None se non spam)"""
+        representative = comments[members[0]].get('text', '') or ''
+
+        if SPAM_KEYWORDS.search(representative) or URL_PATTERN.search(representative):
+            return 'promo'
+
+        # Solo tag di amici (giveaway): menzioni senza testo significativo
+        words = WORD_PATTERN.findall(MENTION_PATTERN.sub('', representative))
+        mentions = MENTION_PATTERN.findall(representative)
+        if mentions and len(words) <= 1:
+            return 'mention_tagging'
+
+        return None
+
+    def _stats(self, comments, clusters):
+        """Statistiche di riduzione"""
+        total = len(comments)
+        spam_comments = sum(c['size'] for c in clusters if c['spam'])
+        representatives = sum(1 for c in clusters if not c['spam'])
+        emoji_only = sum(
+            1 for c in comments
+            if c.get('text') and not LETTER_PATTERN.search(c['text'])
+        )
+
+        return {
+            'total_comments': total,
+            'clusters': len(clusters),
+            'representatives': representatives,
+            'near_duplicates': total - len(clusters),
+            'spam_comments': spam_comments,
+            'emoji_only_comments': emoji_only,
+            'reduction_pct': round((1 - representatives / total) * 100, 1) if total else 0
+        }
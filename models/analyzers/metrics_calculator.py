@@ -1,9 +1,16 @@
 """
 Calcolo metriche e KPI dai dati scraped
 """
+import re
 from collections import Counter
-from datetime import datetime
-from config import calculate_engagement_rate, PERFORMANCE_THRESHOLDS
+from datetime import datetime, timezone
+from config import (
+    calculate_engagement_rate, PERFORMANCE_THRESHOLDS, DISTRIBUTION_PERCENTILES
+)
+from models.analyzers.sketches import TDigest, HyperLogLog
+
+# Timestamp ISO (es. 2024-05-12T10:00:00Z) -> chiave mese 'YYYY-MM'
+MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{2})')
 
 
 class MetricsCalculator:
@@ -35,8 +42,13 @@ class MetricsCalculator:
         avg_shares = total_shares / total_posts if total_posts > 0 else 0
         avg_views = total_views / total_posts if total_posts > 0 else 0
 
-        # Engagement rate medio
+        # Engagement rate medio + distribuzioni streaming (quantili)
         engagement_rates = []
+        distributions = {
+            'likes': TDigest(),
+            'views': TDigest(),
+            'engagement_rate': TDigest()
+        }
         for post in posts:
             er = calculate_engagement_rate(
                 post.get('likes', 0),
@@ -46,6 +58,10 @@ class MetricsCalculator:
             )
             engagement_rates.append(er)
 
+            distributions['likes'].add(post.get('likes', 0))
+            distributions['views'].add(post.get('views', 0))
+            distributions['engagement_rate'].add(er)
+
         avg_engagement_rate = sum(engagement_rates) / len(engagement_rates) if engagement_rates else 0
 
         # Performance classification
@@ -103,7 +119,9 @@ class MetricsCalculator:
                 }
                 for p in top_posts
             ],
-            'content_type_distribution': dict(content_types)
+            'content_type_distribution': dict(content_types),
+            'percentiles': MetricsCalculator.percentiles_from_distributions(distributions),
+            'distributions': {k: d.to_dict() for k, d in distributions.items()}
         }
 
     @staticmethod
@@ -122,14 +140,27 @@ class MetricsCalculator:
                 'total_comments': 0,
                 'avg_comment_length': 0,
                 'total_comment_likes': 0,
-                'top_commenters': []
+                'top_commenters': [],
+                'unique_commenters': 0,
+                'audience_retention': [],
+                'audience_sketch': None,
+                'audience_by_month': {},
+                'percentiles': {},
+                'distributions': {}
             }
 
         total_comments = len(all_comments)
 
-        # Lunghezza media commento
-        comment_lengths = [len(c.get('text', '')) for c in all_comments]
-        avg_length = sum(comment_lengths) / total_comments if total_comments > 0 else 0
+        # Lunghezza media commento + distribuzione
+        length_digest = TDigest()
+        total_length = 0
+        for c in all_comments:
+            length = len(c.get('text', ''))
+            total_length += length
+            length_digest.add(length)
+
+        avg_length = total_length / total_comments if total_comments > 0 else 0
+        distributions = {'comment_length': length_digest}
 
         # Likes totali sui commenti
         total_comment_likes = sum(c.get('likes', 0) for c in all_comments)
@@ -141,11 +172,33 @@ class MetricsCalculator:
             for author, count in commenters.most_common(10)
         ]
 
+        # Audience: sketch HLL degli autori (totale e per mese)
+        audience = HyperLogLog()
+        audience_by_month = {}
+        for c in all_comments:
+            author = MetricsCalculator._normalize_author(c.get('author'))
+            if not author:
+                continue
+            audience.add(author)
+
+            month = MetricsCalculator._month_key(c.get('timestamp'))
+            if month:
+                audience_by_month.setdefault(month, HyperLogLog()).add(author)
+
         return {
             'total_comments': total_comments,
             'avg_comment_length': round(avg_length, 2),
             'total_comment_likes': total_comment_likes,
-            'top_commenters': top_commenters
+            'top_commenters': top_commenters,
+            'unique_commenters': audience.count(),
+            'audience_retention': MetricsCalculator.audience_retention(audience_by_month),
+            'audience_sketch': audience.to_dict(),
+            'audience_by_month': {
+                month: sketch.to_dict()
+                for month, sketch in sorted(audience_by_month.items())
+            },
+            'percentiles': MetricsCalculator.percentiles_from_distributions(distributions),
+            'distributions': {k: d.to_dict() for k, d in distributions.items()}
         }
 
     @staticmethod
@@ -164,14 +217,32 @@ class MetricsCalculator:
         total_comments = 0
         total_likes = 0
         total_views = 0
+        engagement_sum = 0
         all_hashtags = []
+        social_distributions = []
+        audiences = {}
+        audience_by_month = {}
 
         for social_type, data in social_results.items():
             metrics = data.get('metrics', {})
+            comment_metrics = data.get('comment_metrics', {})
+            social_distributions.append(metrics.get('distributions', {}))
+            social_distributions.append(comment_metrics.get('distributions', {}))
+
+            # Sketch audience per social e per mese
+            if comment_metrics.get('audience_sketch'):
+                audiences[social_type] = HyperLogLog.from_dict(comment_metrics['audience_sketch'])
+            for month, sketch in comment_metrics.get('audience_by_month', {}).items():
+                sketch = HyperLogLog.from_dict(sketch)
+                if month in audience_by_month:
+                    audience_by_month[month].merge(sketch)
+                else:
+                    audience_by_month[month] = sketch
             total_posts += metrics.get('total_posts', 0)
             total_comments += metrics.get('total_comments', 0)
             total_likes += metrics.get('total_likes', 0)
             total_views += metrics.get('total_views', 0)
+            engagement_sum += metrics.get('avg_engagement_rate', 0) * metrics.get('total_posts', 0)
 
             # Hashtags
             for ht in metrics.get('top_hashtags', []):
@@ -180,6 +251,22 @@ class MetricsCalculator:
         # Top hashtags aggregati
         top_hashtags_aggregated = Counter(all_hashtags).most_common(15)
 
+        # Distribuzioni cross-social (merge dei digest, senza post raw)
+        distributions = MetricsCalculator.merge_distributions(social_distributions)
+
+        # Audience cross-social: union e overlap a coppie
+        brand_audience = HyperLogLog()
+        for sketch in audiences.values():
+            brand_audience.merge(sketch)
+
+        socials_with_audience = list(audiences.keys())
+        audience_overlap = []
+        for i, social_a in enumerate(socials_with_audience):
+            for social_b in socials_with_audience[i + 1:]:
+                overlap = MetricsCalculator.audience_overlap(audiences[social_a], audiences[social_b])
+                overlap['socials'] = [social_a, social_b]
+                audience_overlap.append(overlap)
+
         # Social con più engagement
         social_by_engagement = sorted(
             social_results.items(),
@@ -192,6 +279,8 @@ class MetricsCalculator:
             'total_comments': total_comments,
             'total_likes': total_likes,
             'total_views': total_views,
+            # Media per post su tutti i social (pesata per numero di post)
+            'avg_engagement_rate': round(engagement_sum / total_posts, 2) if total_posts else 0,
             'socials_analyzed': len(social_results),
             'top_hashtags_global': [
                 {'tag': tag, 'count': count}
@@ -205,9 +294,165 @@ class MetricsCalculator:
                     'posts': data.get('metrics', {}).get('total_posts', 0)
                 }
                 for social, data in social_by_engagement
-            ]
+            ],
+            'unique_commenters': brand_audience.count(),
+            'audience_overlap': audience_overlap,
+            'audience_retention': MetricsCalculator.audience_retention(audience_by_month),
+            'audience_sketch': brand_audience.to_dict(),
+            'audience_by_month': {
+                month: sketch.to_dict()
+                for month, sketch in sorted(audience_by_month.items())
+            },
+            'percentiles': MetricsCalculator.percentiles_from_distributions(distributions),
+            'distributions': {k: d.to_dict() for k, d in distributions.items()}
         }
 
+    @staticmethod
+    def merge_distributions(distributions_list):
+        """
+        Unisce distribuzioni serializzate (tra social o tra analisi)
+
+        Args:
+            distributions_list: Lista dict {metrica: digest serializzato}
+
+        Returns:
+            Dict {metrica: TDigest} con i digest uniti
+        """
+        merged = {}
+
+        for distributions in distributions_list:
+            for metric, data in (distributions or {}).items():
+                digest = TDigest.from_dict(data)
+                if metric in merged:
+                    merged[metric].merge(digest)
+                else:
+                    merged[metric] = digest
+
+        return merged
+
+    @staticmethod
+    def percentiles_from_distributions(distributions):
+        """
+        Calcola p50/p90/p99 da digest (oggetti TDigest o dict serializzati)
+
+        Args:
+            distributions: Dict {metrica: TDigest | dict}
+
+        Returns:
+            Dict {metrica: {'p50': x, 'p90': y, 'p99': z}}
+        """
+        percentiles = {}
+
+        for metric, digest in distributions.items():
+            if isinstance(digest, dict):
+                digest = TDigest.from_dict(digest)
+            if digest.count > 0:
+                percentiles[metric] = digest.percentiles(DISTRIBUTION_PERCENTILES)
+
+        return percentiles
+
+    @staticmethod
+    def audience_overlap(sketch_a, sketch_b):
+        """
+        Stima overlap tra due audience (social o periodi diversi)
+
+        Args:
+            sketch_a, sketch_b: HyperLogLog o dict serializzati
+
+        Returns:
+            Dict con commentatori condivisi, unione e indice di Jaccard
+        """
+        if isinstance(sketch_a, dict):
+            sketch_a = HyperLogLog.from_dict(sketch_a)
+        if isinstance(sketch_b, dict):
+            sketch_b = HyperLogLog.from_dict(sketch_b)
+
+        shared = HyperLogLog.intersection_count(sketch_a, sketch_b)
+        union = HyperLogLog.union_count(sketch_a, sketch_b)
+
+        return {
+            'shared_commenters': shared,
+            'union_commenters': union,
+            'jaccard': round(shared / union, 3) if union > 0 else 0
+        }
+
+    @staticmethod
+    def audience_retention(audience_by_month):
+        """
+        Retention mese su mese: quota dei commentatori del mese precedente
+        che tornano a commentare nel mese successivo
+
+        Solo mesi di calendario adiacenti: tra due mesi separati da mesi
+        senza commenti la retention non è calcolata (None) e gap_months
+        riporta i mesi mancanti.
+
+        Args:
+            audience_by_month: Dict {'YYYY-MM': HyperLogLog | dict}
+
+        Returns:
+            Lista dict {month, previous_month, gap_months, returning_commenters,
+            retention_pct}
+        """
+        months = sorted(audience_by_month.keys())
+        sketches = {
+            month: HyperLogLog.from_dict(s) if isinstance(s, dict) else s
+            for month, s in audience_by_month.items()
+        }
+
+        def _index(month):
+            year, month_number = month.split('-')
+            return int(year) * 12 + int(month_number)
+
+        retention = []
+        for previous, month in zip(months, months[1:]):
+            gap_months = _index(month) - _index(previous) - 1
+            if gap_months:
+                retention.append({
+                    'month': month,
+                    'previous_month': previous,
+                    'gap_months': gap_months,
+                    'returning_commenters': None,
+                    'retention_pct': None
+                })
+                continue
+
+            previous_count = sketches[previous].count()
+            returning = HyperLogLog.intersection_count(sketches[previous], sketches[month])
+            retention.append({
+                'month': month,
+                'previous_month': previous,
+                'gap_months': 0,
+                'returning_commenters': returning,
+                'retention_pct': round(returning / previous_count * 100, 1) if previous_count else 0
+            })
+
+        return retention
+
+    @staticmethod
+    def _normalize_author(author):
+        """Normalizza username autore (None se sconosciuto)"""
+        if not author:
+            return None
+        author = str(author).strip().lstrip('@').lower()
+        if author in ('n/a', 'unknown', ''):
+            return None
+        return author
+
+    @staticmethod
+    def _month_key(timestamp):
+        """Estrae chiave mese 'YYYY-MM' da timestamp ISO o epoch"""
+        if isinstance(timestamp, (int, float)) and timestamp > 0:
+            if timestamp > 1e12:  # Millisecondi
+                timestamp /= 1000
+            return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m')
+
+        if isinstance(timestamp, str):
+            match = MONTH_PATTERN.match(timestamp.strip())
+            if match:
+                return f"{match.group(1)}-{match.group(2)}"
+
+        return None
+
     @staticmethod
     def _classify_performance(engagement_rate):
         """Classifica livello performance"""
@@ -237,5 +482,7 @@ class MetricsCalculator:
             'performance_level': 'none',
             'top_hashtags': [],
             'top_posts': [],
-            'content_type_distribution': {}
+            'content_type_distribution': {},
+            'percentiles': {},
+            'distributions': {}
         }
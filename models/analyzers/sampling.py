@@ -0,0 +1,302 @@
+"""
+Campionamento commenti: reservoir (uniforme e pesato) stratificato per post
+"""
+import heapq
+import math
+import random
+from bisect import bisect_right
+from collections import Counter
+from statistics import NormalDist
+from config import SAMPLING_CONFIG
+
+
+def sample_size(population, confidence=SAMPLING_CONFIG['confidence'],
+                margin=SAMPLING_CONFIG['margin'], proportion=0.5,
+                min_size=SAMPLING_CONFIG['min_size'], max_size=SAMPLING_CONFIG['max_size']):
+    """
+    Dimensione campione per stimare una proporzione (formula di Cochran)
+
+    n0 = z² · p(1-p) / e², con correzione per popolazione finita
+    n = n0 / (1 + (n0 - 1) / N). Con p = 0.5 (caso peggiore) al 95% e
+    margine 5% servono ~385 commenti, qualunque sia N grande.
+
+    Args:
+        population: Numero di elementi N
+        confidence: Livello di confidenza (es. 0.95)
+        margin: Margine di errore assoluto (es. 0.05 = ±5 punti)
+        proportion: Proporzione attesa p
+        min_size: Campione minimo
+        max_size: Campione massimo (None = nessun tetto)
+
+    Returns:
+        Dimensione campione (≤ population)
+    """
+    if population <= 0:
+        return 0
+
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    n0 = z * z * proportion * (1 - proportion) / (margin * margin)
+    n = math.ceil(n0 / (1 + (n0 - 1) / population))
+
+    n = max(n, min_size)
+    if max_size:
+        n = min(n, max_size)
+    return min(n, population)
+
+
+def like_band(likes, bands=SAMPLING_CONFIG['like_bands']):
+    """Fascia di like di un commento (0 = nessun like)"""
+    return bisect_right(bands, likes or 0)
+
+
+def like_weight(likes):
+    """Peso di un commento per i like (logaritmico: un commento virale non domina)"""
+    return 1 + math.log1p(max(0, likes or 0))
+
+
+def comment_stratum(comment):
+    """Strato di un commento: (post, fascia di like)"""
+    return comment.get('post_url'), like_band(comment.get('likes'))
+
+
+class ReservoirSampler:
+    """
+    Campione uniforme di dimensione fissa in un solo passaggio (Algorithm R)
+
+    Memoria O(size) qualunque sia la lunghezza dello stream.
+    """
+
+    def __init__(self, size, rng=None):
+        """
+        Inizializza sampler
+
+        Args:
+            size: Dimensione del reservoir
+            rng: random.Random (default nuovo generatore)
+        """
+        self.size = size
+        self.rng = rng or random.Random()
+        self.items = []
+        self.seen = 0
+
+    def add(self, item, weight=1):
+        """Aggiunge un elemento dello stream (peso ignorato)"""
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+
+        j = self.rng.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+    def sample(self, size=None):
+        """
+        Campione uniforme
+
+        Args:
+            size: Elementi da restituire (default tutto il reservoir)
+
+        Returns:
+            Lista elementi in ordine casuale
+        """
+        # Le posizioni del reservoir non sono scambiabili: mescola prima del taglio
+        items = list(self.items)
+        self.rng.shuffle(items)
+        return items[:size] if size is not None else items
+
+
+class WeightedReservoirSampler:
+    """
+    Campione pesato senza reinserimento in un solo passaggio (A-Res)
+
+    Ogni elemento riceve la chiave u^(1/w) con u uniforme in (0, 1): il
+    campione sono le size chiavi più alte (Efraimidis-Spirakis).
+    """
+
+    def __init__(self, size, rng=None):
+        """
+        Inizializza sampler
+
+        Args:
+            size: Dimensione del reservoir
+            rng: random.Random (default nuovo generatore)
+        """
+        self.size = size
+        self.rng = rng or random.Random()
+        self._heap = []
+        self.seen = 0
+
+    def add(self, item, weight=1):
+        """Aggiunge un elemento dello stream con il suo peso (> 0)"""
+        if weight <= 0:
+            return
+
+        self.seen += 1
+        key = self.rng.random() ** (1 / weight)
+
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, (key, self.seen, item))
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (key, self.seen, item))
+
+    def sample(self, size=None):
+        """
+        Campione pesato
+
+        Args:
+            size: Elementi da restituire (le chiavi più alte restano un
+                  campione A-Res valido di quella dimensione)
+
+        Returns:
+            Lista elementi per chiave decrescente
+        """
+        items = [item for _, _, item in sorted(self._heap, reverse=True)]
+        return items[:size] if size is not None else items
+
+
+class StratifiedSampler:
+    """
+    Campione stratificato in streaming con allocazione proporzionale
+
+    Un reservoir per strato (es. post): a fine stream ogni strato non
+    vuoto riceve almeno un elemento e una quota del campione proporzionale
+    alla sua popolazione, quindi i primi post non sono sovra-rappresentati.
+    Ogni elemento estratto porta il fattore di espansione N_h / n_h
+    (intero, somma esatta per strato) per stimare i totali della
+    popolazione.
+
+    Memoria: con le popolazioni note in anticipo ogni reservoir è limitato
+    alla quota del suo strato (O(size) in totale); senza, ogni reservoir
+    può arrivare a size elementi (O(Σ min(size, N_h)) ≤ size × strati).
+    """
+
+    def __init__(self, size, weighted=False, seed=SAMPLING_CONFIG['seed'], populations=None):
+        """
+        Inizializza sampler
+
+        Args:
+            size: Dimensione totale del campione
+            weighted: Se True campione pesato (A-Res) dentro ogni strato
+            seed: Seed (campioni riproducibili)
+            populations: Dict opzionale {strato: elementi dello stream}: i
+                         reservoir sono limitati alla quota dello strato
+        """
+        self.size = size
+        self.weighted = weighted
+        self.rng = random.Random(seed)
+        self._strata = {}
+        self._capacity = None
+        if populations is not None:
+            self._capacity = self._allocate(populations, min(size, sum(populations.values())))
+
+    def add(self, item, stratum=None, weight=1):
+        """
+        Aggiunge un elemento dello stream
+
+        Args:
+            item: Elemento
+            stratum: Chiave strato (hashable)
+            weight: Peso (solo campione pesato)
+        """
+        sampler = self._strata.get(stratum)
+        if sampler is None:
+            sampler_class = WeightedReservoirSampler if self.weighted else ReservoirSampler
+            capacity = self.size if self._capacity is None else self._capacity.get(stratum, self.size)
+            sampler = self._strata[stratum] = sampler_class(capacity, self.rng)
+        sampler.add(item, weight)
+
+    @property
+    def seen(self):
+        """Elementi visti nello stream"""
+        return sum(sampler.seen for sampler in self._strata.values())
+
+    def sample(self):
+        """
+        Campione stratificato
+
+        Returns:
+            Lista tuple (elemento, fattore di espansione)
+        """
+        populations = {stratum: sampler.seen for stratum, sampler in self._strata.items()}
+        allocation = self._allocate(populations, min(self.size, sum(populations.values())))
+
+        sample = []
+        for stratum, n_h in allocation.items():
+            if not n_h:
+                continue
+            population = populations[stratum]
+            base, extra = divmod(population, n_h)
+            for j, item in enumerate(self._strata[stratum].sample(n_h)):
+                sample.append((item, base + (1 if j < extra else 0)))
+
+        return sample
+
+    @staticmethod
+    def _allocate(populations, size):
+        """
+        Quote per strato: almeno un elemento per strato non vuoto, il resto
+        proporzionale alla popolazione (resti maggiori)
+
+        Ogni strato estratto porta la sua popolazione nei fattori di
+        espansione: con più strati che posti il campione supera size
+        (uno per strato) invece di perdere la popolazione degli esclusi.
+
+        Args:
+            populations: Dict {strato: elementi visti}
+            size: Dimensione campione richiesta
+
+        Returns:
+            Dict {strato: elementi da estrarre}
+        """
+        allocation = {stratum: 1 for stratum, n in populations.items() if n > 0}
+        leftover = size - len(allocation)
+        if leftover <= 0:
+            return allocation
+
+        # Resto ripartito sugli elementi non ancora estratti (mai oltre la popolazione)
+        remaining = {stratum: populations[stratum] - 1 for stratum in allocation}
+        total = sum(remaining.values())
+        if not total:
+            return allocation
+
+        quotas = {stratum: leftover * n / total for stratum, n in remaining.items()}
+        for stratum, quota in quotas.items():
+            allocation[stratum] += int(quota)
+
+        leftover = size - sum(allocation.values())
+        by_remainder = sorted(quotas, key=lambda s: quotas[s] - int(quotas[s]), reverse=True)
+        for stratum in by_remainder[:leftover]:
+            allocation[stratum] += 1
+
+        return allocation
+
+
+def stratified_sample(strata, size, weights=None, seed=SAMPLING_CONFIG['seed']):
+    """
+    Indici di un campione stratificato
+
+    Con una lista di strati le popolazioni sono contate prima (reservoir
+    limitati alla quota di ogni strato); un iteratore è consumato in
+    streaming (vedi StratifiedSampler per la memoria).
+
+    Args:
+        strata: Lista o iterabile chiavi strato (una per elemento)
+        size: Dimensione campione
+        weights: Pesi per elemento (campione pesato) o None (uniforme)
+        seed: Seed
+
+    Returns:
+        Lista tuple (indice, fattore di espansione) ordinata per indice
+    """
+    populations = None
+    if isinstance(strata, (list, tuple)):
+        # Elementi con peso nullo non entrano nel campione pesato
+        populations = Counter(
+            stratum for i, stratum in enumerate(strata) if weights is None or weights[i] > 0
+        )
+    sampler = StratifiedSampler(size, weighted=weights is not None, seed=seed, populations=populations)
+    for i, stratum in enumerate(strata):
+        sampler.add(i, stratum, weights[i] if weights is not None else 1)
+
+    return sorted(sampler.sample())
@@ -0,0 +1,348 @@
+"""
+Sketch probabilistici per statistiche in streaming (quantili, cardinalità)
+"""
+import base64
+import hashlib
+import math
+import zlib
+from config import TDIGEST_COMPRESSION, HLL_PRECISION
+
+
+class TDigest:
+    """
+    T-Digest (variante merging) per stimare quantili in memoria costante
+
+    Mantiene un numero limitato di centroidi (media, peso): è mergeable
+    tra social e analisi diverse e serializzabile in JSON.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        """
+        Inizializza digest
+
+        Args:
+            compression: Parametro di compressione (più alto = più preciso)
+        """
+        self.compression = compression
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._centroids = []  # Lista [media, peso] ordinata per media
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        """
+        Aggiunge un valore al digest
+
+        Args:
+            value: Valore numerico
+            weight: Peso del valore (default 1)
+        """
+        if value is None or weight <= 0:
+            return
+
+        value = float(value)
+        if math.isnan(value):
+            return
+
+        self._buffer.append([value, weight])
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def update(self, values):
+        """Aggiunge una sequenza di valori"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """
+        Unisce un altro digest in questo (in place)
+
+        Args:
+            other: TDigest da unire
+
+        Returns:
+            self
+        """
+        if other is None or other.count == 0:
+            return self
+
+        other._compress()
+        self._buffer.extend([list(c) for c in other._centroids])
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+        return self
+
+    def quantile(self, q):
+        """
+        Stima il quantile q
+
+        Args:
+            q: Quantile in [0, 1]
+
+        Returns:
+            Valore stimato o None se digest vuoto
+        """
+        self._compress()
+
+        if not self._centroids:
+            return None
+
+        q = min(max(q, 0.0), 1.0)
+        if len(self._centroids) == 1:
+            return self._centroids[0][0]
+
+        target = q * self.count
+
+        # Posizione cumulativa del centro di ogni centroide
+        cumulative = 0
+        prev_mean, prev_pos = self.min, 0
+        for mean, weight in self._centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                if center == prev_pos:
+                    return mean
+                ratio = (target - prev_pos) / (center - prev_pos)
+                return prev_mean + ratio * (mean - prev_mean)
+            cumulative += weight
+            prev_mean, prev_pos = mean, center
+
+        # Coda destra: interpola verso il massimo
+        if self.count == prev_pos:
+            return self.max
+        ratio = (target - prev_pos) / (self.count - prev_pos)
+        return prev_mean + ratio * (self.max - prev_mean)
+
+    def percentiles(self, percentiles=(50, 90, 99), decimals=2):
+        """
+        Restituisce i percentili richiesti
+
+        Args:
+            percentiles: Percentili (0-100)
+            decimals: Cifre decimali
+
+        Returns:
+            Dict {'p50': valore, ...}
+        """
+        result = {}
+        for p in percentiles:
+            value = self.quantile(p / 100)
+            result[f"p{p}"] = round(value, decimals) if value is not None else 0
+        return result
+
+    def to_dict(self):
+        """Serializza digest in dict JSON-compatibile"""
+        self._compress()
+        return {
+            'type': 'tdigest',
+            'compression': self.compression,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'centroids': [[round(m, 6), w] for m, w in self._centroids]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Ricostruisce digest da dict serializzato
+
+        Args:
+            data: Dict prodotto da to_dict()
+
+        Returns:
+            TDigest
+        """
+        digest = cls(compression=data.get('compression', TDIGEST_COMPRESSION))
+        digest._centroids = [[float(m), w] for m, w in data.get('centroids', [])]
+        digest.count = data.get('count', sum(w for _, w in digest._centroids))
+        digest.min = data.get('min')
+        digest.max = data.get('max')
+        return digest
+
+    def _compress(self):
+        """Fonde buffer e centroidi rispettando il limite di scala k1"""
+        if not self._buffer:
+            return
+
+        points = self._centroids + self._buffer
+        points.sort(key=lambda c: c[0])
+        self._buffer = []
+
+        total = sum(w for _, w in points)
+        merged = []
+        current_mean, current_weight = points[0]
+        weight_so_far = 0
+        k_lower = self._scale(0)
+
+        for mean, weight in points[1:]:
+            q_upper = (weight_so_far + current_weight + weight) / total
+            if self._scale(q_upper) - k_lower <= 1:
+                # Fusione nel centroide corrente (media pesata)
+                new_weight = current_weight + weight
+                current_mean += (mean - current_mean) * weight / new_weight
+                current_weight = new_weight
+            else:
+                merged.append([current_mean, current_weight])
+                weight_so_far += current_weight
+                k_lower = self._scale(weight_so_far / total)
+                current_mean, current_weight = mean, weight
+
+        merged.append([current_mean, current_weight])
+        self._centroids = merged
+
+    def _scale(self, q):
+        """Funzione di scala k1: centroidi piccoli sulle code"""
+        q = min(max(q, 0.0), 1.0)
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog per stimare il numero di elementi distinti (es. commentatori)
+
+    Memoria costante (2^precision registri da 1 byte), errore standard
+    ~1.04/sqrt(2^precision). Supporta union (merge) e stima
+    dell'intersezione per inclusione-esclusione.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        """
+        Inizializza sketch
+
+        Args:
+            precision: Bit di indice registro (4-16)
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f"Precisione HLL non valida: {precision}")
+
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, item):
+        """
+        Aggiunge un elemento allo sketch
+
+        Args:
+            item: Elemento (convertito a stringa)
+        """
+        x = int.from_bytes(
+            hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest(),
+            'big'
+        )
+        index = x >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = x & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, items):
+        """Aggiunge una sequenza di elementi"""
+        for item in items:
+            self.add(item)
+
+    def count(self):
+        """
+        Stima cardinalità
+
+        Returns:
+            Numero stimato di elementi distinti (int)
+        """
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        harmonic = sum(2.0 ** -r for r in self.registers)
+        estimate = alpha * m * m / harmonic
+
+        # Correzione small-range (linear counting)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def merge(self, other):
+        """
+        Union in place con un altro sketch della stessa precisione
+
+        Args:
+            other: HyperLogLog da unire
+
+        Returns:
+            self
+        """
+        if other.precision != self.precision:
+            raise ValueError("Impossibile unire HLL con precisioni diverse")
+
+        self.registers = bytearray(
+            max(a, b) for a, b in zip(self.registers, other.registers)
+        )
+        return self
+
+    def copy(self):
+        """Copia indipendente dello sketch"""
+        clone = HyperLogLog(self.precision)
+        clone.registers = bytearray(self.registers)
+        return clone
+
+    @staticmethod
+    def union_count(*sketches):
+        """Stima la cardinalità dell'unione di più sketch"""
+        sketches = [s for s in sketches if s is not None]
+        if not sketches:
+            return 0
+
+        union = sketches[0].copy()
+        for sketch in sketches[1:]:
+            union.merge(sketch)
+        return union.count()
+
+    @staticmethod
+    def intersection_count(a, b):
+        """
+        Stima |A ∩ B| per inclusione-esclusione
+
+        Args:
+            a, b: HyperLogLog
+
+        Returns:
+            Stima intersezione (int, >= 0)
+        """
+        count_a, count_b = a.count(), b.count()
+        union = HyperLogLog.union_count(a, b)
+        return max(0, min(count_a + count_b - union, count_a, count_b))
+
+    def to_dict(self):
+        """Serializza sketch (registri compressi zlib + base64)"""
+        return {
+            'type': 'hll',
+            'precision': self.precision,
+            'registers': base64.b64encode(zlib.compress(bytes(self.registers))).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Ricostruisce sketch da dict serializzato
+
+        Args:
+            data: Dict prodotto da to_dict()
+
+        Returns:
+            HyperLogLog
+        """
+        sketch = cls(precision=data.get('precision', HLL_PRECISION))
+        registers = zlib.decompress(base64.b64decode(data['registers']))
+        if len(registers) != sketch.m:
+            raise ValueError("Registri HLL corrotti")
+        sketch.registers = bytearray(registers)
+        return sketch
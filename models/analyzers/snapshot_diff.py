@@ -0,0 +1,266 @@
+"""
+Confronto tra snapshot (analisi salvate) dello stesso brand
+"""
+from datetime import datetime
+from config import SNAPSHOT_DIFF_CACHE_DIR, SNAPSHOT_DIFF_TOP_POSTS
+from models.storage import file_codec
+from models.storage.catalog import SUMMARY_COLUMNS
+from models.storage.object_store import INVALID_IDS
+from utils.logger import Logger
+
+
+# Contatori per post confrontati tra i due snapshot
+POST_METRICS = ('likes', 'views', 'comments_count')
+
+
+def _delta(old, new):
+    """Valori, differenza e variazione % di una metrica (None se manca un valore)"""
+    if old is None or new is None:
+        return {'old': old, 'new': new, 'delta': None, 'pct': None}
+    delta = new - old
+    return {
+        'old': old,
+        'new': new,
+        'delta': round(delta, 2) if isinstance(delta, float) else delta,
+        'pct': round(delta / old * 100, 1) if old else None
+    }
+
+
+def _count(value):
+    """Contatore intero (0 se mancante o non numerico)"""
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class SnapshotDiffEngine:
+    """
+    Delta tra due analisi dello stesso brand
+
+    Metriche e sentiment arrivano dal catalogo (riepiloghi salvati con
+    l'analisi); post nuovi, non più presenti e crescita per post dalla
+    sola sezione 'posts' dei due snapshot, indicizzata per ID (commenti
+    e AI non letti). I diff sono salvati in results/SNAPSHOT_DIFF_CACHE_DIR
+    con la versione dei file delle due analisi: un'analisi riscritta
+    (merge batch, compattazione) invalida i suoi diff.
+    """
+
+    def __init__(self, storage, top_posts=SNAPSHOT_DIFF_TOP_POSTS, logger=None):
+        """
+        Inizializza engine
+
+        Args:
+            storage: StorageManager
+            top_posts: Post con la crescita maggiore riportati nel diff
+            logger: Logger opzionale
+        """
+        self.storage = storage
+        self.top_posts = top_posts
+        self.cache_dir = storage.results_dir / SNAPSHOT_DIFF_CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+    def diff(self, new_id, old_id=None):
+        """
+        Confronta due analisi dello stesso brand
+
+        Args:
+            new_id: ID analisi più recente
+            old_id: ID analisi di riferimento (default la precedente del brand)
+
+        Returns:
+            Dict diff (vedi _compute) o None se non esiste un'analisi precedente
+        """
+        for analysis_id in (new_id, old_id):
+            if analysis_id:
+                self.storage.wait(analysis_id)
+
+        entry = self.storage.catalog.get(new_id)
+        if not entry:
+            raise ValueError(f"Analisi {new_id} non trovata")
+
+        # Voci del brand con i riepiloghi per social (più recenti prima)
+        entries = {e['id']: e for e in self.storage.list_analyses(brand_name=entry['brand_name'])}
+        new = entries[new_id]
+
+        if old_id is None:
+            older = [e for e in entries.values() if e['timestamp'] < new['timestamp']]
+            if not older:
+                return None
+            old = older[0]
+        elif old_id in entries:
+            old = entries[old_id]
+        elif self.storage.catalog.get(old_id):
+            raise ValueError(f"Analisi {old_id} e {new_id} di brand diversi")
+        else:
+            raise ValueError(f"Analisi {old_id} non trovata")
+
+        if old['timestamp'] > new['timestamp']:
+            old, new = new, old
+
+        versions = [self._version(old), self._version(new)]
+        cache_path = file_codec.file_path(self.cache_dir / f"{old['id']}__{new['id']}")
+
+        if cache_path.exists():
+            try:
+                cached = file_codec.read_file(cache_path)
+                if cached['versions'] == versions:
+                    return cached['diff']
+            except (OSError, ValueError, KeyError) as e:
+                self.logger.warning(f"Diff in cache illeggibile {cache_path.name}: {e}")
+
+        diff = self._compute(old, new)
+        file_codec.write_file(cache_path, {'versions': versions, 'diff': diff})
+
+        self.logger.info(f"✓ Diff calcolato: {old['id']} -> {new['id']}")
+        return diff
+
+    def latest(self, brand_name):
+        """
+        Diff tra le ultime due analisi di un brand
+
+        Args:
+            brand_name: Nome brand
+
+        Returns:
+            Dict diff o None se il brand ha meno di due analisi
+        """
+        # Salvataggi in background non ancora nel catalogo
+        self.storage.flush()
+        entries = self.storage.list_analyses(brand_name=brand_name, limit=1)
+        if not entries:
+            return None
+        return self.diff(entries[0]['id'])
+
+    def remove(self, analysis_id):
+        """
+        Elimina i diff in cache che coinvolgono un'analisi
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            Numero diff rimossi
+        """
+        removed = 0
+        for pattern in (f"{analysis_id}__*", f"*__{analysis_id}.*"):
+            for path in self.cache_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def _compute(self, old, new):
+        """
+        Diff tra due voci di catalogo
+
+        Returns:
+            Dict con brand_name, old/new (id, timestamp, tier), days,
+            metrics e socials ({metrica: old, new, delta, pct}), sentiment
+            e posts (new, removed, top_growth, totali crescita)
+        """
+        elapsed = datetime.fromisoformat(new['timestamp']) - datetime.fromisoformat(old['timestamp'])
+
+        socials = {}
+        for social in sorted(set(old['socials']) | set(new['socials'])):
+            old_social = old['socials'].get(social) or {}
+            new_social = new['socials'].get(social) or {}
+            socials[social] = {
+                'status': 'common' if old_social and new_social else ('added' if new_social else 'removed'),
+                'metrics': {c: _delta(old_social.get(c), new_social.get(c)) for c in SUMMARY_COLUMNS}
+            }
+
+        return {
+            'brand_name': new['brand_name'],
+            'old': {'id': old['id'], 'timestamp': old['timestamp'], 'tier': old.get('tier', 'full')},
+            'new': {'id': new['id'], 'timestamp': new['timestamp'], 'tier': new.get('tier', 'full')},
+            'days': round(elapsed.total_seconds() / 86400, 1),
+            'metrics': {c: _delta(old['summary'].get(c), new['summary'].get(c)) for c in SUMMARY_COLUMNS},
+            'socials': socials,
+            'sentiment': self._sentiment_shift(old['summary'], new['summary']),
+            'posts': self._posts_diff(old, new)
+        }
+
+    @staticmethod
+    def _sentiment_shift(old, new):
+        """Variazione sentiment (punti %): positivo, negativo e netto (positivo - negativo)"""
+        def _net(summary):
+            if summary.get('positive_pct') is None or summary.get('negative_pct') is None:
+                return None
+            return round(summary['positive_pct'] - summary['negative_pct'], 1)
+
+        return {
+            'positive_pct': _delta(old.get('positive_pct'), new.get('positive_pct')),
+            'negative_pct': _delta(old.get('negative_pct'), new.get('negative_pct')),
+            'net': _delta(_net(old), _net(new))
+        }
+
+    def _posts_diff(self, old, new):
+        """Post nuovi, non più presenti e crescita dei post comuni (chiave social + ID)"""
+        old_posts = self._load_posts(old)
+        new_posts = self._load_posts(new)
+
+        if old_posts is None or new_posts is None:
+            # Analisi compattata o archiviata: nessun post grezzo
+            return {'available': False}
+
+        growth = []
+        for key, post in new_posts.items():
+            previous = old_posts.get(key)
+            if previous is None:
+                continue
+            item = dict(post)
+            for metric in POST_METRICS:
+                item[f"{metric}_delta"] = post[metric] - previous[metric]
+            item['likes_pct'] = (
+                round(item['likes_delta'] / previous['likes'] * 100, 1) if previous['likes'] else None
+            )
+            growth.append(item)
+
+        growth.sort(key=lambda p: (p['likes_delta'], p['views_delta']), reverse=True)
+
+        def _by_likes(posts):
+            return sorted(posts, key=lambda p: p['likes'], reverse=True)
+
+        return {
+            'available': True,
+            'new': _by_likes(post for key, post in new_posts.items() if key not in old_posts),
+            'removed': _by_likes(post for key, post in old_posts.items() if key not in new_posts),
+            'common': len(growth),
+            'likes_growth': sum(p['likes_delta'] for p in growth),
+            'views_growth': sum(p['views_delta'] for p in growth),
+            'top_growth': growth[:self.top_posts]
+        }
+
+    def _load_posts(self, entry):
+        """
+        Post di uno snapshot per (social, ID): solo campi di confronto
+
+        Returns:
+            Dict {(social, id): post} o None se i post non sono disponibili
+        """
+        if entry.get('tier', 'full') != 'full':
+            return None
+
+        data = self.storage.load_analysis(entry['id'], sections=['posts'])
+        if not data:
+            return None
+
+        posts = {}
+        for social, social_data in (data['results'].get('social_results') or {}).items():
+            for post in social_data.get('posts') or []:
+                if not isinstance(post, dict) or post.get('id') in INVALID_IDS:
+                    continue
+                posts[(social, str(post['id']))] = {
+                    'social': social,
+                    'id': str(post['id']),
+                    'url': post.get('url'),
+                    'caption': (post.get('caption') or '')[:120],
+                    'timestamp': post.get('timestamp'),
+                    **{metric: _count(post.get(metric)) for metric in POST_METRICS}
+                }
+        return posts
+
+    def _version(self, entry):
+        """Versione dei file di un'analisi (tier + mtime): cambia a ogni riscrittura"""
+        return [entry.get('tier', 'full'), self.storage.analysis_version(entry['id'])]
@@ -0,0 +1,198 @@
+"""
+Tokenizer streaming per wordcloud: parole, hashtag, emoji e n-grammi
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+import multiprocessing
+import os
+import re
+import threading
+from config import ITALIAN_STOPWORDS, ENGLISH_STOPWORDS, TOKENIZER_CONFIG
+
+# Pattern precompilati (una volta per processo)
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+MENTION_PATTERN = re.compile(r'@[\w.]+')
+TOKEN_PATTERN = re.compile(
+    r'(?P<hashtag>#[^\W_][\w]*)'
+    r"|(?P<word>[^\W\d_]+)"
+    r'|(?P<emoji>[\U0001F300-\U0001FAFF☀-➿])'
+)
+
+DEFAULT_STOPWORDS = ITALIAN_STOPWORDS | ENGLISH_STOPWORDS
+
+
+def tokenize(text, stopwords=DEFAULT_STOPWORDS, min_word_length=None):
+    """
+    Tokenizza un commento
+
+    Args:
+        text: Testo commento
+        stopwords: Frozenset stopwords
+        min_word_length: Lunghezza minima parole (default da config)
+
+    Returns:
+        Tuple (parole in ordine con None al posto delle stopword,
+               hashtag, emoji)
+    """
+    if min_word_length is None:
+        min_word_length = TOKENIZER_CONFIG['min_word_length']
+
+    text = MENTION_PATTERN.sub(' ', URL_PATTERN.sub(' ', text.lower()))
+
+    words = []
+    hashtags = []
+    emojis = []
+
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        token = match.group(kind)
+
+        if kind == 'word':
+            # None separa le frasi: gli n-grammi non attraversano stopword
+            if token in stopwords or len(token) < min_word_length:
+                words.append(None)
+            else:
+                words.append(token)
+        elif kind == 'hashtag':
+            hashtags.append(token)
+        else:
+            emojis.append(token)
+
+    return words, hashtags, emojis
+
+
+def count_terms(texts, stopwords=DEFAULT_STOPWORDS, ngram_range=None):
+    """
+    Conta termini (parole, frasi, hashtag) ed emoji su una sequenza di testi
+
+    Args:
+        texts: Iterabile di testi (consumato in streaming)
+        stopwords: Frozenset stopwords
+        ngram_range: Tuple (min_n, max_n) di parole per termine
+
+    Returns:
+        Tuple (Counter termini, Counter emoji)
+    """
+    min_n, max_n = ngram_range or TOKENIZER_CONFIG['ngram_range']
+
+    terms = Counter()
+    emojis = Counter()
+
+    for text in texts:
+        if not text:
+            continue
+
+        words, hashtags, emoji_tokens = tokenize(text, stopwords)
+
+        for n in range(min_n, max_n + 1):
+            for i in range(len(words) - n + 1):
+                gram = words[i:i + n]
+                if None not in gram:
+                    terms[' '.join(gram)] += 1
+
+        terms.update(hashtags)
+        emojis.update(emoji_tokens)
+
+    return terms, emojis
+
+
+def _count_chunk(args):
+    """Worker process pool (funzione top-level per il pickling)"""
+    texts, stopwords, ngram_range = args
+    return count_terms(texts, stopwords, ngram_range)
+
+
+def _chunked(texts, chunk_size):
+    """Divide un iterabile in liste da chunk_size (lazy: un chunk alla volta)"""
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Process pool condiviso dai thread di analisi (un social per thread)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """
+    Process pool di processo, creato al primo uso
+
+    Processi avviati con 'spawn': un fork mentre altri thread tengono lock
+    (logging, sqlite) li copierebbe bloccati nel figlio.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=TOKENIZER_CONFIG['max_workers'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _reset_pool():
+    """Scarta un pool non più utilizzabile (ricreato alla prossima richiesta)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def count_terms_parallel(texts, stopwords=DEFAULT_STOPWORDS, ngram_range=None, logger=None):
+    """
+    Conteggio termini con process pool sopra parallel_threshold testi
+
+    I chunk sono inviati al pool pochi alla volta (max_pending_chunks per
+    worker) e i Counter uniti man mano: la memoria resta proporzionale al
+    vocabolario, non al numero di commenti.
+
+    Args:
+        texts: Lista testi
+        stopwords: Frozenset stopwords
+        ngram_range: Tuple (min_n, max_n)
+        logger: Logger opzionale
+
+    Returns:
+        Tuple (Counter termini, Counter emoji)
+    """
+    if len(texts) < TOKENIZER_CONFIG['parallel_threshold']:
+        return count_terms(texts, stopwords, ngram_range)
+
+    workers = TOKENIZER_CONFIG['max_workers'] or os.cpu_count() or 1
+    max_pending = workers * TOKENIZER_CONFIG['max_pending_chunks']
+    chunks = _chunked(texts, TOKENIZER_CONFIG['chunk_size'])
+
+    terms = Counter()
+    emojis = Counter()
+    pending = set()
+
+    try:
+        pool = _get_pool()
+        while True:
+            # Riempie fino a max_pending chunk in volo, poi unisce il primo completato
+            for chunk in islice(chunks, max_pending - len(pending)):
+                pending.add(pool.submit(_count_chunk, (chunk, stopwords, ngram_range)))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk_terms, chunk_emojis = future.result()
+                terms.update(chunk_terms)
+                emojis.update(chunk_emojis)
+    except (OSError, RuntimeError) as e:
+        # Process pool non disponibile (es. ambiente ristretto) o interrotto: seriale
+        for future in pending:
+            future.cancel()
+        _reset_pool()
+        if logger:
+            logger.warning(f"Process pool non disponibile, conteggio seriale: {e}")
+        return count_terms(texts, stopwords, ngram_range)
+
+    return terms, emojis
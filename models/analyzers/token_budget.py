@@ -0,0 +1,133 @@
+"""
+Conteggio token locale e packing di richieste entro un budget di token
+"""
+import math
+import threading
+from config import OPENAI_MODEL
+
+try:
+    import tiktoken
+except ImportError:  # Dipendenza opzionale: fallback euristico
+    tiktoken = None
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def _get_encoder(model):
+    """Encoder tiktoken per modello (None se non disponibile/offline)"""
+    if tiktoken is None:
+        return None
+
+    with _encoders_lock:
+        if model not in _encoders:
+            try:
+                try:
+                    _encoders[model] = tiktoken.encoding_for_model(model)
+                except KeyError:  # Modello non mappato
+                    _encoders[model] = tiktoken.get_encoding('o200k_base')
+            except Exception:
+                # Vocabolario non scaricabile (es. offline): euristica
+                _encoders[model] = None
+        return _encoders[model]
+
+
+def _encode(encoder, text):
+    """
+    Token di un testo, con le stringhe speciali (es. "<|endoftext|>")
+    trattate come testo: un commento che le contiene non fa fallire encode
+    """
+    return encoder.encode(text, disallowed_special=())
+
+
+def count_tokens(text, model=OPENAI_MODEL):
+    """
+    Conta i token di un testo
+
+    Usa tiktoken se disponibile, altrimenti stima ~4 caratteri per token.
+
+    Args:
+        text: Testo
+        model: Modello OpenAI di riferimento
+
+    Returns:
+        Numero token (int)
+    """
+    if not text:
+        return 0
+
+    encoder = _get_encoder(model)
+    if encoder is not None:
+        return len(_encode(encoder, text))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text, max_tokens, model=OPENAI_MODEL):
+    """
+    Tronca un testo a max_tokens
+
+    Args:
+        text: Testo
+        max_tokens: Token massimi
+        model: Modello OpenAI di riferimento
+
+    Returns:
+        Testo troncato
+    """
+    if not text:
+        return ''
+
+    encoder = _get_encoder(model)
+    if encoder is not None:
+        tokens = _encode(encoder, text)
+        if len(tokens) <= max_tokens:
+            return text
+        return encoder.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def pack_batches(items, token_counts, max_input_tokens, max_output_tokens,
+                 output_tokens_per_item, overhead_tokens=0, max_items=None):
+    """
+    Raggruppa item in batch che rispettano budget di input e output
+
+    Greedy in ordine: ogni batch viene riempito finché il prompt stimato
+    (overhead + token degli item) e la risposta attesa (token per item)
+    restano nel budget. Un item più grande del budget va da solo.
+
+    Args:
+        items: Lista item
+        token_counts: Token di ogni item (allineati)
+        max_input_tokens: Budget token prompt per richiesta
+        max_output_tokens: Budget token risposta per richiesta
+        output_tokens_per_item: Token di risposta attesi per item
+        overhead_tokens: Token fissi del prompt (istruzioni)
+        max_items: Limite opzionale di item per batch
+
+    Returns:
+        Lista di batch (liste di item)
+    """
+    max_items_by_output = max(1, max_output_tokens // max(1, output_tokens_per_item))
+    if max_items:
+        max_items_by_output = min(max_items_by_output, max_items)
+
+    batches = []
+    current = []
+    current_tokens = overhead_tokens
+
+    for item, tokens in zip(items, token_counts):
+        fits_input = current_tokens + tokens <= max_input_tokens
+        fits_output = len(current) < max_items_by_output
+
+        if current and not (fits_input and fits_output):
+            batches.append(current)
+            current = []
+            current_tokens = overhead_tokens
+
+        current.append(item)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
@@ -0,0 +1,292 @@
+"""
+Topic locali (CPU): TF-IDF sparso + k-means sferico mini-batch
+"""
+import math
+import random
+from collections import Counter
+from config import TOPIC_CONFIG, STOPWORDS_BY_LANGUAGE
+from models.analyzers.text_tokenizer import tokenize, DEFAULT_STOPWORDS
+
+
+class TopicEngine:
+    """
+    Raggruppa i commenti in temi ricorrenti senza LLM
+
+    1. Tokenizzazione (parole, bigrammi, hashtag) con stopword per lingua
+    2. TF-IDF sparso (dict indice -> peso) normalizzato L2
+    3. K-means sferico mini-batch (Sculley) con inizializzazione k-means++
+       su un campione; assegnazione finale di tutti i commenti
+
+    Ogni topic espone parole chiave (pesi del centroide), dimensione e
+    commenti rappresentativi (più vicini al centroide).
+    """
+
+    def __init__(self, num_topics=TOPIC_CONFIG['num_topics'],
+                 max_features=TOPIC_CONFIG['max_features'],
+                 min_df=TOPIC_CONFIG['min_df'], max_df=TOPIC_CONFIG['max_df'],
+                 batch_size=TOPIC_CONFIG['batch_size'],
+                 iterations=TOPIC_CONFIG['iterations'],
+                 min_topic_size=TOPIC_CONFIG['min_topic_size'], seed=42):
+        """
+        Inizializza engine
+
+        Args:
+            num_topics: Numero massimo di topic
+            max_features: Dimensione massima vocabolario
+            min_df: Documenti minimi in cui deve comparire un termine
+            max_df: Frazione massima di documenti (termini troppo comuni esclusi)
+            batch_size: Commenti per mini-batch
+            iterations: Numero di mini-batch
+            min_topic_size: Commenti minimi per tenere un topic
+            seed: Seed (risultati deterministici)
+        """
+        self.num_topics = num_topics
+        self.max_features = max_features
+        self.min_df = min_df
+        self.max_df = max_df
+        self.batch_size = batch_size
+        self.iterations = iterations
+        self.min_topic_size = min_topic_size
+        self.seed = seed
+
+    def fit(self, texts, weights=None, languages=None,
+            top_keywords=TOPIC_CONFIG['top_keywords'], examples=TOPIC_CONFIG['examples']):
+        """
+        Estrae i topic da una lista di commenti
+
+        Args:
+            texts: Lista testi
+            weights: Peso di ogni testo (es. dimensione cluster dedup), default 1
+            languages: Lingua di ogni testo (stopword), default IT+EN
+            top_keywords: Parole chiave per topic
+            examples: Commenti rappresentativi per topic
+
+        Returns:
+            Lista dict topic {id, keywords, size, share_pct, examples}
+            ordinata per dimensione
+        """
+        if weights is None:
+            weights = [1] * len(texts)
+        if languages is None:
+            languages = [None] * len(texts)
+
+        documents = [
+            self._terms(text, lang) for text, lang in zip(texts, languages)
+        ]
+        vocabulary, idf = self._build_vocabulary(documents)
+        if not vocabulary:
+            return []
+
+        vectors = [self._tfidf(doc, vocabulary, idf) for doc in documents]
+        indexed = [i for i, vector in enumerate(vectors) if vector]
+
+        k = min(self.num_topics, len(indexed) // max(1, self.min_topic_size))
+        if k < 1:
+            return []
+
+        rng = random.Random(self.seed)
+        centroids = self._init_centroids([vectors[i] for i in indexed], k, len(vocabulary), rng)
+        centroids = self._mini_batch_kmeans([vectors[i] for i in indexed], centroids, rng)
+
+        # Assegnazione finale di tutti i commenti
+        members = [[] for _ in centroids]
+        for i in indexed:
+            best, similarity = self._nearest(vectors[i], centroids)
+            members[best].append((similarity, i))
+
+        return self._describe(members, centroids, vocabulary, texts, weights, top_keywords, examples)
+
+    def _terms(self, text, lang):
+        """Termini di un commento: parole, bigrammi, hashtag"""
+        if not text:
+            return []
+
+        stopwords = STOPWORDS_BY_LANGUAGE.get(lang, DEFAULT_STOPWORDS)
+        words, hashtags, _ = tokenize(text, stopwords)
+
+        terms = [w for w in words if w]
+        terms.extend(
+            f"{a} {b}" for a, b in zip(words, words[1:]) if a and b
+        )
+        terms.extend(hashtags)
+        return terms
+
+    def _build_vocabulary(self, documents):
+        """Vocabolario (termine -> indice) e IDF filtrati per frequenza documentale"""
+        df = Counter()
+        for doc in documents:
+            df.update(set(doc))
+
+        total = len(documents)
+        max_docs = max(self.min_df, self.max_df * total)
+        candidates = [
+            (term, count) for term, count in df.items()
+            if self.min_df <= count <= max_docs
+        ]
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        candidates = candidates[:self.max_features]
+
+        vocabulary = {term: idx for idx, (term, _) in enumerate(candidates)}
+        idf = [math.log((1 + total) / (1 + count)) + 1 for _, count in candidates]
+        return vocabulary, idf
+
+    @staticmethod
+    def _tfidf(doc, vocabulary, idf):
+        """Vettore TF-IDF sparso normalizzato L2 (tf sublineare)"""
+        counts = Counter(vocabulary[t] for t in doc if t in vocabulary)
+        vector = {idx: (1 + math.log(n)) * idf[idx] for idx, n in counts.items()}
+
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        if not norm:
+            return {}
+        return {idx: w / norm for idx, w in vector.items()}
+
+    @staticmethod
+    def _nearest(vector, centroids, scales=None):
+        """Indice e similarità coseno del centroide più vicino (scales: fattori lazy)"""
+        best, best_similarity = 0, -1.0
+        for c, centroid in enumerate(centroids):
+            similarity = sum(centroid[idx] * w for idx, w in vector.items())
+            if scales is not None:
+                similarity *= scales[c]
+            if similarity > best_similarity:
+                best, best_similarity = c, similarity
+        return best, best_similarity
+
+    def _init_centroids(self, vectors, k, dim, rng):
+        """Inizializzazione k-means++ su un campione dei vettori"""
+        sample = vectors if len(vectors) <= self.batch_size else rng.sample(vectors, self.batch_size)
+
+        chosen = [rng.choice(sample)]
+        centroids = [self._densify(chosen[0], dim)]
+
+        while len(centroids) < k:
+            # Distanza coseno dal centroide più vicino (1 - similarità)
+            distances = [max(0.0, 1 - self._nearest(v, centroids)[1]) ** 2 for v in sample]
+            total = sum(distances)
+            if not total:
+                break
+            target = rng.random() * total
+            cumulative = 0.0
+            for vector, distance in zip(sample, distances):
+                cumulative += distance
+                if cumulative >= target:
+                    centroids.append(self._densify(vector, dim))
+                    break
+
+        return centroids
+
+    def _mini_batch_kmeans(self, vectors, centroids, rng):
+        """
+        K-means sferico mini-batch
+
+        Ogni centroide si sposta verso la media del batch assegnato con
+        learning rate n_batch / n_totale. Il centroide è tenuto come
+        scala × valori: il decadimento (1 - eta) e la normalizzazione L2
+        cambiano solo la scala e la norma è aggiornata sui soli termini
+        toccati, quindi il costo per iterazione è proporzionale ai termini
+        non nulli del batch, non alla dimensione del vocabolario (eccetto
+        il primo batch di ogni centroide, eta = 1, che lo azzera).
+        """
+        counts = [0] * len(centroids)
+        scales = [1.0] * len(centroids)
+        sq_norms = [sum(w * w for w in centroid) for centroid in centroids]
+        batch_size = min(self.batch_size, len(vectors))
+
+        for _ in range(self.iterations):
+            batch = rng.sample(vectors, batch_size)
+
+            sums = [Counter() for _ in centroids]
+            batch_counts = [0] * len(centroids)
+            for vector in batch:
+                c = self._nearest(vector, centroids, scales)[0]
+                sums[c].update(vector)
+                batch_counts[c] += 1
+
+            for c, centroid in enumerate(centroids):
+                if not batch_counts[c]:
+                    continue
+                counts[c] += batch_counts[c]
+                eta = batch_counts[c] / counts[c]
+
+                scale = scales[c] * (1 - eta)
+                if scale < 1e-9:
+                    # Primo batch (eta = 1) o scala esaurita: ripartenza densa
+                    for idx in range(len(centroid)):
+                        centroid[idx] *= scale
+                    scale = 1.0
+                    sq_norms[c] = sum(w * w for w in centroid)
+                else:
+                    sq_norms[c] *= (1 - eta) ** 2
+
+                # Valore reale = scala × valore memorizzato: norma aggiornata sui termini toccati
+                for idx, w in sums[c].items():
+                    old = centroid[idx] * scale
+                    new = old + eta * w / batch_counts[c]
+                    centroid[idx] = new / scale
+                    sq_norms[c] += new * new - old * old
+
+                # Normalizzazione L2 lazy: solo la scala
+                norm = math.sqrt(max(sq_norms[c], 0.0))
+                scales[c] = scale / norm if norm else scale
+                sq_norms[c] = 1.0 if norm else 0.0
+
+        # Centroidi materializzati (e rinormalizzati: niente deriva numerica)
+        for c, centroid in enumerate(centroids):
+            for idx in range(len(centroid)):
+                centroid[idx] *= scales[c]
+            self._normalize(centroid)
+
+        return centroids
+
+    def _describe(self, members, centroids, vocabulary, texts, weights, top_keywords, examples):
+        """Parole chiave, dimensione ed esempi per topic"""
+        terms = sorted(vocabulary, key=vocabulary.get)
+        total_weight = sum(weights[i] for group in members for _, i in group) or 1
+
+        topics = []
+        for centroid, group in zip(centroids, members):
+            if len(group) < self.min_topic_size:
+                continue
+
+            top = sorted(range(len(centroid)), key=centroid.__getitem__, reverse=True)[:top_keywords]
+            size = sum(weights[i] for _, i in group)
+
+            representative = []
+            seen = set()
+            for _, i in sorted(group, reverse=True):
+                key = texts[i].strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    representative.append(texts[i])
+                if len(representative) >= examples:
+                    break
+
+            topics.append({
+                'keywords': [terms[idx] for idx in top if centroid[idx] > 0],
+                'size': size,
+                'share_pct': round(size / total_weight * 100, 1),
+                'examples': representative
+            })
+
+        topics.sort(key=lambda t: t['size'], reverse=True)
+        for topic_id, topic in enumerate(topics):
+            topic['id'] = topic_id
+
+        return topics
+
+    @staticmethod
+    def _densify(vector, dim):
+        """Vettore sparso -> lista densa"""
+        dense = [0.0] * dim
+        for idx, w in vector.items():
+            dense[idx] = w
+        return dense
+
+    @staticmethod
+    def _normalize(centroid):
+        """Normalizzazione L2 in place (k-means sferico)"""
+        norm = math.sqrt(sum(w * w for w in centroid))
+        if norm:
+            for idx in range(len(centroid)):
+                centroid[idx] /= norm
@@ -6,6 +6,7 @@ from abc import ABC, abstractmethod
 from apify_client import ApifyClient
 import time
 from config import RETRY_ATTEMPTS, RETRY_DELAY, RATE_LIMIT_DELAY
+from models.analyzers.language_detector import LanguageDetector
 from utils.logger import Logger
 
 
@@ -23,6 +24,7 @@ class BaseScraper(ABC):
         self.client = ApifyClient(apify_token)
         self.logger = logger or Logger.get_logger(self.__class__.__name__)
         self.social_type = self._get_social_type()
+        self.language_detector = LanguageDetector()
 
     @abstractmethod
     def _get_social_type(self):
@@ -154,6 +156,9 @@ class BaseScraper(ABC):
                     self.logger.warning(f"Errore parsing commento: {e}")
                     continue
 
+            # Lingua rilevata una sola volta, in fase di parsing
+            self.language_detector.tag(comments)
+
             self.logger.debug(f"✓ Estratti {len(comments)} commenti")
 
             # Rate limiting
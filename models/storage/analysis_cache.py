@@ -0,0 +1,151 @@
+"""
+Cache LRU in-process delle sezioni di analisi caricate (limite in byte)
+"""
+import threading
+from collections import OrderedDict
+from config import ANALYSIS_CACHE_MAX_BYTES
+
+
+class AnalysisCache:
+    """
+    Cache LRU condivisa dal processo (tutte le sessioni Streamlit)
+
+    Chiave (analysis_id, sezione, versione): la versione è l'mtime dei
+    file dell'analisi, quindi una riscrittura da un altro processo non
+    restituisce mai dati vecchi. I valori sono condivisi tra i lettori:
+    vanno trattati in sola lettura.
+    """
+
+    def __init__(self, max_bytes=ANALYSIS_CACHE_MAX_BYTES):
+        """
+        Inizializza cache
+
+        Args:
+            max_bytes: Dimensione massima (stima in byte JSON; 0 = disattivata)
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._by_analysis = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Valore in cache (diventa il più recente)
+
+        Args:
+            key: Tuple (analysis_id, sezione, versione)
+
+        Returns:
+            Valore o None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Inserisce un valore ed espelle i meno recenti oltre il limite
+
+        Args:
+            key: Tuple (analysis_id, sezione, versione)
+            value: Valore (sola lettura)
+            size: Dimensione stimata in byte
+        """
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size)
+            self._by_analysis.setdefault(key[0], set()).add(key)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, sizer):
+        """
+        Valore dalla cache o caricato e messo in cache
+
+        Args:
+            key: Tuple (analysis_id, sezione, versione)
+            loader: Callable senza argomenti che produce il valore
+            sizer: Callable valore -> byte stimati
+
+        Returns:
+            Valore
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.put(key, value, sizer(value))
+        return value
+
+    def invalidate(self, analysis_id):
+        """
+        Rimuove tutte le sezioni (e versioni) di un'analisi
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            Numero voci rimosse
+        """
+        with self._lock:
+            keys = list(self._by_analysis.get(analysis_id, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        """Svuota la cache (statistiche invariate)"""
+        with self._lock:
+            self._entries.clear()
+            self._by_analysis.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Statistiche cache
+
+        Returns:
+            Dict hits, misses, hit_rate, evictions, entries, bytes, max_bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _remove(self, key):
+        """Rimuove una voce (lock già acquisito)"""
+        _, size = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._by_analysis.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_analysis[key[0]]
+
+
+# Istanza di processo: condivisa da tutti gli StorageManager
+analysis_cache = AnalysisCache()
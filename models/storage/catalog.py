@@ -0,0 +1,393 @@
+"""
+Catalogo analisi salvate: indice JSON (legacy) o SQLite
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from config import STORAGE_BACKEND, CATALOG_DB_NAME
+from models.storage import file_codec
+from models.storage.sections import load_sections, is_sectioned
+from utils.logger import Logger
+
+
+# Versione schema catalogo SQLite (migrazioni una tantum all'apertura)
+SCHEMA_VERSION = 2
+
+# Colonne riepilogo (denormalizzate al salvataggio) e tipo SQLite
+SUMMARY_COLUMNS = {
+    'total_posts': 'INTEGER',
+    'total_comments': 'INTEGER',
+    'total_likes': 'INTEGER',
+    'total_views': 'INTEGER',
+    'avg_engagement_rate': 'REAL',
+    'positive_pct': 'REAL',
+    'negative_pct': 'REAL'
+}
+
+
+def catalog_entry(analysis_data):
+    """Voce di catalogo dai dati completi di un'analisi (con riepilogo)"""
+    summary, socials = analysis_summary(analysis_data.get('results') or {})
+    return {
+        'id': analysis_data['id'],
+        'timestamp': analysis_data['timestamp'],
+        'brand_name': analysis_data['brand_name'],
+        'social_urls': analysis_data.get('social_urls', {}),
+        'ai_enabled': analysis_data.get('ai_enabled', False),
+        'summary': summary,
+        'socials': socials,
+        'tier': (analysis_data.get('retention') or {}).get('tier', 'full')
+    }
+
+
+def analysis_summary(results):
+    """
+    Numeri chiave di un'analisi per storico, export e trend
+
+    Args:
+        results: Risultati completi (aggregated_stats, social_results, ai_analysis)
+
+    Returns:
+        Tuple (riepilogo brand, dict {social: riepilogo social})
+    """
+    agg_stats = results.get('aggregated_stats') or {}
+    ai_analysis = results.get('ai_analysis') or {}
+
+    def _sentiment(analysis):
+        sentiment = (analysis or {}).get('sentiment') or {}
+        if not sentiment:
+            return {'positive_pct': None, 'negative_pct': None}
+        return {
+            'positive_pct': sentiment.get('positive_pct', 0),
+            'negative_pct': sentiment.get('negative_pct', 0)
+        }
+
+    summary = {
+        'total_posts': agg_stats.get('total_posts', 0),
+        'total_comments': agg_stats.get('total_comments', 0),
+        'total_likes': agg_stats.get('total_likes', 0),
+        'total_views': agg_stats.get('total_views', 0),
+        'avg_engagement_rate': agg_stats.get('avg_engagement_rate', 0),
+        **_sentiment(ai_analysis.get('aggregated'))
+    }
+
+    socials = {}
+    for social, data in (results.get('social_results') or {}).items():
+        metrics = data.get('metrics') or {}
+        socials[social] = {
+            'url': data.get('url'),
+            'total_posts': metrics.get('total_posts', 0),
+            'total_comments': metrics.get('total_comments', 0),
+            'total_likes': metrics.get('total_likes', 0),
+            'total_views': metrics.get('total_views', 0),
+            'avg_engagement_rate': metrics.get('avg_engagement_rate', 0),
+            **_sentiment(ai_analysis.get(social))
+        }
+
+    return summary, socials
+
+
+def create_catalog(results_dir, backend=STORAGE_BACKEND, logger=None):
+    """
+    Catalogo per il backend configurato
+
+    Args:
+        results_dir: Directory delle analisi
+        backend: 'sqlite' o 'json'
+        logger: Logger opzionale
+
+    Returns:
+        SQLiteCatalog o JsonCatalog
+    """
+    if backend == 'sqlite':
+        return SQLiteCatalog(results_dir, logger=logger)
+    if backend == 'json':
+        return JsonCatalog(results_dir, logger=logger)
+    raise ValueError(f"Backend storage non supportato: {backend}")
+
+
+class JsonCatalog:
+    """Catalogo su index.json (riscritto per intero a ogni modifica)"""
+
+    def __init__(self, results_dir, logger=None):
+        """
+        Inizializza catalogo
+
+        Args:
+            results_dir: Directory delle analisi
+            logger: Logger opzionale
+        """
+        self.index_file = Path(results_dir) / 'index.json'
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+    def add(self, entry):
+        """Aggiunge o sostituisce una voce"""
+        index = [a for a in self._load_index() if a['id'] != entry['id']]
+        index.append(entry)
+        self._save_index(index)
+
+    def remove(self, analysis_id):
+        """Rimuove una voce"""
+        index = [a for a in self._load_index() if a['id'] != analysis_id]
+        self._save_index(index)
+
+    def get(self, analysis_id):
+        """Voce di un'analisi o None"""
+        return next((a for a in self.list() if a['id'] == analysis_id), None)
+
+    def list(self, brand_name=None, limit=None):
+        """Voci ordinate per data (più recenti prima), filtrate per brand"""
+        index = self._load_index()
+
+        # Voci salvate prima dei riepiloghi e della retention
+        for entry in index:
+            entry.setdefault('summary', {})
+            entry.setdefault('socials', {})
+            entry.setdefault('tier', 'full')
+
+        if brand_name:
+            index = [a for a in index if a.get('brand_name', '').lower() == brand_name.lower()]
+
+        index.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+
+        if limit:
+            index = index[:limit]
+
+        return index
+
+    def _load_index(self):
+        """Carica indice analisi"""
+        if not self.index_file.exists():
+            return []
+
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        """Salva indice analisi"""
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+
+
+class SQLiteCatalog:
+    """
+    Catalogo SQLite (WAL) con indici su brand e timestamp
+
+    Scritture transazionali e lettori concorrenti (più sessioni dashboard);
+    le liste sono query indicizzate, non letture dell'intero indice. Ogni
+    voce porta il riepilogo dell'analisi (colonne di 'analyses') e una riga
+    per social ('analysis_socials'): storico, export e trend non aprono i
+    file di analisi. Alla prima apertura importa i file esistenti.
+    """
+
+    # Limite parametri SQLite per query IN (...)
+    _CHUNK_SIZE = 500
+
+    def __init__(self, results_dir, db_path=None, logger=None):
+        """
+        Inizializza catalogo
+
+        Args:
+            results_dir: Directory delle analisi
+            db_path: Path database (default results_dir/CATALOG_DB_NAME)
+            logger: Logger opzionale
+        """
+        self.results_dir = Path(results_dir)
+        self.db_path = Path(db_path) if db_path else self.results_dir / CATALOG_DB_NAME
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id TEXT PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    brand_name TEXT NOT NULL,
+                    brand_key TEXT NOT NULL,
+                    social_urls TEXT NOT NULL,
+                    ai_enabled INTEGER NOT NULL
+                )
+            """)
+            existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+            for column, column_type in SUMMARY_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE analyses ADD COLUMN {column} {column_type}")
+            if 'tier' not in existing:
+                # Livello retention: 'full', 'compacted' o 'archived'
+                self._conn.execute("ALTER TABLE analyses ADD COLUMN tier TEXT NOT NULL DEFAULT 'full'")
+
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS analysis_socials (
+                    analysis_id TEXT NOT NULL,
+                    social TEXT NOT NULL,
+                    url TEXT,
+                    {', '.join(f"{c} {t}" for c, t in SUMMARY_COLUMNS.items())},
+                    PRIMARY KEY (analysis_id, social)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analyses_brand ON analyses (brand_key, timestamp)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analyses_timestamp ON analyses (timestamp)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+        self._migrate()
+
+    def add(self, entry):
+        """Aggiunge o sostituisce una voce con le righe per social (transazione)"""
+        with self._lock, self._conn:
+            self._write([entry])
+
+    def remove(self, analysis_id):
+        """Rimuove una voce"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM analysis_socials WHERE analysis_id = ?", (analysis_id,))
+            self._conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+
+    def get(self, analysis_id):
+        """Voce di un'analisi (senza righe per social) o None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def list(self, brand_name=None, limit=None):
+        """Voci ordinate per data (più recenti prima), filtrate per brand"""
+        query = "SELECT * FROM analyses"
+        params = []
+
+        if brand_name:
+            query += " WHERE brand_key = ?"
+            params.append(brand_name.lower())
+
+        query += " ORDER BY timestamp DESC"
+
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            entries = [self._entry(row) for row in rows]
+
+            by_id = {entry['id']: entry for entry in entries}
+            ids = list(by_id)
+            for i in range(0, len(ids), self._CHUNK_SIZE):
+                chunk = ids[i:i + self._CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(
+                    f"SELECT * FROM analysis_socials WHERE analysis_id IN ({placeholders})", chunk
+                ):
+                    by_id[row['analysis_id']]['socials'][row['social']] = {
+                        'url': row['url'],
+                        **{column: row[column] for column in SUMMARY_COLUMNS}
+                    }
+
+        return entries
+
+    def close(self):
+        """Chiude connessione database"""
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, entries):
+        """Upsert voci e righe per social (dentro una transazione)"""
+        columns = ['id', 'timestamp', 'brand_name', 'brand_key', 'social_urls', 'ai_enabled',
+                   'tier', *SUMMARY_COLUMNS]
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO analyses ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [self._row(entry) for entry in entries]
+        )
+
+        social_columns = ['analysis_id', 'social', 'url', *SUMMARY_COLUMNS]
+        for entry in entries:
+            self._conn.execute("DELETE FROM analysis_socials WHERE analysis_id = ?", (entry['id'],))
+            self._conn.executemany(
+                f"INSERT INTO analysis_socials ({', '.join(social_columns)}) "
+                f"VALUES ({', '.join('?' * len(social_columns))})",
+                [
+                    (entry['id'], social, data.get('url'), *(data.get(c) for c in SUMMARY_COLUMNS))
+                    for social, data in entry.get('socials', {}).items()
+                ]
+            )
+
+    def _migrate(self):
+        """
+        Import una tantum dei file di analisi (index.json legacy incluso)
+
+        Ogni file esistente è letto una volta per ricavarne voce e
+        riepilogo; le aperture successive non toccano i file.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM catalog_meta WHERE key = 'schema_version'"
+            ).fetchone()
+        if row and int(row['value']) >= SCHEMA_VERSION:
+            return
+
+        # Le voci di index.json hanno sempre il loro file: basta la scansione,
+        # che copre anche i file orfani (indice perso o scrittura interrotta)
+        entries = []
+        for filepath in self.results_dir.iterdir():
+            if filepath.name.startswith('.') or filepath.name == 'index.json':
+                continue
+            try:
+                if is_sectioned(filepath):
+                    # Bastano meta, metriche e AI: post e commenti non letti
+                    data = load_sections(filepath, ['social', 'ai']).to_dict()
+                elif filepath.is_file() and file_codec.strip_extension(filepath.name):
+                    data = file_codec.read_file(filepath)
+                else:
+                    continue
+                entries.append(catalog_entry(data))
+            except (OSError, ValueError, KeyError, RuntimeError) as e:
+                self.logger.warning(f"File analisi non importato {filepath.name}: {e}")
+
+        with self._lock, self._conn:
+            self._write(entries)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),)
+            )
+
+        if entries:
+            self.logger.info(f"✓ Catalogo SQLite: importate {len(entries)} analisi")
+
+    @staticmethod
+    def _row(entry):
+        """Voce -> riga tabella"""
+        summary = entry.get('summary', {})
+        return (
+            entry['id'],
+            entry['timestamp'],
+            entry['brand_name'],
+            entry['brand_name'].lower(),
+            json.dumps(entry.get('social_urls', {}), ensure_ascii=False),
+            int(bool(entry.get('ai_enabled'))),
+            entry.get('tier', 'full'),
+            *(summary.get(column) for column in SUMMARY_COLUMNS)
+        )
+
+    @staticmethod
+    def _entry(row):
+        """Riga tabella -> voce (formato di index.json + riepilogo)"""
+        return {
+            'id': row['id'],
+            'timestamp': row['timestamp'],
+            'brand_name': row['brand_name'],
+            'social_urls': json.loads(row['social_urls']),
+            'ai_enabled': bool(row['ai_enabled']),
+            'summary': {column: row[column] for column in SUMMARY_COLUMNS},
+            'socials': {},
+            'tier': row['tier']
+        }
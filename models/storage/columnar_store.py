@@ -0,0 +1,325 @@
+"""
+Dataset colonnare (Parquet) di post e commenti di tutte le analisi
+
+    columnar/posts/brand=<brand>/social=<social>/month=<YYYY-MM>/part-<id>.parquet
+    columnar/comments/brand=<brand>/social=<social>/month=<YYYY-MM>/part-<id>.parquet
+
+Un file per analisi e partizione (mese dell'analisi): aggiungere o
+rimuovere un'analisi non riscrive mai gli altri file. Le query leggono
+solo le partizioni e le colonne richieste (projection e predicate
+pushdown di pyarrow).
+"""
+import os
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import quote
+from config import COLUMNAR_DIR, calculate_engagement_rate
+from models.analyzers.local_sentiment import LocalSentimentEngine
+from utils.logger import Logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Dipendenza opzionale: dataset colonnare disattivato
+    pa = None
+
+
+# Dataset disponibili e colonna di testo per la ricerca
+DATASETS = {
+    'posts': 'caption',
+    'comments': 'text'
+}
+
+if pa is not None:
+    # Chiavi di partizione (dal path, non salvate nei file)
+    PARTITION_SCHEMA = pa.schema([
+        ('brand', pa.string()),
+        ('social', pa.string()),
+        ('month', pa.string())
+    ])
+
+    POSTS_SCHEMA = pa.schema([
+        ('analysis_id', pa.string()),
+        ('analysis_ts', pa.timestamp('us')),
+        ('brand_name', pa.string()),
+        ('post_id', pa.string()),
+        ('url', pa.string()),
+        ('type', pa.string()),
+        ('caption', pa.string()),
+        ('published_at', pa.timestamp('us', tz='UTC')),
+        ('likes', pa.int64()),
+        ('comments_count', pa.int64()),
+        ('shares', pa.int64()),
+        ('views', pa.int64()),
+        ('engagement_rate', pa.float64()),
+        ('owner_username', pa.string()),
+        ('hashtags', pa.list_(pa.string()))
+    ])
+
+    COMMENTS_SCHEMA = pa.schema([
+        ('analysis_id', pa.string()),
+        ('analysis_ts', pa.timestamp('us')),
+        ('brand_name', pa.string()),
+        ('post_id', pa.string()),
+        ('post_url', pa.string()),
+        ('comment_id', pa.string()),
+        ('text', pa.string()),
+        ('author', pa.string()),
+        ('published_at', pa.timestamp('us', tz='UTC')),
+        ('likes', pa.int64()),
+        ('sentiment', pa.string())  # Label del motore locale (offline)
+    ])
+
+    SCHEMAS = {
+        'posts': POSTS_SCHEMA,
+        'comments': COMMENTS_SCHEMA
+    }
+
+
+def _int(value):
+    """Intero o None (contatori mancanti o non numerici)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _str(value):
+    """Stringa o None"""
+    return None if value is None else str(value)
+
+
+def _timestamp(value):
+    """Data ISO 8601 dello scraper in datetime UTC (None se non valida)"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class ColumnarStore:
+    """Dataset Parquet di post e commenti, partizionato brand/social/mese"""
+
+    def __init__(self, dataset_dir=None, logger=None):
+        """
+        Inizializza store
+
+        Args:
+            dataset_dir: Directory dataset (default da config)
+            logger: Logger opzionale
+        """
+        self.dataset_dir = dataset_dir or COLUMNAR_DIR
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+        self.sentiment_engine = LocalSentimentEngine()
+
+    @property
+    def available(self):
+        """True se pyarrow è installato"""
+        return pa is not None
+
+    def append_analysis(self, analysis_data):
+        """
+        Aggiunge (o sostituisce) post e commenti di un'analisi
+
+        Args:
+            analysis_data: Dict analisi completo (meta + 'results')
+
+        Returns:
+            Dict {'posts': righe, 'comments': righe}
+        """
+        if not self.available:
+            return {'posts': 0, 'comments': 0}
+
+        analysis_id = analysis_data['id']
+        analysis_ts = datetime.fromisoformat(analysis_data['timestamp'])
+        brand_name = analysis_data['brand_name']
+        partition = {
+            'brand': brand_name.lower(),
+            'month': analysis_ts.strftime('%Y-%m')
+        }
+        base = {
+            'analysis_id': analysis_id,
+            'analysis_ts': analysis_ts,
+            'brand_name': brand_name
+        }
+
+        # Sostituzione: i file di un salvataggio precedente sono rimossi
+        self.remove_analysis(analysis_id)
+
+        counts = {'posts': 0, 'comments': 0}
+        social_results = (analysis_data.get('results') or {}).get('social_results') or {}
+        for social, data in social_results.items():
+            posts = data.get('posts') or []
+            if not posts:
+                continue
+
+            post_rows = [self._post_row(base, post) for post in posts]
+            comment_rows = [
+                self._comment_row(base, post, comment)
+                for post in posts for comment in post.get('comments') or []
+            ]
+
+            for name, rows in (('posts', post_rows), ('comments', comment_rows)):
+                if rows:
+                    self._write_part(name, {**partition, 'social': social}, analysis_id, rows)
+                    counts[name] += len(rows)
+
+        self.logger.info(f"✓ Dataset colonnare: {counts['posts']} post, "
+                         f"{counts['comments']} commenti ({analysis_id})")
+        return counts
+
+    def remove_analysis(self, analysis_id):
+        """
+        Rimuove i file di un'analisi da tutte le partizioni
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            Numero file rimossi
+        """
+        removed = 0
+        for name in DATASETS:
+            root = self.dataset_dir / name
+            if not root.exists():
+                continue
+            for filepath in root.glob(f"*/*/*/part-{analysis_id}.parquet"):
+                filepath.unlink()
+                removed += 1
+                self._prune(filepath.parent, root)
+        return removed
+
+    def query(self, dataset='posts', columns=None, brand=None, social=None,
+              since=None, until=None, text=None, filters=None, output='pandas'):
+        """
+        Query sul dataset: legge solo partizioni e colonne necessarie
+
+        Args:
+            dataset: 'posts' o 'comments'
+            columns: Colonne da leggere (default tutte, partizioni incluse)
+            brand: Nome brand
+            social: Social o lista di social
+            since: Primo mese incluso ('YYYY-MM' o data ISO)
+            until: Ultimo mese incluso ('YYYY-MM' o data ISO)
+            text: Sottostringa (senza maiuscole) in caption/testo commento
+            filters: Filtri extra: pyarrow Expression o lista tuple
+                     (colonna, operatore, valore) come pyarrow.parquet
+            output: 'pandas' (DataFrame) o 'arrow' (pyarrow.Table)
+
+        Returns:
+            DataFrame o pyarrow.Table
+        """
+        if not self.available:
+            raise RuntimeError("Dataset colonnare non disponibile: installa 'pyarrow'")
+        if dataset not in DATASETS:
+            raise ValueError(f"Dataset non supportato: {dataset} (disponibili: {', '.join(DATASETS)})")
+
+        conditions = []
+        if brand:
+            conditions.append(ds.field('brand') == brand.lower())
+        if social:
+            socials = [social] if isinstance(social, str) else list(social)
+            conditions.append(ds.field('social').isin(socials))
+        if since:
+            conditions.append(ds.field('month') >= since[:7])
+        if until:
+            conditions.append(ds.field('month') <= until[:7])
+        if text:
+            conditions.append(pc.match_substring(ds.field(DATASETS[dataset]), text, ignore_case=True))
+        if filters is not None:
+            if not isinstance(filters, ds.Expression):
+                filters = pq.filters_to_expression(filters)
+            conditions.append(filters)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        table = self._dataset(dataset).to_table(columns=columns, filter=expression)
+
+        if output == 'arrow':
+            return table
+        return table.to_pandas()
+
+    def _dataset(self, name):
+        """Dataset pyarrow (schema fisso: file vecchi e nuovi compatibili)"""
+        root = self.dataset_dir / name
+        root.mkdir(parents=True, exist_ok=True)
+
+        schema = pa.unify_schemas([SCHEMAS[name], PARTITION_SCHEMA])
+        return ds.dataset(
+            root,
+            schema=schema,
+            format='parquet',
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+        )
+
+    def _write_part(self, name, partition, analysis_id, rows):
+        """Scrive il file di un'analisi in una partizione (atomico)"""
+        directory = self.dataset_dir / name
+        for key in PARTITION_SCHEMA.names:
+            directory = directory / f"{key}={quote(partition[key], safe='')}"
+        directory.mkdir(parents=True, exist_ok=True)
+
+        table = pa.Table.from_pylist(rows, schema=SCHEMAS[name])
+        path = directory / f"part-{analysis_id}.parquet"
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{path.name}.", suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _post_row(self, base, post):
+        """Riga dataset posts"""
+        return {
+            **base,
+            'post_id': _str(post.get('id')),
+            'url': _str(post.get('url')),
+            'type': _str(post.get('type')),
+            'caption': _str(post.get('caption')),
+            'published_at': _timestamp(post.get('timestamp')),
+            'likes': _int(post.get('likes')),
+            'comments_count': _int(post.get('comments_count')),
+            'shares': _int(post.get('shares')),
+            'views': _int(post.get('views')),
+            'engagement_rate': calculate_engagement_rate(
+                _int(post.get('likes')) or 0,
+                _int(post.get('comments_count')) or 0,
+                _int(post.get('shares')) or 0,
+                _int(post.get('views')) or 0
+            ),
+            'owner_username': _str(post.get('owner_username')),
+            'hashtags': [str(tag) for tag in post.get('hashtags') or []]
+        }
+
+    def _comment_row(self, base, post, comment):
+        """Riga dataset comments"""
+        text = comment.get('text') or ''
+        return {
+            **base,
+            'post_id': _str(post.get('id')),
+            'post_url': _str(post.get('url')),
+            'comment_id': _str(comment.get('id')),
+            'text': text,
+            'author': _str(comment.get('author')),
+            'published_at': _timestamp(comment.get('timestamp')),
+            'likes': _int(comment.get('likes')),
+            'sentiment': self.sentiment_engine.score(text)[0]
+        }
+
+    @staticmethod
+    def _prune(directory, root):
+        """Rimuove le cartelle di partizione rimaste vuote"""
+        while directory != root and directory.exists() and not any(directory.iterdir()):
+            directory.rmdir()
+            directory = directory.parent
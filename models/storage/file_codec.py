@@ -0,0 +1,265 @@
+"""
+Codec file JSON: serializzazione veloce (orjson) + compressione (zstd/gzip)
+"""
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from config import STORAGE_CODEC
+
+try:
+    import orjson
+except ImportError:  # Dipendenza opzionale: fallback json standard
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # Dipendenza opzionale: fallback gzip
+    zstandard = None
+
+# Magic bytes dei formati compressi (lettura trasparente dei file esistenti)
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Estensione per compressione
+EXTENSIONS = {
+    'zstd': '.json.zst',
+    'gzip': '.json.gz',
+    None: '.json'
+}
+
+
+def dumps(obj, indent=False, sort_keys=False):
+    """
+    Serializza in bytes UTF-8
+
+    Args:
+        obj: Oggetto JSON-serializzabile
+        indent: Se True output indentato (file leggibili)
+        sort_keys: Se True chiavi ordinate (output canonico, es. per hash)
+
+    Returns:
+        bytes
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False,
+                      sort_keys=sort_keys).encode('utf-8')
+
+
+def loads(data):
+    """Deserializza bytes/str JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def resolve_compression(compression):
+    """Compressione effettiva: zstd senza 'zstandard' installato diventa gzip"""
+    if compression == 'zstd' and zstandard is None:
+        return 'gzip'
+    return compression or None
+
+
+def encode(obj, compression=STORAGE_CODEC['compression'],
+           level=STORAGE_CODEC['level'], indent=False):
+    """
+    Serializza e comprime
+
+    Args:
+        obj: Oggetto da codificare
+        compression: 'zstd', 'gzip' o None
+        level: Livello di compressione
+        indent: Output indentato (solo senza compressione ha senso)
+
+    Returns:
+        bytes
+    """
+    return compress(dumps(obj, indent=indent), compression, level)
+
+
+def compress(data, compression=STORAGE_CODEC['compression'], level=STORAGE_CODEC['level']):
+    """
+    Comprime bytes già serializzati
+
+    Args:
+        data: bytes JSON
+        compression: 'zstd', 'gzip' o None
+        level: Livello di compressione
+
+    Returns:
+        bytes
+    """
+    compression = resolve_compression(compression)
+
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=min(level, 9))
+    return data
+
+
+def decode(data):
+    """
+    Decomprime (formato riconosciuto dai magic bytes) e deserializza
+
+    Args:
+        data: bytes di un file codificato o JSON semplice
+
+    Returns:
+        Oggetto deserializzato
+    """
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("File compresso zstd: installa 'zstandard' per leggerlo")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    elif data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+
+    return loads(data)
+
+
+def write_file(path, obj, compression=STORAGE_CODEC['compression'],
+               level=STORAGE_CODEC['level'], indent=False, fsync=False):
+    """
+    Scrittura atomica: file temporaneo nella stessa cartella + rename
+
+    Un crash a metà scrittura non lascia mai un file troncato; con fsync
+    i dati sono su disco prima del rename (anche dopo un crash del sistema).
+
+    Args:
+        path: Path destinazione
+        obj: Oggetto da salvare
+        compression: 'zstd', 'gzip' o None
+        level: Livello di compressione
+        indent: Output indentato
+        fsync: Sincronizza il file su disco prima del rename
+
+    Returns:
+        Path scritto
+    """
+    return write_bytes(path, encode(obj, compression, level, indent), fsync)
+
+
+def write_bytes(path, data, fsync=False):
+    """
+    Scrittura atomica di bytes già codificati (vedi write_file)
+
+    Args:
+        path: Path destinazione
+        data: bytes
+        fsync: Sincronizza il file su disco prima del rename
+
+    Returns:
+        Path scritto
+    """
+    path = Path(path)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return path
+
+
+def fsync_dir(path):
+    """
+    Sincronizza una directory (rename e creazioni al suo interno restano dopo un crash)
+
+    Args:
+        path: Path directory
+    """
+    if os.name == 'nt':  # Windows: directory non apribili, rename già durevole
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_file(path):
+    """
+    Legge un file codificato (zstd, gzip o JSON semplice)
+
+    Args:
+        path: Path file
+
+    Returns:
+        Oggetto deserializzato
+    """
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+def decoded_size(path):
+    """
+    Byte JSON di un file una volta decompresso, senza decomprimerlo
+
+    Dall'header del frame zstd o dal trailer gzip (ISIZE, modulo 4 GiB);
+    per JSON semplice o frame senza dimensione la dimensione su disco.
+
+    Args:
+        path: Path file
+
+    Returns:
+        int
+    """
+    with open(path, 'rb') as f:
+        head = f.read(18)  # Header frame zstd: al massimo 18 byte
+        if head[:4] == ZSTD_MAGIC and zstandard is not None:
+            size = zstandard.frame_content_size(head)
+            if size >= 0:
+                return size
+        elif head[:2] == GZIP_MAGIC:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), 'little')
+    return os.path.getsize(path)
+
+
+def file_path(base_path, compression=STORAGE_CODEC['compression']):
+    """Path con estensione della compressione effettiva (base senza estensione)"""
+    base_path = Path(base_path)
+    return base_path.with_name(base_path.name + EXTENSIONS[resolve_compression(compression)])
+
+
+def find_file(base_path):
+    """
+    File esistente per un path base, qualunque sia la compressione
+
+    Args:
+        base_path: Path senza estensione (es. results/<id>)
+
+    Returns:
+        Path o None
+    """
+    base_path = Path(base_path)
+    for extension in EXTENSIONS.values():
+        candidate = base_path.with_name(base_path.name + extension)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def strip_extension(name):
+    """Nome file senza estensione codec (es. '<id>.json.zst' -> '<id>')"""
+    for extension in sorted(EXTENSIONS.values(), key=len, reverse=True):
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return None
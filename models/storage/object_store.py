@@ -0,0 +1,301 @@
+"""
+Object store content-addressed di post e commenti (deduplica tra analisi)
+
+Ogni post/commento è salvato una volta sola, indirizzato dal digest di
+(tipo, social, id, contenuto stabile). I file delle analisi tengono solo
+il riferimento più le metriche del momento (likes, views, ...): le
+ri-analisi quotidiane dello stesso brand non duplicano testi e caption.
+"""
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from config import OBJECT_STORE_DB_NAME, MUTABLE_FIELDS
+from models.storage import file_codec
+from utils.logger import Logger
+
+
+# Chiave riferimento nelle voci dei file di sezione
+REF_KEY = '$ref'
+
+# ID non validi: oggetto salvato inline (nessuna deduplica possibile)
+INVALID_IDS = (None, '', 'N/A')
+
+
+class ObjectStore:
+    """
+    Oggetti immutabili su SQLite + riferimenti per analisi
+
+    Un oggetto senza più riferimenti (analisi eliminate o aggiornate)
+    viene rimosso subito.
+    """
+
+    # Parametri per query IN (limite variabili SQLite)
+    _CHUNK_SIZE = 500
+
+    def __init__(self, results_dir, db_path=None, logger=None):
+        """
+        Inizializza object store
+
+        Args:
+            results_dir: Directory delle analisi
+            db_path: Path database (default results_dir/OBJECT_STORE_DB_NAME)
+            logger: Logger opzionale
+        """
+        self.db_path = Path(db_path) if db_path else Path(results_dir) / OBJECT_STORE_DB_NAME
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS objects (
+                    digest TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    social TEXT NOT NULL,
+                    object_id TEXT NOT NULL,
+                    data BLOB NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS object_refs (
+                    analysis_id TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (analysis_id, digest)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_objects_key ON objects (kind, social, object_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_object_refs_digest ON object_refs (digest)"
+            )
+
+    @staticmethod
+    def split(kind, item):
+        """
+        Separa contenuto stabile e metriche del momento
+
+        Args:
+            kind: 'post' o 'comment'
+            item: Dict post (senza commenti) o commento
+
+        Returns:
+            Tuple (contenuto, metriche)
+        """
+        mutable = MUTABLE_FIELDS[kind]
+        content = {k: v for k, v in item.items() if k not in mutable}
+        metrics = {k: v for k, v in item.items() if k in mutable}
+        return content, metrics
+
+    @staticmethod
+    def digest(kind, social, object_id, data):
+        """Digest SHA-256 (128 bit) di tipo, social, id e contenuto serializzato"""
+        h = hashlib.sha256(f"{kind}\0{social}\0{object_id}\0".encode('utf-8'))
+        h.update(data)
+        return h.hexdigest()[:32]
+
+    def dedup(self, analysis_id, files, sizes=None):
+        """
+        Sostituisce post e commenti dei file di sezione con riferimenti
+
+        Gli oggetti nuovi e i riferimenti dell'analisi sono salvati subito
+        (prima dei file); quelli non più usati si rimuovono con retain()
+        solo dopo che i nuovi file sono al loro posto.
+
+        Args:
+            analysis_id: ID analisi
+            files: Dict {nome file: contenuto} di split_sections
+            sizes: Dict opzionale {nome file: byte} a cui sommare il contenuto
+                   spostato negli oggetti (dimensione dei dati risolti)
+
+        Returns:
+            Tuple (file con riferimenti, set digest usati)
+        """
+        pending = {}
+        sizes = {} if sizes is None else sizes
+
+        def _entry(kind, social, item, name):
+            object_id = item.get('id')
+            if object_id in INVALID_IDS:
+                return item
+
+            content, metrics = self.split(kind, item)
+            data = file_codec.dumps(content, sort_keys=True)
+            digest = self.digest(kind, social, object_id, data)
+            pending[digest] = (kind, social, str(object_id), data)
+            sizes[name] = sizes.get(name, 0) + len(data)
+            return {REF_KEY: digest, **metrics}
+
+        deduped = {}
+        for name, content in files.items():
+            section, _, social = name.partition('.')
+            if section == 'posts':
+                content = [_entry('post', social, post, name) for post in content]
+            elif section == 'comments':
+                content = [
+                    None if comments is None else [_entry('comment', social, c, name) for c in comments]
+                    for comments in content
+                ]
+            deduped[name] = content
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO objects (digest, kind, social, object_id, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(digest, *values) for digest, values in pending.items()]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO object_refs (analysis_id, digest) VALUES (?, ?)",
+                [(analysis_id, digest) for digest in pending]
+            )
+
+        return deduped, set(pending)
+
+    def retain(self, analysis_id, digests):
+        """
+        Tiene solo i riferimenti indicati per un'analisi (orfani rimossi)
+
+        Args:
+            analysis_id: ID analisi
+            digests: Digest ancora usati dai file dell'analisi
+
+        Returns:
+            Numero oggetti rimossi
+        """
+        with self._lock, self._conn:
+            stale = [
+                row['digest'] for row in self._conn.execute(
+                    "SELECT digest FROM object_refs WHERE analysis_id = ?", (analysis_id,)
+                )
+                if row['digest'] not in digests
+            ]
+            return self._drop_refs(analysis_id, stale)
+
+    def release(self, analysis_id):
+        """
+        Rimuove tutti i riferimenti di un'analisi eliminata
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            Numero oggetti rimossi
+        """
+        return self.retain(analysis_id, set())
+
+    def resolve(self, entries):
+        """
+        Ricostruisce post o commenti completi da una sezione con riferimenti
+
+        Args:
+            entries: Lista post o lista di liste commenti (None ammessi)
+
+        Returns:
+            Stessa struttura con gli oggetti completi
+        """
+        digests = set()
+        for entry in entries:
+            for item in (entry if isinstance(entry, list) else [entry]):
+                if isinstance(item, dict) and REF_KEY in item:
+                    digests.add(item[REF_KEY])
+
+        if not digests:
+            return entries
+
+        objects = self.get_many(digests)
+
+        def _resolve(item):
+            if not isinstance(item, dict) or REF_KEY not in item:
+                return item
+            metrics = {k: v for k, v in item.items() if k != REF_KEY}
+            return {**objects[item[REF_KEY]], **metrics}
+
+        return [
+            [_resolve(item) for item in entry] if isinstance(entry, list) else _resolve(entry)
+            for entry in entries
+        ]
+
+    def get_many(self, digests):
+        """
+        Oggetti per digest
+
+        Args:
+            digests: Iterabile digest
+
+        Returns:
+            Dict {digest: oggetto}
+        """
+        digests = list(dict.fromkeys(digests))
+        objects = {}
+
+        with self._lock:
+            for i in range(0, len(digests), self._CHUNK_SIZE):
+                chunk = digests[i:i + self._CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(
+                    f"SELECT digest, data FROM objects WHERE digest IN ({placeholders})", chunk
+                ):
+                    objects[row['digest']] = file_codec.loads(row['data'])
+
+        missing = len(digests) - len(objects)
+        if missing:
+            raise KeyError(f"{missing} oggetti mancanti nell'object store")
+        return objects
+
+    def stats(self):
+        """
+        Statistiche deduplica
+
+        Returns:
+            Dict con oggetti unici, riferimenti, byte salvati e rapporto dedup
+            (riferimenti / oggetti: 1.0 = nessuna duplicazione evitata)
+        """
+        with self._lock:
+            objects, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM objects"
+            ).fetchone()
+            references, logical = self._conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(LENGTH(o.data)), 0)
+                FROM object_refs r JOIN objects o ON o.digest = r.digest
+            """).fetchone()
+
+        return {
+            'objects': objects,
+            'references': references,
+            'bytes_stored': stored,
+            'bytes_referenced': logical,
+            'dedup_ratio': round(references / objects, 2) if objects else 1.0,
+            'bytes_saved': logical - stored
+        }
+
+    def vacuum(self):
+        """Restituisce al disco lo spazio degli oggetti rimossi (checkpoint WAL + VACUUM)"""
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.execute('VACUUM')
+
+    def close(self):
+        """Chiude connessione database"""
+        with self._lock:
+            self._conn.close()
+
+    def _drop_refs(self, analysis_id, digests):
+        """Rimuove riferimenti e oggetti rimasti senza riferimenti"""
+        removed = 0
+        for i in range(0, len(digests), self._CHUNK_SIZE):
+            chunk = digests[i:i + self._CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            self._conn.execute(
+                f"DELETE FROM object_refs WHERE analysis_id = ? AND digest IN ({placeholders})",
+                [analysis_id, *chunk]
+            )
+            removed += self._conn.execute(f"""
+                DELETE FROM objects WHERE digest IN ({placeholders})
+                AND NOT EXISTS (SELECT 1 FROM object_refs r WHERE r.digest = objects.digest)
+            """, chunk).rowcount
+        return removed
@@ -0,0 +1,276 @@
+"""
+Retention storage: compattazione e archiviazione per età e brand, pulizia export
+"""
+import io
+import os
+import tarfile
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+from config import (
+    STORAGE_DIR, RETENTION_POLICY, RETENTION_BRAND_POLICIES,
+    EXPORTS_RETENTION_DAYS, MAINTENANCE_LOCK_TTL
+)
+from utils.logger import Logger
+
+
+def bundle_path(archive_dir, brand_name, timestamp):
+    """
+    Bundle di archivio di un'analisi: un tar per brand e mese
+
+    Args:
+        archive_dir: Directory archivio
+        brand_name: Nome brand
+        timestamp: Timestamp ISO dell'analisi
+
+    Returns:
+        Path bundle (es. archive/nike/2026-01.tar)
+    """
+    return Path(archive_dir) / quote(brand_name.lower(), safe='') / f"{timestamp[:7]}.tar"
+
+
+def append_to_bundle(path, name, data):
+    """
+    Aggiunge un file a un bundle tar (creato se non esiste) e lo sincronizza su disco
+
+    I file delle analisi sono già compressi: il tar non ricomprime e
+    accetta aggiunte senza riscrivere il bundle.
+
+    Args:
+        path: Path bundle
+        name: Nome membro
+        data: bytes
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = time.time()
+
+    with tarfile.open(path, 'a') as tar:
+        tar.addfile(info, io.BytesIO(data))
+
+    # Il file originale viene eliminato subito dopo: prima i dati su disco
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def read_from_bundle(path, name):
+    """
+    Legge un membro di un bundle (l'ultima copia se aggiunto più volte)
+
+    Args:
+        path: Path bundle
+        name: Nome membro
+
+    Returns:
+        bytes o None se assente
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    with tarfile.open(path, 'r') as tar:
+        try:
+            member = tar.getmember(name)
+        except KeyError:
+            return None
+        return tar.extractfile(member).read()
+
+
+class MaintenanceLock:
+    """
+    Lock su file per una sola manutenzione alla volta (anche tra processi)
+
+    Un lock più vecchio di MAINTENANCE_LOCK_TTL (processo terminato senza
+    rilasciarlo) viene ignorato.
+    """
+
+    def __init__(self, path=None, ttl=MAINTENANCE_LOCK_TTL):
+        """
+        Inizializza lock
+
+        Args:
+            path: File di lock (default storage/.maintenance.lock)
+            ttl: Secondi oltre i quali un lock esistente è considerato abbandonato
+        """
+        self.path = Path(path) if path else STORAGE_DIR / '.maintenance.lock'
+        self.ttl = ttl
+        self._fd = None
+
+    def acquire(self):
+        """Acquisisce il lock (RuntimeError se già in uso)"""
+        try:
+            if time.time() - self.path.stat().st_mtime > self.ttl:
+                self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+        try:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise RuntimeError(f"Manutenzione già in corso (lock: {self.path})")
+        os.write(self._fd, f"{os.getpid()} {datetime.now().isoformat()}".encode('utf-8'))
+
+    def release(self):
+        """Rilascia il lock"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self.path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class RetentionEngine:
+    """
+    Applica le policy di retention alle analisi salvate
+
+    Ogni passaggio usa le scritture atomiche dello StorageManager: la
+    dashboard può restare aperta (una vista già aperta su un'analisi
+    compattata trova semplicemente i post vuoti). Le analisi con batch
+    OpenAI in attesa non vengono toccate.
+    """
+
+    def __init__(self, storage, policy=None, brand_policies=None,
+                 exports_days=EXPORTS_RETENTION_DAYS, lock=None, logger=None):
+        """
+        Inizializza engine
+
+        Args:
+            storage: StorageManager
+            policy: Policy di default {'raw_days', 'archive_days'} (default da config)
+            brand_policies: Override per brand {nome: policy parziale}
+            exports_days: Età massima dei file export (None = nessuna pulizia)
+            lock: MaintenanceLock (default .maintenance.lock nella radice dello storage)
+            logger: Logger opzionale
+        """
+        self.storage = storage
+        self.policy = {**RETENTION_POLICY, **(policy or {})}
+        self.brand_policies = {
+            brand.lower(): overrides
+            for brand, overrides in (RETENTION_BRAND_POLICIES if brand_policies is None
+                                     else brand_policies).items()
+        }
+        self.exports_days = exports_days
+        self.lock = lock or MaintenanceLock(storage.storage_root / '.maintenance.lock')
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+    def policy_for(self, brand_name):
+        """Policy effettiva di un brand (default + override)"""
+        return {**self.policy, **self.brand_policies.get(brand_name.lower(), {})}
+
+    def plan(self, now=None):
+        """
+        Azioni previste senza modificare nulla
+
+        Args:
+            now: Data di riferimento (default adesso)
+
+        Returns:
+            Dict {'compact': [...], 'archive': [...], 'skipped': [...], 'exports': [...]}
+        """
+        now = now or datetime.now()
+        plan = {'compact': [], 'archive': [], 'skipped': [], 'exports': []}
+
+        for entry in self.storage.list_analyses():
+            tier = entry.get('tier', 'full')
+            if tier == 'archived':
+                continue
+
+            policy = self.policy_for(entry['brand_name'])
+            age_days = (now - datetime.fromisoformat(entry['timestamp'])).days
+
+            if policy.get('archive_days') is not None and age_days >= policy['archive_days']:
+                action = 'archive'
+            elif policy.get('raw_days') is not None and age_days >= policy['raw_days'] and tier == 'full':
+                action = 'compact'
+            else:
+                continue
+
+            item = {
+                'analysis_id': entry['id'],
+                'brand_name': entry['brand_name'],
+                'age_days': age_days,
+                'tier': tier
+            }
+            if self._pending_batch(entry['id']):
+                plan['skipped'].append({**item, 'reason': 'batch in attesa'})
+            else:
+                plan[action].append(item)
+
+        if self.exports_days is not None:
+            cutoff = now.timestamp() - self.exports_days * 86400
+            plan['exports'] = sorted(
+                path for path in self.storage.exports_dir.iterdir()
+                if path.is_file() and not path.name.startswith('.') and path.stat().st_mtime < cutoff
+            )
+
+        return plan
+
+    def run(self, dry_run=False, now=None):
+        """
+        Esegue la manutenzione (sotto lock)
+
+        Args:
+            dry_run: Se True calcola solo il piano
+            now: Data di riferimento (default adesso)
+
+        Returns:
+            Dict piano con 'dry_run' e, se eseguito, 'freed_bytes' ed errori
+        """
+        with self.lock:
+            plan = self.plan(now)
+            plan['dry_run'] = dry_run
+            if dry_run:
+                return plan
+
+            results_size = self._size(self.storage.results_dir)
+            exports_size = sum(path.stat().st_size for path in plan['exports'])
+            plan['errors'] = []
+
+            for action, method in (('compact', self.storage.compact_analysis),
+                                   ('archive', self.storage.archive_analysis)):
+                for item in plan[action]:
+                    try:
+                        method(item['analysis_id'])
+                    except (OSError, ValueError, KeyError, RuntimeError, tarfile.TarError) as e:
+                        self.logger.error(f"Retention {action} fallita per {item['analysis_id']}: {e}")
+                        plan['errors'].append({**item, 'action': action, 'error': str(e)})
+
+            for path in plan['exports']:
+                path.unlink(missing_ok=True)
+
+            if self.storage.objects and (plan['compact'] or plan['archive']):
+                self.storage.objects.vacuum()
+
+            plan['freed_bytes'] = max(0, results_size - self._size(self.storage.results_dir)) + exports_size
+
+        self.logger.info(
+            f"✓ Manutenzione: {len(plan['compact'])} compattate, {len(plan['archive'])} archiviate, "
+            f"{len(plan['exports'])} export eliminati, {plan['freed_bytes'] / 1024 / 1024:.1f} MB liberati"
+        )
+        return plan
+
+    def _pending_batch(self, analysis_id):
+        """True se l'analisi ha richieste AI deferred non ancora fuse"""
+        data = self.storage.load_analysis(analysis_id, sections=['ai'])
+        if not data:
+            return False
+        ai_analysis = data['results'].get('ai_analysis') or {}
+        return any(
+            analysis and analysis.get('deferred')
+            for social, analysis in ai_analysis.items() if social != 'aggregated'
+        )
+
+    @staticmethod
+    def _size(directory):
+        """Byte occupati da una directory"""
+        return sum(path.stat().st_size for path in Path(directory).rglob('*') if path.is_file())
@@ -0,0 +1,427 @@
+"""
+Analisi salvate a sezioni: una cartella per analisi, un file per sezione
+
+    results/<id>/summary.json.zst           meta + aggregati (sempre piccolo)
+    results/<id>/social.json.zst            metriche per social (senza post)
+    results/<id>/ai.json.zst                analisi AI
+    results/<id>/posts.<social>.json.zst    post grezzi (senza commenti)
+    results/<id>/comments.<social>.json.zst commenti grezzi, allineati ai post
+
+Un report che mostra solo KPI o un social legge solo quei file.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+from models.storage import file_codec
+
+
+# Sezioni disponibili (ordine = dal più leggero al più pesante)
+SECTIONS = ('summary', 'social', 'ai', 'posts', 'comments')
+
+# Chiave interna di summary con l'elenco dei file presenti
+MANIFEST_KEY = '_sections'
+
+
+class LazyMapping(Mapping):
+    """
+    Mapping di sola lettura con valori caricati al primo accesso
+
+    Le chiavi sono note subito (nessun I/O); ogni valore è letto una
+    volta sola e poi tenuto in memoria.
+    """
+
+    def __init__(self, values=None, loaders=None):
+        """
+        Inizializza mapping
+
+        Args:
+            values: Dict valori già disponibili
+            loaders: Dict {chiave: callable senza argomenti}
+        """
+        self._values = dict(values or {})
+        self._loaders = dict(loaders or {})
+        self._keys = list(self._values) + [k for k in self._loaders if k not in self._values]
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            loader = self._loaders[key]
+            self._values[key] = loader()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._values or key in self._loaders
+
+    def is_loaded(self, key):
+        """True se il valore della chiave è già in memoria"""
+        return key in self._values
+
+    def to_dict(self):
+        """Copia dict completa (carica tutte le sezioni mancanti)"""
+        return {key: _materialize(self[key]) for key in self._keys}
+
+    def __repr__(self):
+        loaded = [k for k in self._keys if k in self._values]
+        return f"{self.__class__.__name__}(keys={self._keys}, loaded={loaded})"
+
+
+def _materialize(value):
+    """Converte ricorsivamente i LazyMapping in dict"""
+    if isinstance(value, LazyMapping):
+        return value.to_dict()
+    return value
+
+
+def split_sections(analysis_data):
+    """
+    Divide i dati completi di un'analisi nelle sezioni da salvare
+
+    Args:
+        analysis_data: Dict analisi (meta + 'results')
+
+    Returns:
+        Dict {nome file: contenuto} (es. 'summary', 'posts.instagram')
+    """
+    results = dict(analysis_data.get('results') or {})
+    social_results = results.pop('social_results', None)
+    has_ai = 'ai_analysis' in results
+    ai_analysis = results.pop('ai_analysis', None)
+
+    files = {}
+    manifest = {'social': social_results is not None, 'ai': has_ai, 'posts': [], 'comments': []}
+
+    if social_results is not None:
+        files['social'] = {
+            social: {k: v for k, v in data.items() if k != 'posts'}
+            for social, data in social_results.items()
+        }
+        for social, data in social_results.items():
+            if 'posts' not in data:
+                continue
+            posts = data['posts'] or []
+            files[f"posts.{social}"] = [
+                {k: v for k, v in post.items() if k != 'comments'} for post in posts
+            ]
+            manifest['posts'].append(social)
+
+            # None = post senza chiave 'comments' (ricostruzione fedele)
+            if any('comments' in post for post in posts):
+                files[f"comments.{social}"] = [post.get('comments') if 'comments' in post else None
+                                               for post in posts]
+                manifest['comments'].append(social)
+
+    if has_ai:
+        files['ai'] = ai_analysis
+
+    summary = {k: v for k, v in analysis_data.items() if k != 'results'}
+    summary['results'] = results
+    summary[MANIFEST_KEY] = manifest
+    files['summary'] = summary
+
+    return files
+
+
+def write_sections(directory, analysis_data, objects=None, fsync=False):
+    """
+    Salva un'analisi a sezioni (sostituzione atomica della cartella)
+
+    I file sono scritti in una cartella temporanea accanto alla
+    destinazione e poi spostati con un rename: un lettore vede sempre
+    la versione precedente completa o quella nuova.
+
+    Args:
+        directory: Cartella analisi (results/<id>)
+        analysis_data: Dict analisi completo
+        objects: ObjectStore opzionale (post e commenti come riferimenti)
+        fsync: File e cartelle sincronizzati su disco (salvataggi in background)
+
+    Returns:
+        Path cartella
+    """
+    directory = Path(directory)
+    files = split_sections(analysis_data)
+    digests = None
+    sizes = {}
+    if objects is not None:
+        files, digests = objects.dedup(analysis_data['id'], files, sizes)
+
+    tmp_dir = Path(tempfile.mkdtemp(dir=directory.parent, prefix=f".{directory.name}.", suffix='.tmp'))
+
+    try:
+        # Summary per ultimo: il manifest porta i byte JSON di ogni sezione
+        # (stima memoria per la cache senza riserializzare alla lettura)
+        summary = files.pop('summary')
+        for name, content in files.items():
+            data = file_codec.dumps(content)
+            sizes[name] = sizes.get(name, 0) + len(data)
+            file_codec.write_bytes(file_codec.file_path(tmp_dir / name), file_codec.compress(data), fsync)
+        summary[MANIFEST_KEY]['sizes'] = sizes
+        file_codec.write_file(file_codec.file_path(tmp_dir / 'summary'), summary, fsync=fsync)
+        if fsync:
+            file_codec.fsync_dir(tmp_dir)
+
+        if directory.exists():
+            old_dir = directory.with_name(f".{directory.name}.old")
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(directory, old_dir)
+            os.replace(tmp_dir, directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, directory)
+        if fsync:
+            file_codec.fsync_dir(directory.parent)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Oggetti della versione precedente non più usati
+    if digests is not None:
+        objects.retain(analysis_data['id'], digests)
+
+    return directory
+
+
+def read_section(directory, name):
+    """
+    Legge un file di sezione
+
+    Args:
+        directory: Cartella analisi
+        name: Nome file (es. 'summary', 'posts.instagram')
+
+    Returns:
+        Contenuto o None se il file non esiste
+    """
+    filepath = file_codec.find_file(Path(directory) / name)
+    if not filepath:
+        return None
+    return file_codec.read_file(filepath)
+
+
+def normalize_sections(sections):
+    """
+    Sezioni richieste valide ('summary' sempre inclusa)
+
+    I commenti sono annidati nei post: chiederli implica i post.
+
+    Args:
+        sections: Iterabile nomi sezione o None (tutte)
+
+    Returns:
+        frozenset
+    """
+    if sections is None:
+        return frozenset(SECTIONS)
+
+    sections = set(sections)
+    unknown = sections - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Sezioni non valide: {', '.join(sorted(unknown))} "
+                         f"(disponibili: {', '.join(SECTIONS)})")
+
+    sections.add('summary')
+    if 'comments' in sections:
+        sections.add('posts')
+    return frozenset(sections)
+
+
+def load_sections(directory, sections=None, objects=None, cache=None, mutable=False):
+    """
+    Vista lazy di un'analisi a sezioni
+
+    Solo summary è letto subito; 'social_results' e 'ai_analysis' (e i
+    post/commenti di ogni social) sono letti al primo accesso. Le
+    sezioni non richieste non compaiono nella vista.
+
+    Args:
+        directory: Cartella analisi
+        sections: Sezioni richieste (None = tutte)
+        objects: ObjectStore per i post/commenti salvati come riferimenti
+        cache: AnalysisCache opzionale (valori condivisi: vista di sola lettura)
+        mutable: Con la cache, ogni sezione è restituita come copia
+                 modificabile (i valori in cache restano intatti)
+
+    Returns:
+        LazyMapping con la stessa forma del dict analisi completo
+    """
+    directory = Path(directory)
+    sections = normalize_sections(sections)
+
+    # Versione dell'analisi: ogni salvataggio riscrive tutti i file
+    version = file_codec.find_file(directory / 'summary').stat().st_mtime_ns
+    manifest = {}
+
+    def read(name, loader=None, files=None):
+        """Sezione dal file omonimo (o dal loader), passando dalla cache"""
+        loader = loader or (lambda: read_section(directory, name))
+        if cache is None:
+            return loader()
+        value = cache.get_or_load(
+            (directory.name, name, version), loader,
+            lambda value: _size(directory, manifest.get('sizes') or {}, files or [name])
+        )
+        return _thaw(name, value) if mutable else value
+
+    summary = dict(read('summary'))
+    manifest = summary.pop(MANIFEST_KEY, {})
+    results = summary.pop('results', {})
+
+    loaders = {}
+    if manifest.get('social') and sections & {'social', 'posts'}:
+        loaders['social_results'] = lambda: _social_results(directory, manifest, sections, objects, read)
+    if manifest.get('ai') and 'ai' in sections:
+        loaders['ai_analysis'] = lambda: read('ai')
+
+    return LazyMapping(summary, {'results': lambda: LazyMapping(results, loaders)})
+
+
+def _size(directory, sizes, names):
+    """
+    Stima in byte di un valore in cache: byte JSON dei file da cui deriva
+
+    Dal manifest (post e commenti con il contenuto degli oggetti
+    deduplicati); per le analisi salvate prima dall'header dei file.
+    """
+    total = 0
+    for name in names:
+        if name in sizes:
+            total += sizes[name]
+        else:
+            filepath = file_codec.find_file(directory / name)
+            total += file_codec.decoded_size(filepath) if filepath else 0
+    return total
+
+
+def _thaw(name, value):
+    """
+    Copia modificabile di un valore condiviso in cache
+
+    Post e commenti: liste e dict copiati a due livelli (i campi annidati
+    dei post non sono mai modificati); le altre sezioni, piccole, per
+    intero.
+    """
+    if name.startswith('posts.'):
+        return [
+            {**post, 'comments': [dict(c) if isinstance(c, dict) else c for c in post['comments']]}
+            if isinstance(post, dict) and isinstance(post.get('comments'), list)
+            else (dict(post) if isinstance(post, dict) else post)
+            for post in value
+        ]
+    return copy.deepcopy(value)
+
+
+def _social_results(directory, manifest, sections, objects, read):
+    """Mapping lazy {social: dati} (metriche + post/commenti su richiesta)"""
+    social_data = read('social') or {}
+    with_comments = 'comments' in sections
+
+    def _loader(social):
+        def _load():
+            data = dict(social_data[social]) if 'social' in sections else {}
+            if 'posts' in sections and social in manifest.get('posts', []):
+                files = [f"posts.{social}"]
+                if with_comments and social in manifest.get('comments', []):
+                    files.append(f"comments.{social}")
+                data['posts'] = read(
+                    f"posts.{social}" + ('+comments' if with_comments else ''),
+                    lambda: _posts(directory, social, manifest, with_comments, objects),
+                    files
+                )
+            return data
+        return _load
+
+    return LazyMapping(loaders={social: _loader(social) for social in social_data})
+
+
+def _posts(directory, social, manifest, with_comments, objects):
+    """Post di un social, con i commenti se richiesti"""
+    posts = _resolve(read_section(directory, f"posts.{social}") or [], objects)
+
+    if with_comments and social in manifest.get('comments', []):
+        comments = _resolve(read_section(directory, f"comments.{social}") or [], objects)
+        posts = [
+            {**post, 'comments': comments[i]}
+            if i < len(comments) and comments[i] is not None else post
+            for i, post in enumerate(posts)
+        ]
+
+    return posts
+
+
+def _resolve(entries, objects):
+    """Voci complete (riferimenti all'object store risolti se presenti)"""
+    if objects is None:
+        return entries
+    return objects.resolve(entries)
+
+
+def select_sections(analysis_data, sections=None):
+    """
+    Restringe un'analisi già in memoria alle sezioni richieste
+
+    Per i file legacy (un solo file): stessa forma di load_sections.
+
+    Args:
+        analysis_data: Dict analisi completo
+        sections: Sezioni richieste (None = tutte)
+
+    Returns:
+        Dict analisi
+    """
+    sections = normalize_sections(sections)
+    if sections == frozenset(SECTIONS):
+        return analysis_data
+
+    results = dict(analysis_data.get('results') or {})
+    if 'ai' not in sections:
+        results.pop('ai_analysis', None)
+
+    social_results = results.pop('social_results', None)
+    if social_results is not None and sections & {'social', 'posts'}:
+        selected = {}
+        for social, data in social_results.items():
+            data = dict(data) if 'social' in sections else {k: v for k, v in data.items() if k == 'posts'}
+            if 'posts' not in sections:
+                data.pop('posts', None)
+            elif 'comments' not in sections and 'posts' in data:
+                data['posts'] = [{k: v for k, v in post.items() if k != 'comments'}
+                                 for post in data['posts'] or []]
+            selected[social] = data
+        results['social_results'] = selected
+
+    return {**analysis_data, 'results': results}
+
+
+def recover(directory):
+    """
+    Ripristina una cartella rimasta a metà sostituzione (crash tra i rename)
+
+    Args:
+        directory: Cartella analisi
+
+    Returns:
+        bool: True se la cartella esiste (eventualmente ripristinata)
+    """
+    directory = Path(directory)
+    if directory.exists():
+        return True
+
+    old_dir = directory.with_name(f".{directory.name}.old")
+    if old_dir.is_dir():
+        os.replace(old_dir, directory)
+        return True
+    return False
+
+
+def is_sectioned(path):
+    """True se path è la cartella di un'analisi a sezioni"""
+    path = Path(path)
+    return path.is_dir() and file_codec.find_file(path / 'summary') is not None
@@ -0,0 +1,153 @@
+"""
+Cache persistente (SQLite) del sentiment per singolo commento
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from config import SENTIMENT_CACHE_PATH, OPENAI_MODEL, SENTIMENT_PROMPT_VERSION
+from utils.logger import Logger
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+class SentimentCache:
+    """
+    Cache sentiment chiave = hash(testo normalizzato + modello + versione prompt)
+
+    Riutilizza le label tra post, brand e run successive; cambiare modello
+    o versione del prompt invalida automaticamente le chiavi.
+    """
+
+    # Limite parametri SQLite per query IN (...)
+    _CHUNK_SIZE = 500
+
+    def __init__(self, db_path=None, model=OPENAI_MODEL,
+                 prompt_version=SENTIMENT_PROMPT_VERSION, logger=None):
+        """
+        Inizializza cache
+
+        Args:
+            db_path: Path database SQLite (default da config)
+            model: Modello OpenAI che produce le label
+            prompt_version: Versione prompt sentiment
+            logger: Logger opzionale
+        """
+        self.db_path = Path(db_path) if db_path else SENTIMENT_CACHE_PATH
+        self.model = model
+        self.prompt_version = prompt_version
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        # Statistiche cumulative del processo
+        self._stats = {'lookups': 0, 'hits': 0, 'stored': 0}
+
+    @staticmethod
+    def normalize_text(text):
+        """Normalizza testo: NFKC, minuscolo, spazi compressi"""
+        text = unicodedata.normalize('NFKC', text or '')
+        return WHITESPACE_PATTERN.sub(' ', text.lower()).strip()
+
+    def make_key(self, text):
+        """
+        Chiave cache per un commento
+
+        Args:
+            text: Testo commento
+
+        Returns:
+            Hash SHA-256 esadecimale
+        """
+        payload = f"{self.model}\x1f{self.prompt_version}\x1f{self.normalize_text(text)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Recupera label in cache
+
+        Args:
+            keys: Lista chiavi
+
+        Returns:
+            Dict {chiave: label} per le sole chiavi presenti
+        """
+        keys = list(keys)
+        found = {}
+
+        with self._lock:
+            for i in range(0, len(keys), self._CHUNK_SIZE):
+                chunk = keys[i:i + self._CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, label FROM sentiment_cache WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                found.update(rows)
+
+            self._stats['lookups'] += len(keys)
+            self._stats['hits'] += len(found)
+
+        return found
+
+    def set_many(self, labels):
+        """
+        Salva label in cache
+
+        Args:
+            labels: Dict {chiave: label}
+        """
+        if not labels:
+            return
+
+        now = datetime.now().isoformat()
+        rows = [
+            (key, label, self.model, self.prompt_version, now)
+            for key, label in labels.items()
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentiment_cache "
+                "(key, label, model, prompt_version, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._stats['stored'] += len(rows)
+
+    def stats(self):
+        """
+        Statistiche cache (processo corrente + dimensione database)
+
+        Returns:
+            Dict con lookups, hits, hit_rate, stored, entries
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0]
+            stats = dict(self._stats)
+
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'] * 100, 1) if stats['lookups'] else 0
+        stats['entries'] = entries
+        return stats
+
+    def close(self):
+        """Chiude connessione database"""
+        with self._lock:
+            self._conn.close()
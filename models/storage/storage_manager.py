@@ -1,43 +1,107 @@
 """
 Gestione storage e storico delle analisi
 """
-import json
+import copy
 import csv
+import shutil
 from datetime import datetime
 from pathlib import Path
 import uuid
-from config import RESULTS_DIR, EXPORTS_DIR, CSV_ENCODING
+from config import (
+    STORAGE_DIR, RESULTS_DIR, EXPORTS_DIR, ARCHIVE_DIR, COLUMNAR_DIR, CSV_ENCODING,
+    STORAGE_BACKEND, COLUMNAR_STORE_ENABLED, OBJECT_STORE_ENABLED, ANALYSIS_CACHE_MAX_BYTES,
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_JOURNAL_DIR
+)
+from models.storage import file_codec
+from models.storage.analysis_cache import analysis_cache
+from models.storage.catalog import create_catalog, catalog_entry
+from models.storage.columnar_store import ColumnarStore
+from models.storage.object_store import ObjectStore
+from models.storage.retention import bundle_path, append_to_bundle, read_from_bundle
+from models.storage.sections import (
+    write_sections, load_sections, select_sections, recover, is_sectioned
+)
+from models.storage.write_behind import get_queue
 from utils.logger import Logger
 
 
 class StorageManager:
     """Manager per salvataggio e caricamento analisi"""
 
-    def __init__(self, storage_dir=None, logger=None):
+    def __init__(self, storage_dir=None, logger=None, backend=STORAGE_BACKEND,
+                 columnar_dir=None, archive_dir=None, write_behind=WRITE_BEHIND_ENABLED,
+                 exports_dir=None):
         """
         Inizializza storage manager
 
+        Con storage_dir indicato export, archivio e dataset colonnare non
+        indicati stanno accanto ai risultati (<storage_dir>/../exports, ...):
+        la retention di uno storage di prova non tocca quello reale.
+
         Args:
-            storage_dir: Directory storage (default da config)
+            storage_dir: Directory risultati (default da config)
             logger: Logger opzionale
+            backend: Catalogo analisi 'sqlite' o 'json' (index.json)
+            columnar_dir: Directory dataset Parquet (default da config)
+            archive_dir: Directory bundle analisi archiviate (default da config)
+            write_behind: Salvataggi in background disponibili (save_analysis background=True)
+            exports_dir: Directory export (default da config)
         """
         self.results_dir = Path(storage_dir) if storage_dir else RESULTS_DIR
-        self.exports_dir = EXPORTS_DIR
+        self.storage_root = self.results_dir.parent if storage_dir else STORAGE_DIR
+
+        def _default(path, configured):
+            if path:
+                return Path(path)
+            return self.storage_root / configured.name if storage_dir else configured
+
+        self.exports_dir = _default(exports_dir, EXPORTS_DIR)
+        self.archive_dir = _default(archive_dir, ARCHIVE_DIR)
+        columnar_dir = _default(columnar_dir, COLUMNAR_DIR)
         self.logger = logger or Logger.get_logger(self.__class__.__name__)
 
         # Crea cartelle se non esistono
         self.results_dir.mkdir(parents=True, exist_ok=True)
         self.exports_dir.mkdir(parents=True, exist_ok=True)
 
-    def save_analysis(self, brand_name, social_urls, results, enable_ai=False):
+        # Catalogo (id, data, brand, social) per liste e filtri
+        self.catalog = create_catalog(self.results_dir, backend, logger=self.logger)
+
+        # Cache di processo delle sezioni lette dalle viste parziali
+        self.cache = analysis_cache if ANALYSIS_CACHE_MAX_BYTES else None
+
+        # Post e commenti deduplicati tra analisi (None = salvati inline)
+        self.objects = ObjectStore(self.results_dir, logger=self.logger) if OBJECT_STORE_ENABLED else None
+
+        # Dataset colonnare post/commenti (None se disattivato o senza pyarrow)
+        self.columnar = ColumnarStore(columnar_dir, logger=self.logger)
+        if not (COLUMNAR_STORE_ENABLED and self.columnar.available):
+            self.columnar = None
+
+        # Coda write-behind (riprende le analisi rimaste nel journal)
+        self.write_behind = None
+        if write_behind:
+            self.write_behind = get_queue(
+                self.results_dir / WRITE_BEHIND_JOURNAL_DIR,
+                lambda analysis_data: self._persist(analysis_data, fsync=True),
+                self._resume,
+                logger=self.logger
+            )
+
+    def save_analysis(self, brand_name, social_urls, results, enable_ai=False, background=False):
         """
         Salva analisi completa
 
+        Con background=True (e write-behind attivo) l'ID è restituito dopo
+        la sola scrittura del journal: sezioni, catalogo e dataset colonnare
+        sono aggiornati dal worker (vedi wait() e flush()).
+
         Args:
             brand_name: Nome brand
             social_urls: Dict URL social
             results: Risultati completi
             enable_ai: Se AI era abilitata
+            background: Salvataggio write-behind
 
         Returns:
             analysis_id: ID univoco analisi
@@ -53,41 +117,123 @@ class StorageManager:
             'results': results
         }
 
-        # Salva file JSON
-        filepath = self.results_dir / f"{analysis_id}.json"
+        if background and self.write_behind:
+            self.write_behind.submit(analysis_data)
+            self.logger.info(f"✓ Analisi in salvataggio: {analysis_id}")
+        else:
+            self._persist(analysis_data)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(analysis_data, f, indent=2, ensure_ascii=False)
+        return analysis_id
 
-        self.logger.info(f"✓ Analisi salvata: {filepath}")
+    def wait(self, analysis_id, timeout=None):
+        """
+        Attende la scrittura di un'analisi salvata in background
 
-        # Aggiorna indice
-        self._update_index(analysis_data)
+        Args:
+            analysis_id: ID analisi
+            timeout: Secondi massimi di attesa (None = senza limite)
 
-        return analysis_id
+        Returns:
+            bool: True se scritta (o salvata in modo sincrono)
+        """
+        if not self.write_behind:
+            return True
+        return self.write_behind.wait(analysis_id, timeout)
 
-    def load_analysis(self, analysis_id):
+    def flush(self, timeout=None):
+        """
+        Attende la scrittura di tutte le analisi salvate in background
+
+        Args:
+            timeout: Secondi massimi per ciascuna analisi (None = senza limite)
+
+        Returns:
+            bool: True se tutte scritte
+        """
+        if not self.write_behind:
+            return True
+        return self.write_behind.flush(timeout)
+
+    def load_analysis(self, analysis_id, sections=None):
         """
         Carica analisi da ID
 
         Args:
             analysis_id: ID analisi
+            sections: Sezioni da caricare ('summary', 'social', 'ai',
+                      'posts', 'comments'); None = analisi completa
 
         Returns:
-            Dict con dati analisi o None
+            Dict con dati analisi (vista lazy se sections è indicato) o None
         """
-        filepath = self.results_dir / f"{analysis_id}.json"
-
-        if not filepath.exists():
+        # Analisi non ancora scritta: le viste parziali arrivano dalla coda,
+        # il caricamento completo (copia modificabile) attende la scrittura
+        # (scrittura fallita: copia dei dati rimasti in memoria)
+        pending = self.write_behind.get(analysis_id) if self.write_behind else None
+        if pending is not None:
+            if sections is not None:
+                return select_sections(pending, sections)
+            if not self.write_behind.wait(analysis_id):
+                self.logger.warning(f"Analisi {analysis_id} non ancora salvata: copia in memoria")
+                return copy.deepcopy(pending)
+
+        path = self._locate(analysis_id)
+
+        if not path:
             self.logger.error(f"Analisi {analysis_id} non trovata")
             return None
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if path.is_dir():
+            # Vista lazy: i file delle sezioni sono letti al primo accesso.
+            # Le viste parziali (sola lettura) restituiscono i valori in
+            # cache; il caricamento completo (merge, update) ne riceve una
+            # copia modificabile
+            if sections is None:
+                data = load_sections(path, objects=self.objects, cache=self.cache, mutable=True).to_dict()
+            else:
+                data = load_sections(path, sections, self.objects, self.cache)
+        else:
+            # File legacy unico (JSON semplice, gzip o zstd): letto per intero
+            data = select_sections(file_codec.read_file(path), sections)
 
         self.logger.info(f"✓ Analisi caricata: {analysis_id}")
         return data
 
+    def update_analysis(self, analysis_id, results):
+        """
+        Sostituisce i risultati di un'analisi salvata (es. merge Batch API)
+
+        Args:
+            analysis_id: ID analisi
+            results: Risultati aggiornati
+
+        Returns:
+            bool: True se aggiornata
+        """
+        path = self._locate(analysis_id)
+
+        if not path:
+            self.logger.error(f"Analisi {analysis_id} non trovata")
+            return False
+
+        # Solo i metadati: i risultati sono sostituiti per intero
+        if path.is_dir():
+            analysis_data = load_sections(path, ['summary']).to_dict()
+        else:
+            analysis_data = file_codec.read_file(path)
+        analysis_data['results'] = results
+        analysis_data['updated_at'] = datetime.now().isoformat()
+
+        # Riscritta a sezioni (un file legacy viene convertito)
+        self._write(analysis_id, analysis_data)
+        if not path.is_dir():
+            path.unlink()
+
+        self.catalog.add(catalog_entry(analysis_data))
+
+        self.logger.info(f"✓ Analisi aggiornata: {analysis_id}")
+        return True
+
     def list_analyses(self, brand_name=None, limit=None):
         """
         Lista tutte le analisi salvate
@@ -99,44 +245,131 @@ class StorageManager:
         Returns:
             Lista analisi ordinate per data (più recenti prima)
         """
-        index = self._load_index()
+        return self.catalog.list(brand_name=brand_name, limit=limit)
+
+    def delete_analysis(self, analysis_id):
+        """
+        Elimina analisi
+
+        Args:
+            analysis_id: ID analisi
 
-        # Filtra per brand se specificato
-        if brand_name:
-            index = [a for a in index if a.get('brand_name', '').lower() == brand_name.lower()]
+        Returns:
+            bool: True se eliminata
+        """
+        path = self._locate(analysis_id)
 
-        # Ordina per timestamp (più recenti prima)
-        index.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        if path:
+            self._remove_files(analysis_id, path)
+        elif (self.catalog.get(analysis_id) or {}).get('tier') != 'archived':
+            # Un'analisi archiviata esiste solo nel catalogo (il bundle resta)
+            self.logger.error(f"Analisi {analysis_id} non trovata")
+            return False
 
-        # Limita se richiesto
-        if limit:
-            index = index[:limit]
+        # Aggiorna catalogo e dataset colonnare
+        self.catalog.remove(analysis_id)
+        if self.columnar:
+            self.columnar.remove_analysis(analysis_id)
 
-        return index
+        self.logger.info(f"✓ Analisi eliminata: {analysis_id}")
+        return True
 
-    def delete_analysis(self, analysis_id):
+    def compact_analysis(self, analysis_id):
         """
-        Elimina analisi
+        Compatta un'analisi: elimina post e commenti grezzi
+
+        Restano riepilogo, metriche per social (con sketch di quantili e
+        audience) e analisi AI: bastano a report, storico e trend.
 
         Args:
             analysis_id: ID analisi
 
         Returns:
-            bool: True se eliminata
+            bool: True se compattata
         """
-        filepath = self.results_dir / f"{analysis_id}.json"
+        path = self._locate(analysis_id)
 
-        if not filepath.exists():
+        if not path:
             self.logger.error(f"Analisi {analysis_id} non trovata")
             return False
 
-        # Elimina file
-        filepath.unlink()
+        analysis_data = self.load_analysis(analysis_id, sections=['social', 'ai'])
+        if path.is_dir():
+            analysis_data = analysis_data.to_dict()
+        analysis_data['retention'] = {'tier': 'compacted', 'compacted_at': datetime.now().isoformat()}
 
-        # Aggiorna indice
-        self._remove_from_index(analysis_id)
+        self._write(analysis_id, analysis_data)
+        if not path.is_dir():
+            path.unlink()
 
-        self.logger.info(f"✓ Analisi eliminata: {analysis_id}")
+        self.catalog.add(catalog_entry(analysis_data))
+
+        self.logger.info(f"✓ Analisi compattata: {analysis_id}")
+        return True
+
+    def archive_analysis(self, analysis_id):
+        """
+        Sposta un'analisi in un bundle tar dell'archivio (brand/mese)
+
+        La voce di catalogo resta (storico e trend invariati); i dati
+        tornano disponibili con restore_analysis().
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            Path bundle o None
+        """
+        path = self._locate(analysis_id)
+
+        if not path:
+            self.logger.error(f"Analisi {analysis_id} non trovata")
+            return None
+
+        analysis_data = self.load_analysis(analysis_id)
+        retention = analysis_data.get('retention') or {}
+        analysis_data['retention'] = {**retention, 'tier': 'archived', 'archived_at': datetime.now().isoformat()}
+
+        # Un solo file autosufficiente (riferimenti all'object store risolti)
+        bundle = bundle_path(self.archive_dir, analysis_data['brand_name'], analysis_data['timestamp'])
+        append_to_bundle(bundle, file_codec.file_path(analysis_id).name, file_codec.encode(analysis_data))
+
+        self._remove_files(analysis_id, path)
+        self.catalog.add(catalog_entry(analysis_data))
+
+        self.logger.info(f"✓ Analisi archiviata: {analysis_id} -> {bundle}")
+        return bundle
+
+    def restore_analysis(self, analysis_id):
+        """
+        Ripristina un'analisi archiviata in storage/results
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            bool: True se ripristinata
+        """
+        entry = self.catalog.get(analysis_id)
+        if not entry or entry.get('tier') != 'archived':
+            self.logger.error(f"Analisi {analysis_id} non archiviata")
+            return False
+
+        bundle = bundle_path(self.archive_dir, entry['brand_name'], entry['timestamp'])
+        data = read_from_bundle(bundle, file_codec.file_path(analysis_id).name)
+        if data is None:
+            self.logger.error(f"Analisi {analysis_id} non trovata in {bundle}")
+            return False
+
+        analysis_data = file_codec.decode(data)
+        retention = analysis_data.pop('retention', {})
+        if retention.get('compacted_at'):
+            analysis_data['retention'] = {'tier': 'compacted', 'compacted_at': retention['compacted_at']}
+
+        self._write(analysis_id, analysis_data)
+        self.catalog.add(catalog_entry(analysis_data))
+
+        self.logger.info(f"✓ Analisi ripristinata: {analysis_id}")
         return True
 
     def export_history_csv(self, output_filename=None):
@@ -154,7 +387,7 @@ class StorageManager:
 
         output_path = self.exports_dir / output_filename
 
-        # Carica tutte le analisi
+        # Solo catalogo: i riepiloghi sono salvati con l'analisi
         all_analyses = self.list_analyses()
 
         # Scrivi CSV
@@ -170,76 +403,214 @@ class StorageManager:
                 'Post Totali',
                 'Commenti Totali',
                 'Likes Totali',
+                'Views Totali',
                 'Engagement Rate',
+                'Sentiment Positivo',
+                'Sentiment Negativo',
                 'AI Abilitata'
             ])
 
             # Dati
             for analysis in all_analyses:
-                # Carica dati completi
-                full_data = self.load_analysis(analysis['id'])
-                if not full_data:
-                    continue
-
-                results = full_data.get('results', {})
-                agg_stats = results.get('aggregated_stats', {})
+                summary = analysis.get('summary', {})
+                positive = summary.get('positive_pct')
+                negative = summary.get('negative_pct')
 
                 writer.writerow([
                     analysis['id'],
                     analysis.get('timestamp', 'N/A'),
                     analysis.get('brand_name', 'N/A'),
                     ', '.join(analysis.get('social_urls', {}).keys()),
-                    agg_stats.get('total_posts', 0),
-                    agg_stats.get('total_comments', 0),
-                    agg_stats.get('total_likes', 0),
-                    f"{agg_stats.get('avg_engagement_rate', 0):.2f}%",
+                    summary.get('total_posts') or 0,
+                    summary.get('total_comments') or 0,
+                    summary.get('total_likes') or 0,
+                    summary.get('total_views') or 0,
+                    f"{summary.get('avg_engagement_rate') or 0:.2f}%",
+                    f"{positive:.1f}%" if positive is not None else 'N/A',
+                    f"{negative:.1f}%" if negative is not None else 'N/A',
                     'Sì' if analysis.get('ai_enabled') else 'No'
                 ])
 
         self.logger.info(f"✓ CSV esportato: {output_path}")
         return str(output_path)
 
-    def _generate_analysis_id(self):
-        """Genera ID univoco per analisi"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_id = str(uuid.uuid4())[:8]
-        return f"{timestamp}_{unique_id}"
+    def get_brand_trend(self, brand_name, limit=None):
+        """
+        Andamento di un brand nel tempo (solo catalogo)
 
-    def _update_index(self, analysis_data):
-        """Aggiorna indice analisi"""
-        index = self._load_index()
+        Args:
+            brand_name: Nome brand
+            limit: Ultime N analisi (opzionale)
 
-        # Aggiungi nuova analisi
-        index.append({
-            'id': analysis_data['id'],
-            'timestamp': analysis_data['timestamp'],
-            'brand_name': analysis_data['brand_name'],
-            'social_urls': analysis_data['social_urls'],
-            'ai_enabled': analysis_data['ai_enabled']
-        })
+        Returns:
+            Lista punti {id, timestamp, riepilogo, socials} in ordine cronologico
+        """
+        entries = self.catalog.list(brand_name=brand_name, limit=limit)
+        entries.reverse()
+
+        return [
+            {
+                'id': entry['id'],
+                'timestamp': entry['timestamp'],
+                **entry.get('summary', {}),
+                'socials': entry.get('socials', {})
+            }
+            for entry in entries
+        ]
+
+    def analysis_version(self, analysis_id):
+        """
+        Versione dei file di un'analisi (cambia a ogni riscrittura)
 
-        # Salva indice
-        self._save_index(index)
+        Args:
+            analysis_id: ID analisi
 
-    def _remove_from_index(self, analysis_id):
-        """Rimuovi analisi da indice"""
-        index = self._load_index()
-        index = [a for a in index if a['id'] != analysis_id]
-        self._save_index(index)
+        Returns:
+            mtime in ns del riepilogo (o del file legacy), None se non su disco
+        """
+        path = self._locate(analysis_id)
+        if not path:
+            return None
+        if path.is_dir():
+            path = file_codec.find_file(path / 'summary')
+        return path.stat().st_mtime_ns
 
-    def _load_index(self):
-        """Carica indice analisi"""
-        index_file = self.results_dir / 'index.json'
+    def cache_stats(self):
+        """
+        Statistiche cache sezioni (hit/miss, byte occupati)
 
-        if not index_file.exists():
-            return []
+        Returns:
+            Dict statistiche o None se disattivata
+        """
+        return self.cache.stats() if self.cache else None
+
+    def dedup_stats(self):
+        """
+        Statistiche deduplica post e commenti tra analisi
+
+        Returns:
+            Dict (oggetti, riferimenti, byte, dedup_ratio) o None se disattivata
+        """
+        return self.objects.stats() if self.objects else None
+
+    def query_dataset(self, dataset='posts', **filters):
+        """
+        Query storica su post o commenti di tutte le analisi (Parquet)
+
+        Args:
+            dataset: 'posts' o 'comments'
+            **filters: Filtri di ColumnarStore.query (brand, social, since,
+                       until, text, columns, filters, output)
+
+        Returns:
+            DataFrame o pyarrow.Table
+        """
+        if not self.columnar:
+            raise RuntimeError("Dataset colonnare non attivo (COLUMNAR_STORE_ENABLED, pyarrow)")
+        return self.columnar.query(dataset, **filters)
+
+    def rebuild_columnar(self):
+        """
+        Ricostruisce il dataset colonnare da tutte le analisi salvate
+
+        Returns:
+            Numero analisi importate
+        """
+        if not self.columnar:
+            raise RuntimeError("Dataset colonnare non attivo (COLUMNAR_STORE_ENABLED, pyarrow)")
 
-        with open(index_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        imported = 0
+        for entry in self.catalog.list():
+            data = self.load_analysis(entry['id'], sections=['posts', 'comments'])
+            if data and self._append_columnar(data):
+                imported += 1
 
-    def _save_index(self, index):
-        """Salva indice analisi"""
-        index_file = self.results_dir / 'index.json'
+        self.logger.info(f"✓ Dataset colonnare ricostruito: {imported} analisi")
+        return imported
 
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, indent=2, ensure_ascii=False)
+    def _append_columnar(self, analysis_data):
+        """Aggiunge un'analisi al dataset colonnare (un errore non blocca il salvataggio)"""
+        if not self.columnar:
+            return False
+        try:
+            self.columnar.append_analysis(analysis_data)
+            return True
+        except Exception as e:
+            self.logger.warning(f"Dataset colonnare non aggiornato ({analysis_data['id']}): {e}")
+            return False
+
+    def _persist(self, analysis_data, fsync=False):
+        """Scrive una nuova analisi: sezioni, catalogo e dataset colonnare"""
+        # Una cartella, un file per sezione (orjson + compressione, atomico)
+        directory = self._write(analysis_data['id'], analysis_data, fsync)
+
+        self.logger.info(f"✓ Analisi salvata: {directory}")
+
+        # Aggiorna catalogo
+        self.catalog.add(catalog_entry(analysis_data))
+
+        # Post e commenti nel dataset colonnare
+        self._append_columnar(analysis_data)
+
+    def _resume(self, record):
+        """
+        Chiude un salvataggio in background interrotto (record del journal)
+
+        Cartella già scritta: mancano al più catalogo e dataset colonnare.
+        Altrimenti i dati erano solo in memoria: restano da rimuovere
+        cartella temporanea, riferimenti agli oggetti e righe Parquet.
+
+        Returns:
+            bool: True se l'analisi è salva
+        """
+        analysis_id = record['id']
+        directory = self.results_dir / analysis_id
+
+        if recover(directory) and is_sectioned(directory):
+            analysis_data = load_sections(directory, objects=self.objects).to_dict()
+            self.catalog.add(catalog_entry(analysis_data))
+            self._append_columnar(analysis_data)
+            return True
+
+        for tmp_dir in self.results_dir.glob(f".{analysis_id}.*.tmp"):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if self.objects:
+            self.objects.release(analysis_id)
+        if self.columnar:
+            self.columnar.remove_analysis(analysis_id)
+        return False
+
+    def _write(self, analysis_id, analysis_data, fsync=False):
+        """Scrive l'analisi a sezioni e invalida le sue voci in cache"""
+        directory = write_sections(self.results_dir / analysis_id, analysis_data, self.objects, fsync)
+        if self.cache:
+            self.cache.invalidate(analysis_id)
+        return directory
+
+    def _remove_files(self, analysis_id, path):
+        """Elimina cartella sezioni o file legacy, riferimenti agli oggetti e cache"""
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+        if self.objects:
+            self.objects.release(analysis_id)
+        if self.cache:
+            self.cache.invalidate(analysis_id)
+
+    def _locate(self, analysis_id):
+        """Cartella a sezioni o file legacy di un'analisi (None se assente)"""
+        # Un salvataggio in background ancora in coda viene completato prima
+        if self.write_behind:
+            self.write_behind.wait(analysis_id)
+
+        directory = self.results_dir / analysis_id
+        if recover(directory) and is_sectioned(directory):
+            return directory
+        return file_codec.find_file(directory)
+
+    def _generate_analysis_id(self):
+        """Genera ID univoco per analisi"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_id = str(uuid.uuid4())[:8]
+        return f"{timestamp}_{unique_id}"
@@ -0,0 +1,324 @@
+"""
+Salvataggio write-behind delle analisi: ID restituito subito, scrittura in background
+
+    results/.journal/<id>.json   intento di salvataggio (id, brand, pid proprietario)
+
+L'analisi passa al worker in memoria; il journal (write-ahead) tiene solo
+un piccolo record, sincronizzato su disco prima di restituire l'ID. Il
+worker scrive l'analisi a sezioni (fsync + rename), aggiorna catalogo e
+dataset colonnare e solo allora rimuove il record. Un record rimasto da
+un processo terminato indica un salvataggio interrotto: alla riapertura
+viene completato (cartella già scritta) o ripulito (dati persi, segnalati
+nel log).
+
+Una scrittura fallita è ritentata con attesa crescente; se fallisce ancora
+l'analisi resta in memoria (viste e flush() la ritrovano) e wait()
+restituisce False.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from config import WRITE_BEHIND_RETRY
+from models.storage import file_codec
+from models.storage.retention import MaintenanceLock
+from utils.logger import Logger
+
+
+# Secondi dopo cui il lock di ripresa di un processo terminato è ignorato
+RECOVERY_LOCK_TTL = 600
+
+# Identità del processo nei record: un PID riusato (es. container
+# riavviato) non fa sembrare proprio il record di un processo terminato
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def _pid_alive(pid):
+    """True se il processo esiste ancora (il suo worker sta scrivendo)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+# Una coda per journal: le sessioni Streamlit con StorageManager diversi
+# sulla stessa cartella condividono worker e analisi in attesa
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(journal_dir, persist, resume, logger=None):
+    """
+    Coda write-behind di processo per una cartella journal
+
+    Alla prima richiesta la coda riprende i record rimasti nel journal.
+
+    Args:
+        journal_dir: Cartella journal
+        persist: Callable(analysis_data) che scrive l'analisi (sincrono)
+        resume: Callable(record) che completa o ripulisce un salvataggio
+                interrotto (True se l'analisi è salva)
+        logger: Logger opzionale
+
+    Returns:
+        WriteBehindQueue
+    """
+    journal_dir = Path(journal_dir).resolve()
+    with _queues_lock:
+        write_queue = _queues.get(journal_dir)
+        if write_queue is None:
+            write_queue = WriteBehindQueue(journal_dir, persist, resume, logger)
+            _queues[journal_dir] = write_queue
+            write_queue.recover()
+        return write_queue
+
+
+class WriteBehindQueue:
+    """
+    Coda di salvataggi eseguiti da un thread in background
+
+    Le analisi in attesa restano in memoria fino alla scrittura (anche
+    dopo un fallimento): vanno trattate in sola lettura.
+    """
+
+    def __init__(self, journal_dir, persist, resume, logger=None,
+                 retry_attempts=WRITE_BEHIND_RETRY['attempts'], retry_delay=WRITE_BEHIND_RETRY['delay']):
+        """
+        Inizializza coda
+
+        Args:
+            journal_dir: Cartella journal
+            persist: Callable(analysis_data) che scrive l'analisi (sincrono)
+            resume: Callable(record) per i salvataggi interrotti (vedi get_queue)
+            logger: Logger opzionale
+            retry_attempts: Tentativi di scrittura per analisi
+            retry_delay: Attesa (secondi) prima del secondo tentativo, poi raddoppiata
+        """
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.persist = persist
+        self.resume = resume
+        self.logger = logger or Logger.get_logger(self.__class__.__name__)
+        self.retry_attempts = max(1, retry_attempts)
+        self.retry_delay = retry_delay
+
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._done = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._worker = None
+
+        # A fine processo (CLI) le analisi in attesa sono scritte prima dell'uscita
+        atexit.register(self.flush)
+
+    def submit(self, analysis_data):
+        """
+        Accetta un'analisi da salvare: record nel journal, dati in coda (in memoria)
+
+        Args:
+            analysis_data: Dict analisi completo (con 'id')
+
+        Returns:
+            analysis_id
+        """
+        analysis_id = analysis_data['id']
+        record = {
+            'id': analysis_id,
+            'brand_name': analysis_data.get('brand_name'),
+            'timestamp': analysis_data.get('timestamp'),
+            'pid': os.getpid(),
+            'owner': _PROCESS_TOKEN,
+            'submitted_at': datetime.now().isoformat()
+        }
+        file_codec.write_file(self._journal_path(analysis_id), record, compression=None, fsync=True)
+        self._enqueue(analysis_data)
+        return analysis_id
+
+    def get(self, analysis_id):
+        """
+        Analisi in attesa di scrittura (o con scrittura fallita)
+
+        Args:
+            analysis_id: ID analisi
+
+        Returns:
+            Dict analisi (sola lettura) o None se non in memoria
+        """
+        with self._lock:
+            return self._pending.get(analysis_id)
+
+    def pending_ids(self):
+        """ID delle analisi non ancora scritte (in coda o fallite)"""
+        with self._lock:
+            return list(self._pending)
+
+    def failed_ids(self):
+        """ID delle analisi la cui scrittura è fallita (dati ancora in memoria)"""
+        with self._lock:
+            return list(self._failed)
+
+    def wait(self, analysis_id, timeout=None):
+        """
+        Attende la scrittura di un'analisi
+
+        Args:
+            analysis_id: ID analisi
+            timeout: Secondi massimi di attesa (None = senza limite)
+
+        Returns:
+            bool: True se scritta (o mai stata in coda), False se fallita
+            (vedi retry) o timeout
+        """
+        with self._lock:
+            done = self._done.get(analysis_id)
+        if done is not None and not done.wait(timeout):
+            return False
+        with self._lock:
+            return analysis_id not in self._failed
+
+    def flush(self, timeout=None):
+        """
+        Attende la scrittura di tutte le analisi in coda
+
+        Le analisi con scrittura fallita sono rimesse in coda prima.
+
+        Args:
+            timeout: Secondi massimi per ciascuna analisi (None = senza limite)
+
+        Returns:
+            bool: True se tutte scritte
+        """
+        self.retry()
+        return all([self.wait(analysis_id, timeout) for analysis_id in self.pending_ids()])
+
+    def retry(self):
+        """
+        Rimette in coda le analisi la cui scrittura è fallita
+
+        Returns:
+            Lista ID rimessi in coda
+        """
+        with self._lock:
+            failed = [analysis_id for analysis_id in self._failed if analysis_id not in self._done]
+        for analysis_id in failed:
+            self._enqueue(self._pending[analysis_id])
+        return failed
+
+    def recover(self):
+        """
+        Chiude i salvataggi interrotti rimasti nel journal
+
+        Solo i record di processi terminati: quelli di un processo vivo
+        (es. la dashboard mentre una run CLI apre lo storage) sono del suo
+        worker. Un lock su file evita che due processi riprendano lo
+        stesso record.
+
+        Returns:
+            Dict {'completed': [...], 'lost': [...]} (ID analisi)
+        """
+        summary = {'completed': [], 'lost': []}
+        lock = MaintenanceLock(self.journal_dir / '.recover.lock', ttl=RECOVERY_LOCK_TTL)
+        try:
+            lock.acquire()
+        except RuntimeError:
+            # Un altro processo sta già riprendendo il journal
+            return summary
+
+        try:
+            for path in sorted(self.journal_dir.glob('*.json')):
+                try:
+                    record = file_codec.read_file(path)
+                except (OSError, ValueError) as e:
+                    self.logger.error(f"Record journal illeggibile {path.name}: {e}")
+                    continue
+                if self._owned_by_live_process(record):
+                    continue
+
+                try:
+                    completed = self.resume(record)
+                except Exception as e:
+                    self.logger.error(f"Ripresa salvataggio fallita ({record['id']}): {e}")
+                    continue
+                path.unlink(missing_ok=True)
+
+                if completed:
+                    summary['completed'].append(record['id'])
+                else:
+                    summary['lost'].append(record['id'])
+                    self.logger.error(f"Analisi {record['id']} ({record.get('brand_name')}) persa: "
+                                      f"processo terminato prima del salvataggio")
+        finally:
+            lock.release()
+
+        if summary['completed']:
+            self.logger.info(f"✓ Journal: {len(summary['completed'])} salvataggi interrotti completati")
+        return summary
+
+    @staticmethod
+    def _owned_by_live_process(record):
+        """True se il record è di questo processo o di un altro processo ancora attivo"""
+        pid = record.get('pid')
+        if pid == os.getpid():
+            return record.get('owner') == _PROCESS_TOKEN
+        return bool(pid) and _pid_alive(pid)
+
+    def _enqueue(self, analysis_data):
+        """Mette in coda la scrittura (worker avviato al primo uso)"""
+        analysis_id = analysis_data['id']
+        with self._lock:
+            self._pending[analysis_id] = analysis_data
+            self._done[analysis_id] = threading.Event()
+            self._failed.discard(analysis_id)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='WriteBehind', daemon=True)
+                self._worker.start()
+        self._queue.put(analysis_id)
+
+    def _run(self):
+        """Loop del worker: una scrittura alla volta, nell'ordine di arrivo"""
+        while True:
+            analysis_id = self._queue.get()
+            with self._lock:
+                analysis_data = self._pending[analysis_id]
+
+            written = self._write(analysis_id, analysis_data)
+
+            with self._lock:
+                if written:
+                    del self._pending[analysis_id]
+                else:
+                    # Dati in memoria (viste, retry); il record journal resta:
+                    # se il processo termina l'analisi è segnalata come persa
+                    self._failed.add(analysis_id)
+                self._done.pop(analysis_id).set()
+            self._queue.task_done()
+
+    def _write(self, analysis_id, analysis_data):
+        """Scrive un'analisi con retry e backoff (True se scritta)"""
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                self.persist(analysis_data)
+                self._journal_path(analysis_id).unlink(missing_ok=True)
+                return True
+            except Exception as e:
+                if attempt == self.retry_attempts:
+                    self.logger.error(f"Salvataggio in background fallito ({analysis_id}) dopo "
+                                      f"{attempt} tentativi: {e} - analisi mantenuta in memoria")
+                    return False
+
+                wait_time = self.retry_delay * 2 ** (attempt - 1)
+                self.logger.warning(f"Salvataggio in background fallito ({analysis_id}), "
+                                    f"tentativo {attempt}/{self.retry_attempts}: {e} - retry tra {wait_time}s")
+                time.sleep(wait_time)
+
+    def _journal_path(self, analysis_id):
+        """File journal di un'analisi"""
+        return self.journal_dir / f"{analysis_id}.json"
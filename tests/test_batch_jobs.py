@@ -0,0 +1,119 @@
+"""
+Test ciclo Batch API con LocalBatchClient: submit -> poll -> merge_deferred
+"""
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from models.analyzers.ai_analyzer import AIAnalyzer
+from models.analyzers.batch_jobs import BatchJobManager, LocalBatchClient, SENTIMENT_ITEMS_PATTERN
+from models.storage.storage_manager import StorageManager
+
+
+# Commenti ambigui per il lessico locale: finiscono nelle richieste deferred
+TEXTS = ["mah vedremo", "quanto costa la borsa", "not sure about this", "colore così così", "meh ok"]
+
+
+def _no_sync_calls(**kwargs):
+    """In modalità deferred nessuna chiamata OpenAI sincrona"""
+    raise AssertionError("chiamata OpenAI sincrona in modalità deferred")
+
+
+def _responder(body):
+    """Batch simulato: ogni commento inviato è negativo, insight fissi"""
+    match = SENTIMENT_ITEMS_PATTERN.search(body['messages'][-1]['content'])
+    if match:
+        return json.dumps({'results': [
+            {'id': item['id'], 'sentiment': 'negative'} for item in json.loads(match.group(1))
+        ]})
+    return json.dumps({'punti_forza': ['qualità'], 'punti_debolezza': [],
+                       'suggerimenti': ['prezzi'], 'temi_ricorrenti': []})
+
+
+class BatchJobsTest(unittest.TestCase):
+    """Analisi salvata in deferred, inviata e fusa con il client locale"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+        with mock.patch('models.analyzers.ai_analyzer.SENTIMENT_CACHE_ENABLED', False):
+            self.analyzer = AIAnalyzer('sk-test')
+        self.analyzer.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=_no_sync_calls))
+        )
+
+        self.storage = StorageManager(self.tmp_dir / 'results', columnar_dir=self.tmp_dir / 'columnar',
+                                      archive_dir=self.tmp_dir / 'archive', write_behind=False)
+        self.manager = BatchJobManager(LocalBatchClient(_responder, jobs_dir=self.tmp_dir / 'jobs'),
+                                       self.analyzer, self.storage, jobs_dir=self.tmp_dir / 'jobs')
+
+        comments = [{'text': f"{TEXTS[i % len(TEXTS)]} {i}", 'author': f"user{i}"} for i in range(60)]
+        analysis = self.analyzer.analyze_comments(comments, 'instagram', deferred=True)
+        ai_results = {'instagram': analysis}
+        ai_results['aggregated'] = self.analyzer.aggregate_analyses(ai_results, local=True)
+
+        self.local = json.loads(json.dumps(analysis))
+        self.analysis_id = self.storage.save_analysis(
+            'Brand', {'instagram': 'https://instagram.com/brand'},
+            {'ai_analysis': ai_results, 'ai_usage': self.analyzer.usage.summary()}, True
+        )
+
+    def _instagram(self):
+        """Analisi instagram salvata"""
+        return self.storage.load_analysis(self.analysis_id)['results']['ai_analysis']['instagram']
+
+    def test_submit_poll_merges_deferred_sentiment(self):
+        sentiment_requests = [r for r in self.local['deferred']['requests'] if r['kind'] == 'sentiment']
+        self.assertTrue(sentiment_requests)
+
+        job = self.manager.submit([self.analysis_id])
+        self.assertEqual(job['requests'], len(self.local['deferred']['requests']))
+        self.assertEqual(self._instagram()['deferred']['job_id'], job['job_id'])
+
+        # Richieste già assegnate a un job: nessun doppio invio
+        self.assertIsNone(self.manager.submit([self.analysis_id]))
+
+        jobs = self.manager.poll()
+        self.assertEqual([j['status'] for j in jobs], ['completed'])
+
+        merged = self._instagram()
+        self.assertNotIn('deferred', merged)
+        self.assertEqual(merged['batch']['job_id'], job['job_id'])
+        self.assertGreater(merged['batch']['labels'], 0)
+        self.assertGreater(merged['sentiment_engine']['llm_labeled'],
+                           self.local['sentiment_engine'].get('llm_labeled', 0))
+        self.assertGreater(merged['sentiment']['negative'], self.local['sentiment']['negative'])
+
+        total = sum(merged['sentiment'][label] for label in ('positive', 'neutral', 'negative'))
+        local_total = sum(self.local['sentiment'][label] for label in ('positive', 'neutral', 'negative'))
+        self.assertEqual(total, local_total)
+
+    def test_second_merge_is_noop(self):
+        job = self.manager.submit([self.analysis_id])
+        self.manager.poll()
+
+        data = self.storage.load_analysis(self.analysis_id)
+        usage = data['results']['ai_usage']
+
+        # Poll ripetuto e merge dello stesso job (es. dopo un'interruzione)
+        self.assertEqual(self.manager.poll(), [])
+        self.manager._merge_job(dict(job))
+
+        again = self.storage.load_analysis(self.analysis_id)
+        self.assertEqual(again['results']['ai_analysis'], data['results']['ai_analysis'])
+        self.assertEqual(again['results']['ai_usage'], usage)
+
+        # merge_deferred su un'analisi già fusa la restituisce invariata
+        merged = again['results']['ai_analysis']['instagram']
+        before = json.loads(json.dumps(merged))
+        self.assertEqual(self.analyzer.merge_deferred(merged, {0: _responder({'messages': [{'content': ''}]})}),
+                         before)
+
+
+if __name__ == '__main__':
+    unittest.main()
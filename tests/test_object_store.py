@@ -0,0 +1,77 @@
+"""
+Test object store: deduplica tra analisi e conteggio riferimenti
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from models.storage.storage_manager import StorageManager
+
+
+def _results(likes):
+    """Stesso post e commento, metriche diverse"""
+    return {'social_results': {'instagram': {
+        'metrics': {'total_posts': 1},
+        'posts': [{'id': 'p1', 'url': 'u1', 'caption': 'nuovo prodotto', 'likes': likes,
+                   'comments': [{'id': 'c1', 'text': 'bellissimo', 'likes': likes}]}]
+    }}}
+
+
+class ObjectStoreTest(unittest.TestCase):
+    """Storage di prova in una cartella temporanea"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.storage = StorageManager(self.tmp_dir / 'results', write_behind=False)
+        self.objects = self.storage.objects
+
+    def test_shared_objects_are_stored_once(self):
+        first = self.storage.save_analysis('Nike', {}, _results(likes=3))
+        second = self.storage.save_analysis('Nike', {}, _results(likes=9))
+
+        stats = self.objects.stats()
+        self.assertEqual(stats['objects'], 2)
+        self.assertEqual(stats['references'], 4)
+
+        # Metriche del momento per analisi, contenuto condiviso
+        for analysis_id, likes in ((first, 3), (second, 9)):
+            post = self.storage.load_analysis(analysis_id)['results']['social_results']['instagram']['posts'][0]
+            self.assertEqual(post['likes'], likes)
+            self.assertEqual(post['caption'], 'nuovo prodotto')
+            self.assertEqual(post['comments'][0]['likes'], likes)
+
+    def test_release_keeps_objects_still_referenced(self):
+        first = self.storage.save_analysis('Nike', {}, _results(likes=3))
+        second = self.storage.save_analysis('Nike', {}, _results(likes=9))
+
+        self.assertEqual(self.objects.release(first), 0)
+        self.assertEqual(self.objects.stats()['references'], 2)
+        post = self.storage.load_analysis(second)['results']['social_results']['instagram']['posts'][0]
+        self.assertEqual(post['caption'], 'nuovo prodotto')
+
+        self.assertEqual(self.objects.release(second), 2)
+        self.assertEqual(self.objects.stats(), {
+            'objects': 0, 'references': 0, 'bytes_stored': 0, 'bytes_referenced': 0,
+            'dedup_ratio': 1.0, 'bytes_saved': 0
+        })
+
+    def test_delete_and_update_drop_stale_references(self):
+        first = self.storage.save_analysis('Nike', {}, _results(likes=3))
+        second = self.storage.save_analysis('Nike', {}, _results(likes=9))
+
+        self.assertTrue(self.storage.delete_analysis(first))
+        self.assertEqual(self.objects.stats()['references'], 2)
+
+        # Contenuto cambiato: il vecchio oggetto non ha più riferimenti
+        results = _results(likes=9)
+        results['social_results']['instagram']['posts'][0]['caption'] = 'didascalia modificata'
+        self.storage.update_analysis(second, results)
+
+        stats = self.objects.stats()
+        self.assertEqual((stats['objects'], stats['references']), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+Test retention: piano e manutenzione, compattazione/archivio/ripristino, lock
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import EXPORTS_DIR
+from models.storage.retention import RetentionEngine, MaintenanceLock
+from models.storage.storage_manager import StorageManager
+
+
+def _results(likes=3):
+    """Risultati minimi con un post, un commento e un'analisi AI"""
+    return {
+        'aggregated_stats': {'total_posts': 1, 'total_likes': likes},
+        'social_results': {'instagram': {
+            'url': 'https://instagram.com/brand',
+            'metrics': {'total_posts': 1, 'total_likes': likes},
+            'posts': [{'id': 'p1', 'url': 'u1', 'caption': 'nuovo prodotto', 'likes': likes,
+                       'comments': [{'id': 'c1', 'text': 'bellissimo', 'likes': 1}]}]
+        }},
+        'ai_analysis': {'instagram': {'sentiment': {'positive': 1, 'neutral': 0, 'negative': 0}}}
+    }
+
+
+class RetentionTest(unittest.TestCase):
+    """Storage di prova in una cartella temporanea"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.storage = StorageManager(self.tmp_dir / 'results', write_behind=False)
+
+    def _engine(self, **kwargs):
+        return RetentionEngine(self.storage, policy={'raw_days': 30, 'archive_days': 365}, **kwargs)
+
+    def test_paths_follow_storage_root(self):
+        self.assertEqual(self.storage.exports_dir, self.tmp_dir / 'exports')
+        self.assertEqual(self.storage.archive_dir, self.tmp_dir / 'archive')
+        self.assertNotEqual(self.storage.exports_dir, EXPORTS_DIR)
+        self.assertEqual(self._engine().lock.path, self.tmp_dir / '.maintenance.lock')
+
+    def test_plan_by_age_and_brand(self):
+        nike = self.storage.save_analysis('Nike', {}, _results())
+        acme = self.storage.save_analysis('Acme', {}, _results())
+        now = datetime.now()
+
+        engine = self._engine(brand_policies={'acme': {'raw_days': 90}})
+        plan = engine.plan(now + timedelta(days=40))
+        self.assertEqual([item['analysis_id'] for item in plan['compact']], [nike])
+        self.assertEqual(plan['archive'], [])
+
+        plan = engine.plan(now + timedelta(days=400))
+        self.assertEqual(sorted(item['analysis_id'] for item in plan['archive']), sorted([nike, acme]))
+
+        # Il piano non modifica nulla
+        self.assertEqual(self.storage.catalog.get(nike).get('tier', 'full'), 'full')
+
+    def test_run_compacts_and_prunes_exports(self):
+        analysis_id = self.storage.save_analysis('Nike', {}, _results())
+        old_export = self.storage.exports_dir / 'old.csv'
+        new_export = self.storage.exports_dir / 'new.csv'
+        for path in (old_export, new_export):
+            path.write_text('a,b\n', encoding='utf-8')
+        now = datetime.now() + timedelta(days=40)
+        for path, age in ((old_export, 60), (new_export, 1)):
+            mtime = (now - timedelta(days=age)).timestamp()
+            os.utime(path, (mtime, mtime))
+
+        # Vista aperta (dashboard) prima della manutenzione
+        view = self.storage.load_analysis(analysis_id, sections=['summary', 'social', 'posts'])
+
+        plan = self._engine(exports_days=30).run(now=now)
+
+        self.assertEqual(plan['errors'], [])
+        self.assertEqual([item['analysis_id'] for item in plan['compact']], [analysis_id])
+        self.assertEqual(plan['exports'], [old_export])
+        self.assertFalse(old_export.exists())
+        self.assertTrue(new_export.exists())
+
+        self.assertEqual(self.storage.catalog.get(analysis_id)['tier'], 'compacted')
+        data = self.storage.load_analysis(analysis_id)
+        self.assertNotIn('posts', data['results']['social_results']['instagram'])
+        self.assertEqual(data['results']['ai_analysis']['instagram']['sentiment']['positive'], 1)
+        self.assertEqual(view['results']['social_results']['instagram']['posts'], [])
+
+    def test_dry_run_changes_nothing(self):
+        analysis_id = self.storage.save_analysis('Nike', {}, _results())
+        plan = self._engine().run(dry_run=True, now=datetime.now() + timedelta(days=400))
+
+        self.assertTrue(plan['dry_run'])
+        self.assertEqual(len(plan['archive']), 1)
+        self.assertEqual(self.storage.load_analysis(analysis_id)['brand_name'], 'Nike')
+
+    def test_archive_and_restore(self):
+        analysis_id = self.storage.save_analysis('Nike', {}, _results(likes=7))
+        original = self.storage.load_analysis(analysis_id)
+
+        bundle = self.storage.archive_analysis(analysis_id)
+        self.assertTrue(bundle.exists())
+        self.assertTrue(bundle.is_relative_to(self.tmp_dir / 'archive'))
+        self.assertEqual(self.storage.catalog.get(analysis_id)['tier'], 'archived')
+        self.assertFalse((self.storage.results_dir / analysis_id).exists())
+        self.assertEqual(self.storage.objects.stats()['references'], 0)
+
+        self.assertTrue(self.storage.restore_analysis(analysis_id))
+        restored = self.storage.load_analysis(analysis_id)
+        self.assertEqual(restored['results'], original['results'])
+        self.assertEqual(self.storage.catalog.get(analysis_id).get('tier', 'full'), 'full')
+
+    def test_compacted_analysis_archives_and_restores_compacted(self):
+        analysis_id = self.storage.save_analysis('Nike', {}, _results())
+        self.storage.compact_analysis(analysis_id)
+        self.storage.archive_analysis(analysis_id)
+        self.storage.restore_analysis(analysis_id)
+
+        self.assertEqual(self.storage.catalog.get(analysis_id)['tier'], 'compacted')
+
+    def test_skips_pending_batch(self):
+        results = _results()
+        results['ai_analysis']['instagram']['deferred'] = {'requests': [{'kind': 'sentiment'}], 'job_id': None}
+        analysis_id = self.storage.save_analysis('Nike', {}, results)
+
+        plan = self._engine().run(now=datetime.now() + timedelta(days=400))
+
+        self.assertEqual([item['analysis_id'] for item in plan['skipped']], [analysis_id])
+        self.assertEqual(self.storage.catalog.get(analysis_id).get('tier', 'full'), 'full')
+
+
+class MaintenanceLockTest(unittest.TestCase):
+    """Una sola manutenzione alla volta"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.path = self.tmp_dir / '.maintenance.lock'
+
+    def test_second_acquire_fails(self):
+        with MaintenanceLock(self.path):
+            with self.assertRaises(RuntimeError):
+                MaintenanceLock(self.path).acquire()
+        self.assertFalse(self.path.exists())
+
+    def test_run_refused_while_locked(self):
+        storage = StorageManager(self.tmp_dir / 'results', write_behind=False)
+        engine = RetentionEngine(storage)
+        with MaintenanceLock(engine.lock.path):
+            with self.assertRaises(RuntimeError):
+                engine.run()
+
+    def test_stale_lock_is_ignored(self):
+        self.path.write_text('12345 abbandonato', encoding='utf-8')
+        old_time = time.time() - 120
+        os.utime(self.path, (old_time, old_time))
+
+        lock = MaintenanceLock(self.path, ttl=60)
+        lock.acquire()
+        lock.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
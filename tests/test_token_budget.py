@@ -0,0 +1,53 @@
+"""
+Test conteggio token con commenti che contengono token speciali tiktoken
+"""
+import unittest
+from unittest import mock
+
+from config import OPENAI_MODEL
+from models.analyzers import token_budget
+from models.analyzers.ai_analyzer import AIAnalyzer
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Commento ostile: il testo di un token speciale
+HOSTILE = "ottimo prodotto <|endoftext|> davvero"
+
+
+@unittest.skipIf(tiktoken is None, "tiktoken non installato")
+class SpecialTokensTest(unittest.TestCase):
+    """encode non deve fallire sui token speciali presenti nei commenti"""
+
+    def setUp(self):
+        # Encoder byte-level costruito in locale: nessun vocabolario da scaricare
+        encoder = tiktoken.Encoding(
+            'test_bytes',
+            pat_str=r"\S+|\s+",
+            mergeable_ranks={bytes([i]): i for i in range(256)},
+            special_tokens={'<|endoftext|>': 256}
+        )
+        patcher = mock.patch.dict(token_budget._encoders, {OPENAI_MODEL: encoder})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_count_tokens(self):
+        self.assertEqual(token_budget.count_tokens(HOSTILE), len(HOSTILE.encode('utf-8')))
+
+    def test_truncate_to_tokens(self):
+        self.assertEqual(token_budget.truncate_to_tokens(HOSTILE, 20), HOSTILE[:20])
+        self.assertEqual(token_budget.truncate_to_tokens(HOSTILE, 100), HOSTILE)
+
+    def test_pack_sentiment_batches(self):
+        with mock.patch('models.analyzers.ai_analyzer.SENTIMENT_CACHE_ENABLED', False):
+            analyzer = AIAnalyzer('sk-test')
+
+        batches = analyzer._pack_sentiment_batches([('c1', HOSTILE), ('c2', "bello")])
+        self.assertEqual([key for batch in batches for key, _ in batch], ['c1', 'c2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Test salvataggio write-behind: scritture fallite e ripresa del journal
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from models.storage import file_codec
+from models.storage import write_behind
+from models.storage.retention import MaintenanceLock
+from models.storage.sections import write_sections
+from models.storage.storage_manager import StorageManager
+from models.storage.write_behind import WriteBehindQueue
+
+
+def _analysis(analysis_id, brand_name='Brand'):
+    """Analisi minima con un post"""
+    return {
+        'id': analysis_id,
+        'timestamp': '2026-01-01T10:00:00',
+        'brand_name': brand_name,
+        'social_urls': {'instagram': 'https://instagram.com/brand'},
+        'ai_enabled': False,
+        'results': {'social_results': {'instagram': {
+            'metrics': {'total_posts': 1},
+            'posts': [{'id': 'p1', 'url': 'u1', 'likes': 3, 'comments': [{'id': 'c1', 'text': 'ciao'}]}]
+        }}}
+    }
+
+
+def _dead_pid():
+    """PID di un processo già terminato"""
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class FlakyPersist:
+    """persist che fallisce le prime `failures` chiamate"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.written = []
+
+    def __call__(self, analysis_data):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("disco pieno")
+        self.written.append(analysis_data['id'])
+
+
+class WriteBehindFailureTest(unittest.TestCase):
+    """Scrittura in background fallita: retry e dati mantenuti in memoria"""
+
+    def setUp(self):
+        self.journal_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.journal_dir, ignore_errors=True)
+
+    def _queue(self, persist, attempts=3):
+        return WriteBehindQueue(self.journal_dir, persist, lambda record: False,
+                                retry_attempts=attempts, retry_delay=0)
+
+    def test_transient_failure_is_retried(self):
+        persist = FlakyPersist(failures=2)
+        write_queue = self._queue(persist)
+
+        write_queue.submit(_analysis('a1'))
+
+        self.assertTrue(write_queue.wait('a1', timeout=5))
+        self.assertEqual(persist.calls, 3)
+        self.assertEqual(persist.written, ['a1'])
+        self.assertIsNone(write_queue.get('a1'))
+        self.assertFalse((self.journal_dir / 'a1.json').exists())
+
+    def test_failed_write_keeps_data_until_flush(self):
+        persist = FlakyPersist(failures=3)
+        write_queue = self._queue(persist)
+
+        write_queue.submit(_analysis('a1'))
+
+        self.assertFalse(write_queue.wait('a1', timeout=5))
+        self.assertEqual(write_queue.failed_ids(), ['a1'])
+        self.assertEqual(write_queue.get('a1')['brand_name'], 'Brand')
+        self.assertTrue((self.journal_dir / 'a1.json').exists())
+
+        # Il disco torna disponibile: flush rimette in coda e scrive
+        self.assertTrue(write_queue.flush(timeout=5))
+        self.assertEqual(persist.written, ['a1'])
+        self.assertEqual(write_queue.failed_ids(), [])
+        self.assertIsNone(write_queue.get('a1'))
+        self.assertFalse((self.journal_dir / 'a1.json').exists())
+
+
+class WriteBehindRecoverTest(unittest.TestCase):
+    """Ripresa dei record rimasti nel journal"""
+
+    def setUp(self):
+        self.journal_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.journal_dir, ignore_errors=True)
+        self.resumed = []
+
+    def _record(self, analysis_id, pid, owner='other-process'):
+        record = {'id': analysis_id, 'brand_name': 'Brand', 'pid': pid, 'owner': owner}
+        file_codec.write_file(self.journal_dir / f"{analysis_id}.json", record, compression=None)
+
+    def _resume(self, record):
+        self.resumed.append(record['id'])
+        return record['id'] == 'done'
+
+    def test_recover_dead_process_records(self):
+        dead = _dead_pid()
+        self._record('done', dead)
+        self._record('lost', dead)
+        self._record('live', os.getppid())
+        self._record('mine', os.getpid(), owner=write_behind._PROCESS_TOKEN)
+
+        write_queue = WriteBehindQueue(self.journal_dir, lambda data: None, self._resume)
+        summary = write_queue.recover()
+
+        self.assertEqual(summary, {'completed': ['done'], 'lost': ['lost']})
+        self.assertEqual(sorted(self.resumed), ['done', 'lost'])
+        remaining = sorted(path.stem for path in self.journal_dir.glob('*.json'))
+        self.assertEqual(remaining, ['live', 'mine'])
+
+    def test_recover_skips_when_locked(self):
+        self._record('lost', _dead_pid())
+
+        lock = MaintenanceLock(self.journal_dir / '.recover.lock', ttl=write_behind.RECOVERY_LOCK_TTL)
+        lock.acquire()
+        try:
+            summary = WriteBehindQueue(self.journal_dir, lambda data: None, self._resume).recover()
+        finally:
+            lock.release()
+
+        self.assertEqual(summary, {'completed': [], 'lost': []})
+        self.assertEqual(self.resumed, [])
+        self.assertTrue((self.journal_dir / 'lost.json').exists())
+
+    def test_storage_manager_completes_interrupted_save(self):
+        tmp_dir = self.journal_dir
+        results_dir = tmp_dir / 'results'
+        journal_dir = results_dir / '.journal'
+        journal_dir.mkdir(parents=True)
+
+        # Processo terminato dopo la scrittura delle sezioni, prima del catalogo
+        analysis = _analysis('20260101_100000_aaaaaaaa')
+        write_sections(results_dir / analysis['id'], analysis)
+        dead = _dead_pid()
+        for analysis_id in (analysis['id'], '20260101_100000_bbbbbbbb'):
+            file_codec.write_file(journal_dir / f"{analysis_id}.json",
+                                  {'id': analysis_id, 'brand_name': 'Brand', 'pid': dead, 'owner': 'x'},
+                                  compression=None)
+
+        storage = StorageManager(results_dir, columnar_dir=tmp_dir / 'columnar',
+                                 archive_dir=tmp_dir / 'archive')
+
+        self.assertEqual([e['id'] for e in storage.list_analyses()], [analysis['id']])
+        self.assertEqual(storage.load_analysis(analysis['id'])['brand_name'], 'Brand')
+        self.assertEqual(list(journal_dir.glob('*.json')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Esecuzione concorrente con controllo adattivo della concorrenza (AIMD)
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class AdaptiveConcurrencyController:
+    """
+    Limite di concorrenza AIMD (Additive Increase / Multiplicative Decrease)
+
+    Ogni "giro" di richieste riuscite alza il limite di 1; un rate limit
+    (429) o una quota residua bassa lo dimezza e, se indicato dal server,
+    sospende le nuove richieste per il tempo di retry-after.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=16,
+                 increase_step=1, decrease_factor=0.5):
+        """
+        Inizializza controller
+
+        Args:
+            initial: Limite iniziale di richieste in volo
+            min_limit: Limite minimo
+            max_limit: Limite massimo
+            increase_step: Incremento additivo dopo un giro senza errori
+            decrease_factor: Fattore moltiplicativo su rate limit
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.in_flight = 0
+        self.throttle_events = 0
+
+        self._successes = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Attende uno slot libero (bloccante)"""
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(timeout=pause)
+                    continue
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                self._condition.wait()
+
+    def release(self):
+        """Libera uno slot"""
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Context manager: acquire/release di uno slot"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self, remaining_requests=None, remaining_tokens=None,
+                   reset_seconds=None):
+        """
+        Segnala una richiesta riuscita (con eventuali header rate limit)
+
+        Args:
+            remaining_requests: Richieste residue nella finestra
+            remaining_tokens: Token residui nella finestra
+            reset_seconds: Secondi al reset della finestra
+        """
+        with self._condition:
+            # Quota quasi esaurita: riduci prima di ricevere un 429
+            if remaining_requests is not None and remaining_requests <= self.limit:
+                self._decrease(reset_seconds if remaining_requests == 0 else None)
+                return
+            if remaining_tokens is not None and remaining_tokens == 0:
+                self._decrease(reset_seconds)
+                return
+
+            self._successes += 1
+            if self._successes >= self.limit:
+                self._successes = 0
+                self.limit = min(self.max_limit, self.limit + self.increase_step)
+                self._condition.notify_all()
+
+    def on_throttle(self, retry_after=None):
+        """
+        Segnala un rate limit (HTTP 429)
+
+        Args:
+            retry_after: Secondi da attendere indicati dal server (opzionale)
+        """
+        with self._condition:
+            self.throttle_events += 1
+            self._decrease(retry_after)
+
+    def stats(self):
+        """Stato corrente del controller"""
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'throttle_events': self.throttle_events
+            }
+
+    def _decrease(self, pause_seconds=None):
+        """Decremento moltiplicativo + pausa opzionale (lock già acquisito)"""
+        self._successes = 0
+        self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        if pause_seconds:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause_seconds)
+
+
+def run_concurrent(func, items, controller):
+    """
+    Esegue func su ogni item in parallelo rispettando il controller
+
+    Args:
+        func: Funzione da applicare a ogni item
+        items: Lista input
+        controller: AdaptiveConcurrencyController
+
+    Returns:
+        Lista risultati nello stesso ordine degli input
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    # I thread del pool ereditano il contesto del chiamante (es. social corrente)
+    context = contextvars.copy_context()
+
+    def _guarded(item):
+        with controller.slot():
+            return context.copy().run(func, item)
+
+    # Il pool è dimensionato sul massimo; è il controller a limitare
+    workers = min(len(items), controller.max_limit)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_guarded, items))
@@ -79,12 +79,13 @@ def display_sentiment_analysis(sentiment):
         st.warning("Nessun dato sentiment disponibile")
 
 
-def display_wordcloud(wordcloud_data):
+def display_wordcloud(wordcloud_data, top_emojis=None):
     """
     Mostra wordcloud
 
     Args:
         wordcloud_data: Lista dict {word, frequency}
+        top_emojis: Lista dict {emoji, frequency} (opzionale)
     """
     if not wordcloud_data:
         st.info("Nessun dato wordcloud disponibile")
@@ -124,6 +125,10 @@ def display_wordcloud(wordcloud_data):
             with cols[idx % 5]:
                 st.markdown(f"**{word}**")
                 st.caption(f"{freq} volte")
+
+        if top_emojis:
+            st.caption("😀 Top Emoji")
+            st.markdown("  ".join(f"{item['emoji']} {item['frequency']}" for item in top_emojis))
     else:
         st.warning("Nessuna parola da visualizzare")
 
@@ -172,6 +177,23 @@ def display_insights(insights):
             st.markdown(f"- {tema}")
 
 
+def display_topics(topics):
+    """
+    Mostra topic locali (parole chiave, quota, esempi)
+
+    Args:
+        topics: Lista dict {keywords, size, share_pct, examples}
+    """
+    if not topics:
+        return
+
+    st.markdown("### 🧩 Topic nei Commenti")
+    for topic in topics:
+        with st.expander(f"{', '.join(topic['keywords'][:4])} — {topic['share_pct']}% ({topic['size']} commenti)"):
+            for example in topic['examples']:
+                st.markdown(f"> {example}")
+
+
 def display_ai_summary(ai_results):
     """
     Mostra summary completo AI per un social
@@ -189,19 +211,26 @@ def display_ai_summary(ai_results):
     with tab1:
         display_sentiment_analysis(ai_results.get('sentiment'))
 
+        languages = ai_results.get('languages')
+        if languages:
+            st.caption("🌐 Lingue commenti: " + " · ".join(
+                f"{lang.upper()} {data['pct']}%" for lang, data in languages.items()
+            ))
+
     with tab2:
-        display_wordcloud(ai_results.get('wordcloud'))
+        display_wordcloud(ai_results.get('wordcloud'), ai_results.get('top_emojis'))
 
     with tab3:
         display_insights(ai_results.get('insights'))
+        display_topics(ai_results.get('topics'))
 
 
-def display_aggregated_sentiment(social_results):
+def display_aggregated_sentiment(ai_analysis):
     """
     Mostra sentiment aggregato cross-social
 
     Args:
-        social_results: Dict risultati per social con AI
+        ai_analysis: Dict analisi AI {social: analisi, 'aggregated': aggregato}
     """
     st.subheader("🎭 Sentiment Aggregato Cross-Social")
 
@@ -212,10 +241,14 @@ def display_aggregated_sentiment(social_results):
         'negative': 0
     }
 
-    for social_type, data in social_results.items():
-        ai = data.get('ai_analysis', {})
-        sentiment = ai.get('sentiment', {})
+    aggregated = ai_analysis.get('aggregated')
+    if aggregated:
+        sentiments = [aggregated.get('sentiment', {})]
+    else:
+        # Analisi salvate prima dell'aggregato: somma per social
+        sentiments = [ai.get('sentiment', {}) for ai in ai_analysis.values() if ai]
 
+    for sentiment in sentiments:
         all_sentiments['positive'] += sentiment.get('positive', 0)
         all_sentiments['neutral'] += sentiment.get('neutral', 0)
         all_sentiments['negative'] += sentiment.get('negative', 0)
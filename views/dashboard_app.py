@@ -14,7 +14,7 @@ from controllers.export_manager import ExportManager
 from utils.validators import InputValidator, URLValidator
 from views.components.metrics_display import *
 from views.components.ai_display import *
-from config import STREAMLIT_CONFIG, MOCA_FAVICON_URL
+from config import STREAMLIT_CONFIG, MOCA_FAVICON_URL, DASHBOARD_REPORT_SECTIONS
 import time
 
 
@@ -293,7 +293,7 @@ def render_results():
         # Tab individuali
         for idx, (social_type, data) in enumerate(social_results.items()):
             with tabs[idx]:
-                render_social_tab(social_type, data, results.get('ai_analysis', {}))
+                render_social_tab(social_type, data, results.get('ai_analysis') or {})
 
         # Tab aggregata
         with tabs[-1]:
@@ -390,7 +390,215 @@ def render_aggregated_tab(results):
     if results.get('ai_analysis'):
         st.divider()
         st.header("🤖 Analisi AI Aggregata")
-        display_aggregated_sentiment(results['social_results'])
+        display_aggregated_sentiment(results['ai_analysis'])
+
+        # Insight brand (reduce cross-social)
+        aggregated = results['ai_analysis'].get('aggregated')
+        if aggregated and aggregated.get('total_analyzed'):
+            st.divider()
+            display_insights(aggregated.get('insights'))
+
+        # Modalità deferred: risultati locali finché il batch non è fuso
+        pending = [
+            social for social, analysis in results['ai_analysis'].items()
+            if social != 'aggregated' and analysis and analysis.get('deferred')
+        ]
+        if pending:
+            st.caption(f"⏳ Risultati AI provvisori: batch OpenAI in attesa per {', '.join(pending)}")
+
+        # Uso OpenAI dell'analisi (token, costo, latenza)
+        usage = results.get('ai_usage')
+        if usage and usage.get('calls'):
+            st.caption(
+                f"🧾 Uso AI: {usage['calls']} chiamate · {usage['total_tokens']:,} token · "
+                f"${usage['cost_usd']:.4f} · {usage['latency_seconds']:.1f}s di latenza"
+            )
+            if usage['budget']['degraded']:
+                st.caption("⚠️ Budget AI raggiunto: " + ", ".join(
+                    f"{d['social']}/{d['phase']} → {d['reason']}" for d in usage['budget']['degraded']
+                ))
+
+
+# Livello retention delle analisi nello storico
+TIER_LABELS = {
+    'full': 'Completa',
+    'compacted': 'Compattata (senza post/commenti)',
+    'archived': 'Archiviata'
+}
+
+
+def render_history():
+    """Renderizza storico analisi e trend brand (solo catalogo, nessun file caricato)"""
+    orchestrator = st.session_state.orchestrator
+    history = orchestrator.list_analyses(limit=50)
+
+    if not history:
+        return
+
+    import pandas as pd
+
+    st.divider()
+    st.header("📚 Storico Analisi")
+
+    df = pd.DataFrame([
+        {
+            'Data': a['timestamp'][:16].replace('T', ' '),
+            'Brand': a['brand_name'],
+            'Social': ', '.join(a.get('social_urls', {}).keys()),
+            'Post': a['summary'].get('total_posts') or 0,
+            'Commenti': a['summary'].get('total_comments') or 0,
+            'Likes': a['summary'].get('total_likes') or 0,
+            'Engagement Rate (%)': a['summary'].get('avg_engagement_rate') or 0,
+            'Sentiment Positivo (%)': a['summary'].get('positive_pct'),
+            'Dati': TIER_LABELS.get(a.get('tier', 'full'), a.get('tier'))
+        }
+        for a in history
+    ])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    dedup = orchestrator.get_dedup_stats()
+    if dedup and dedup['objects']:
+        st.caption(
+            f"🗜️ Deduplica post/commenti: {dedup['references']:,} riferimenti su "
+            f"{dedup['objects']:,} oggetti (x{dedup['dedup_ratio']}) · "
+            f"{dedup['bytes_saved'] / 1024 / 1024:.1f} MB risparmiati"
+        )
+
+    cache = orchestrator.get_cache_stats()
+    if cache and cache['hits'] + cache['misses']:
+        st.caption(
+            f"⚡ Cache analisi: {cache['hit_rate']}% hit ({cache['hits']}/{cache['hits'] + cache['misses']}) · "
+            f"{cache['bytes'] / 1024 / 1024:.1f} / {cache['max_bytes'] / 1024 / 1024:.0f} MB"
+        )
+
+    # Apri report salvato (le archiviate vanno prima ripristinate)
+    labels = {
+        a['id']: f"{a['timestamp'][:16].replace('T', ' ')} · {a['brand_name']}"
+        for a in history if a.get('tier') != 'archived'
+    }
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected_id = st.selectbox("📂 Apri analisi", list(labels), format_func=labels.get)
+    with col2:
+        st.write("")
+        if st.button("Apri", use_container_width=True) and selected_id:
+            open_analysis(selected_id)
+
+    # Trend brand
+    brands = sorted({a['brand_name'] for a in history})
+    brand = st.selectbox("📈 Trend brand", brands)
+    trend = orchestrator.get_brand_trend(brand)
+
+    if len(trend) > 1:
+        import plotly.graph_objects as go
+
+        fig = go.Figure(data=[
+            go.Scatter(
+                x=[p['timestamp'] for p in trend],
+                y=[p.get('avg_engagement_rate') or 0 for p in trend],
+                mode='lines+markers',
+                marker_color=DashboardColors.PRIMARY,
+                name='Engagement Rate (%)'
+            )
+        ])
+
+        fig.update_layout(
+            title=f"Engagement Rate - {brand}",
+            xaxis_title="Data",
+            yaxis_title="Engagement Rate (%)",
+            height=350
+        )
+
+        st.plotly_chart(fig, use_container_width=True)
+        render_snapshot_diff(trend)
+    else:
+        st.caption("Serve almeno una seconda analisi del brand per il trend")
+
+
+def render_snapshot_diff(trend):
+    """Confronto tra due analisi del brand (default le ultime due)"""
+    import pandas as pd
+
+    st.subheader("🔀 Confronto Snapshot")
+
+    labels = {p['id']: p['timestamp'][:16].replace('T', ' ') for p in reversed(trend)}
+    ids = list(labels)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        old_id = st.selectbox("Riferimento", ids, index=1, format_func=labels.get)
+    with col2:
+        new_id = st.selectbox("Confronta con", ids, index=0, format_func=labels.get)
+
+    if old_id == new_id:
+        st.caption("Scegli due analisi diverse")
+        return
+
+    diff = st.session_state.orchestrator.diff_analyses(new_id, old_id)
+    st.caption(f"{diff['days']} giorni tra i due snapshot")
+
+    cols = st.columns(5)
+    for col, (metric, label) in zip(cols, (('total_posts', 'Post'), ('total_comments', 'Commenti'),
+                                           ('total_likes', 'Likes'), ('total_views', 'Views'),
+                                           ('avg_engagement_rate', 'Engagement Rate (%)'))):
+        change = diff['metrics'][metric]
+        col.metric(label, change['new'] if change['new'] is not None else 'N/A',
+                   delta=change['delta'])
+
+    sentiment = diff['sentiment']
+    if sentiment['net']['delta'] is not None:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Sentiment Positivo (%)", sentiment['positive_pct']['new'],
+                    delta=f"{sentiment['positive_pct']['delta']:+.1f} pt")
+        col2.metric("Sentiment Negativo (%)", sentiment['negative_pct']['new'],
+                    delta=f"{sentiment['negative_pct']['delta']:+.1f} pt", delta_color='inverse')
+        col3.metric("Sentiment Netto", sentiment['net']['new'],
+                    delta=f"{sentiment['net']['delta']:+.1f} pt")
+
+    posts = diff['posts']
+    if not posts['available']:
+        st.caption("Post non confrontabili: una delle due analisi è compattata o archiviata")
+        return
+
+    st.caption(
+        f"Post nuovi: {len(posts['new'])} · non più presenti: {len(posts['removed'])} · "
+        f"in comune: {posts['common']} (likes {posts['likes_growth']:+,}, views {posts['views_growth']:+,})"
+    )
+
+    columns = {'social': 'Social', 'caption': 'Caption', 'likes': 'Likes', 'views': 'Views', 'url': 'URL'}
+    tabs = st.tabs(["📈 Crescita", "🆕 Nuovi", "➖ Non più presenti"])
+    with tabs[0]:
+        st.dataframe(
+            pd.DataFrame(posts['top_growth'], columns=[*columns, 'likes_delta', 'views_delta'])
+            .rename(columns={**columns, 'likes_delta': 'Δ Likes', 'views_delta': 'Δ Views'}),
+            use_container_width=True, hide_index=True
+        )
+    for tab, key in ((tabs[1], 'new'), (tabs[2], 'removed')):
+        with tab:
+            st.dataframe(
+                pd.DataFrame(posts[key], columns=list(columns)).rename(columns=columns),
+                use_container_width=True, hide_index=True
+            )
+
+
+def open_analysis(analysis_id):
+    """Apre un'analisi salvata (vista lazy: solo le sezioni del report)"""
+    data = st.session_state.orchestrator.load_analysis(analysis_id, sections=DASHBOARD_REPORT_SECTIONS)
+
+    if not data:
+        st.error(f"Analisi {analysis_id} non trovata")
+        return
+
+    st.session_state.current_analysis = {'analysis_id': analysis_id, 'results': data['results']}
+    st.session_state.analysis_complete = True
+    st.rerun()
+
+
+def export_results(results, analysis_id):
+    """Risultati completi per gli export (un report aperto è una vista parziale)"""
+    if isinstance(results, dict):
+        return results
+    return st.session_state.orchestrator.load_analysis(analysis_id)['results']
 
 
 def render_export_section(results, analysis_id):
@@ -404,25 +612,33 @@ def render_export_section(results, analysis_id):
     with col1:
         if st.button("📄 Esporta PDF", use_container_width=True):
             with st.spinner("Generando PDF..."):
-                filepath = export_manager.export_to_pdf(results, f"report_{analysis_id}.pdf")
+                filepath = export_manager.export_to_pdf(
+                    export_results(results, analysis_id), f"report_{analysis_id}.pdf"
+                )
                 st.success(f"✓ PDF esportato: {filepath}")
 
     with col2:
         if st.button("📊 Esporta CSV", use_container_width=True):
             with st.spinner("Generando CSV..."):
-                filepath = export_manager.export_to_csv(results, f"metrics_{analysis_id}.csv")
+                filepath = export_manager.export_to_csv(
+                    export_results(results, analysis_id), f"metrics_{analysis_id}.csv"
+                )
                 st.success(f"✓ CSV esportato: {filepath}")
 
     with col3:
         if st.button("📑 Esporta XLSX", use_container_width=True):
             with st.spinner("Generando XLSX..."):
-                filepath = export_manager.export_to_xlsx(results, f"report_{analysis_id}.xlsx")
+                filepath = export_manager.export_to_xlsx(
+                    export_results(results, analysis_id), f"report_{analysis_id}.xlsx"
+                )
                 st.success(f"✓ XLSX esportato: {filepath}")
 
     with col4:
         if st.button("💾 Esporta JSON", use_container_width=True):
             with st.spinner("Generando JSON..."):
-                filepath = export_manager.export_to_json(results, f"data_{analysis_id}.json")
+                filepath = export_manager.export_to_json(
+                    export_results(results, analysis_id), f"data_{analysis_id}.json"
+                )
                 st.success(f"✓ JSON esportato: {filepath}")
 
 
@@ -460,6 +676,8 @@ def main():
         if st.button("🚀 Avvia Analisi", type="primary", use_container_width=True):
             run_analysis(config, enable_ai)
 
+        render_history()
+
 
 if __name__ == "__main__":
     main()